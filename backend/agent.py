@@ -1,72 +1,514 @@
-from typing import Dict
-import json
+from typing import ContextManager, Dict, List, Optional, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+import asyncio
+import logging
+from backend.metrics import METRICS, SlowRequestProfiler, confidence_bucket
 from backend.extractor.template_identifier import TemplateIdentifier
 from backend.extractor.nlp_classifier import NLPTemplateClassifier
+from backend.extractor.embedding_classifier import EmbeddingTemplateClassifier
 from backend.extractor.variable_extractor import VariableExtractor
-from functions.terraform_functions import FUNCTION_REGISTRY
+from backend.registry import CompiledRegistry, TemplateRegistry, get_registry
+from backend.jobs import JobScheduler, JobStore
+from backend.sessions import Session, SessionStore
+from backend.terraform.speculative import Preparation, SpeculativePreparer
+from functions.execution_cache import ExecutionCache, is_successful
+from functions.terraform_functions import (
+    PROVISIONING_FUNCTIONS, ASYNC_PROVISIONING_FUNCTIONS, BATCH_PROVISIONING_FUNCTIONS, WORKSPACE_NAMERS,
+    provisioning_client
+)
+
+logger = logging.getLogger(__name__)
 
 class InfrastructureAgent:
-    def __init__(self):
-        # Load all components
-        self.template_identifier = TemplateIdentifier()
-        self.nlp_classifier = NLPTemplateClassifier()
-        self.variable_extractor = VariableExtractor(self.template_identifier.registry)
-        self.function_registry = FUNCTION_REGISTRY
-        
-        # Load template registry
-        with open('backend/templates/registry.json', 'r') as f:
-            self.template_registry = json.load(f)
-    
-    def process_request(self, user_input: str) -> Dict:
+    def __init__(self, warm_up_classifier: bool = False, classifier_backend: str = "zero-shot",
+                 inference_executor: Optional[Executor] = None, max_inference_workers: int = 2,
+                 job_scheduler: Optional[JobScheduler] = None, cache_ttl: float = 600.0,
+                 cache_path: Optional[str] = None, slow_request_profiler: Optional[SlowRequestProfiler] = None,
+                 registry: Optional[TemplateRegistry] = None, classifier_options: Optional[Dict] = None,
+                 session_ttl: float = 1800.0, pipelined: bool = False):
+        # One compiled, hot-reloaded registry shared by every component
+        self.registry = registry or get_registry()
+        
+        # Load all components; the fallback model itself is loaded on first use.
+        # classifier_options go to the classifier, e.g. {"runtime": "int8", "num_threads": 4}
+        self.template_identifier = TemplateIdentifier(registry=self.registry)
+        if classifier_backend == "embedding":
+            self.nlp_classifier = EmbeddingTemplateClassifier(self.registry, **(classifier_options or {}))
+        elif classifier_backend == "zero-shot":
+            self.nlp_classifier = NLPTemplateClassifier(registry=self.registry, **(classifier_options or {}))
+        else:
+            raise ValueError(f"Unknown classifier backend: {classifier_backend}")
+        if warm_up_classifier:
+            self.nlp_classifier.warm_up(background=True)
+        self.variable_extractor = VariableExtractor(self.registry)
+        # Template name -> function, resolved from each template's "function" key and bound to its
+        # path in this agent's registry; refreshed in place on reload, so a job scheduler can share them
+        self.function_registry: Dict = {}
+        self.async_function_registry: Dict = {}
+        self.batch_function_registry: Dict = {}
+        self.workspace_namers: Dict = {}
+        self._bind_functions(self.registry.current)
+        
+        # Bounded pool for classifier calls made from aprocess_request
+        self.inference_executor = inference_executor or ThreadPoolExecutor(
+            max_workers=max_inference_workers,
+            thread_name_prefix="nli"
+        )
+        
+        # Durable queue for process_request(..., enqueue=True); None runs requests inline
+        self.job_scheduler = job_scheduler
+        
+        # Identical requests reuse successful results for cache_ttl seconds; 0 disables the cache
+        self.execution_cache = None
+        if cache_ttl > 0:
+            self.execution_cache = ExecutionCache(self.registry.current.template_paths, ttl=cache_ttl,
+                                                  persist_path=cache_path)
+        
+        # Optional cProfile sampling of slow process_request calls
+        self.slow_request_profiler = slow_request_profiler
+        
+        # Requests waiting for missing variables, continued by process_turn
+        self.sessions = SessionStore(ttl=session_ttl, on_drop=self._on_session_drop)
+        
+        # Pipelined mode: terraform init of the identified template runs in the background
+        # while the request is classified, extracted and completed over further turns
+        self.preparer = None
+        if pipelined:
+            self.preparer = SpeculativePreparer(provisioning_client, self._preparable_paths(self.registry.current),
+                                                self.workspace_namers)
+    
+        self._check_functions(self.registry.current)
+        self.registry.subscribe(self._on_registry_reload)
+    
+    @property
+    def template_registry(self) -> Dict:
+        """Parsed registry of the currently active version"""
+        return self.registry.current.raw
+    
+    @property
+    def classifier_ready(self) -> bool:
+        """Whether the NLI fallback model is loaded"""
+        return self.nlp_classifier.is_ready
+    
+    @classmethod
+    def with_job_queue(cls, db_path: str = "jobs.sqlite3", max_workers: int = 4,
+                       **kwargs) -> "InfrastructureAgent":
+        """Agent whose enqueued requests run on a started scheduler backed by db_path"""
+        agent = cls(**kwargs)
+        scheduler = JobScheduler(
+            JobStore(db_path),
+            agent.function_registry,
+            workspace_namers=agent.workspace_namers,
+            max_workers=max_workers
+        )
+        agent.job_scheduler = scheduler.start()
+        return agent
+    
+    def process_request(self, user_input: str, enqueue: bool = False) -> Dict:
         """Main processing pipeline for GCP infrastructure requests"""
+        response, preparation = self._process_request(user_input, enqueue)
+        self._finish_preparation(preparation)
+        return response
+    
+    def _process_request(self, user_input: str, enqueue: bool) -> Tuple[Dict, Optional[Preparation]]:
+        """process_request, also returning the speculative preparation a missing_variables session can keep"""
+        with self._profile("process_request"), METRICS.span("request") as span:
+            # Step 1: Identify template, starting its terraform preparation right away in pipelined mode
+            template_name, confidence = self._identify(user_input)
+            preparation = self._start_preparation(template_name)
+            
+            if confidence < 0.4:  # Adjusted threshold for GCP-specific matching
+                template_name, confidence = self._classify(user_input)
+                preparation = self._start_preparation(template_name, preparation)
+            
+            variables, response = self._extract_and_validate(user_input, template_name, confidence)
+            if response is None:
+                if enqueue:
+                    response = self._enqueue(template_name, variables)
+                else:
+                    response = self._execute(template_name, variables, preparation)
+            
+            span.update(template=template_name, outcome=self._outcome(response))
+            return response, preparation
+    
+    def process_turn(self, user_input: str, session_id: Optional[str] = None, enqueue: bool = False) -> Dict:
+        """
+        Multi-turn pipeline: a missing_variables response carries a session_id, and
+        follow-ups passing it only extract from the new utterance into the kept template
+        """
+        if session_id is None:
+            response, preparation = self._process_request(user_input, enqueue)
+            if response.get("status") == "missing_variables":
+                session = Session(response["template"], dict(response["extracted"]), response["missing"])
+                session.preparation = preparation
+                self.sessions.add(session)
+                response["session_id"] = session.session_id
+            else:
+                self._finish_preparation(preparation)
+            return response
+        
+        # Taken out of the store for the turn, so a concurrent turn of the same session cannot execute it too
+        session = self.sessions.pop(session_id)
+        if session is None:
+            return {"error": "Unknown or expired session, or another turn of it is in progress",
+                    "session_id": session_id}
+        
+        with self._profile("process_turn"), METRICS.span("request", turn="follow_up") as span:
+            template_name = session.template_name
+            span["template"] = template_name
+            if template_name not in self.registry.current.templates:
+                self._finish_preparation(session.preparation)
+                response = {"error": f"Template {template_name} is no longer available", "session_id": session_id}
+                span["outcome"] = self._outcome(response)
+                return response
+            
+            try:
+                # Step 2: Extract from the new utterance only and merge into the session
+                with METRICS.span("extract", template=template_name, turn="follow_up"):
+                    session.merge(self.variable_extractor.extract_follow_up(user_input, template_name,
+                                                                            session.missing, session.variables))
+                
+                # Step 3: Validate the merged variables; keep the session while any are missing
+                variables, response = self._validate(template_name, dict(session.variables))
+            except BaseException:
+                self.sessions.add(session)
+                raise
+            if response is not None:
+                session.missing = response["missing"]
+                self.sessions.add(session)
+            else:
+                if enqueue:
+                    response = self._enqueue(template_name, variables)
+                else:
+                    response = self._execute(template_name, variables, session.preparation)
+                self._finish_preparation(session.preparation)
+            
+            response["session_id"] = session_id
+            span["outcome"] = self._outcome(response)
+            return response
+    
+    def job_status(self, job_id: str) -> Optional[Dict]:
+        """State of a job queued by process_request(..., enqueue=True)"""
+        if self.job_scheduler is None:
+            raise ValueError("Agent has no job scheduler")
+        return self.job_scheduler.status(job_id)
+    
+    def process_requests(self, user_inputs: List[str], dry_run: bool = False) -> List[Dict]:
+        """
+        Batch pipeline: low-confidence prompts share one batched NLI pass; with
+        dry_run, requests ready to execute return a dry_run response instead
+        """
+        
+        # Step 1: Identify templates, collecting prompts that need the classifier
+        with METRICS.span("identify", batch=True):
+            identified = self.template_identifier.identify_templates(user_inputs)
+        for _, confidence in identified:
+            METRICS.increment("agent_confidence_total", source="keyword", bucket=confidence_bucket(confidence))
+        fallback = [i for i, (_, confidence) in enumerate(identified) if confidence < 0.4]
+        
+        if fallback:
+            METRICS.increment("agent_classifier_fallback_total", len(fallback))
+            with METRICS.span("classify", batch=True):
+                classified = self.nlp_classifier.classify_intents([user_inputs[i] for i in fallback])
+            for _, confidence in classified:
+                METRICS.increment("agent_confidence_total", source="classifier", bucket=confidence_bucket(confidence))
+            for i, result in zip(fallback, classified):
+                identified[i] = result
+        
+        # Steps 2-3: Extract and validate every request
+        results: List[Optional[Dict]] = [None] * len(user_inputs)
+        ready: Dict[str, List[Tuple[int, Dict]]] = {}
+        for i, (text, (template_name, confidence)) in enumerate(zip(user_inputs, identified)):
+            variables, response = self._extract_and_validate(text, template_name, confidence)
+            if response is not None:
+                results[i] = response
+            else:
+                ready.setdefault(template_name, []).append((i, variables))
         
-        # Step 1: Identify template
-        template_name, confidence = self.template_identifier.identify_template(user_input)
+        if dry_run:
+            for template_name, items in ready.items():
+                for i, variables in items:
+                    results[i] = {"status": "dry_run", "template": template_name, "variables": variables}
+            return results
+        
+        # Steps 4-5: Templates with a bulk function run all their requests at once
+        if self.execution_cache:
+            for template_name, items in ready.items():
+                pending = []
+                for i, variables in items:
+                    cached = self.execution_cache.get(self.execution_cache.key(template_name, variables))
+                    if cached is None:
+                        pending.append((i, variables))
+                    else:
+                        results[i] = self._success(template_name, variables, cached, cached=True)
+                ready[template_name] = pending
+        
+        for template_name, items in ready.items():
+            batch_function = self.batch_function_registry.get(template_name)
+            if not batch_function or len(items) < 2:
+                for i, variables in items:
+                    results[i] = self._execute(template_name, variables)
+                continue
+            
+            try:
+                with METRICS.span("execute", template=template_name, batch=True):
+                    batch_results = batch_function([variables for _, variables in items])
+            except Exception as e:
+                for i, _ in items:
+                    results[i] = self._failure(template_name, e)
+                continue
+            for (i, variables), result in zip(items, batch_results):
+                results[i] = self._success(template_name, variables, result)
+        
+        return results
+    
+    async def aprocess_request(self, user_input: str) -> Dict:
+        """Asyncio pipeline with the same result shape as process_request"""
         
-        if confidence < 0.4:  # Adjusted threshold for GCP-specific matching
+        with METRICS.span("request", mode="async") as span:
+            response = await self._aprocess(user_input)
+            span.update(template=response.get("template"), outcome=self._outcome(response))
+            return response
+    
+    async def _aprocess(self, user_input: str) -> Dict:
+        # Step 1: Identify template inline, offloading only the NLI fallback
+        template_name, confidence = self._identify(user_input)
+        
+        if confidence < 0.4:
+            loop = asyncio.get_running_loop()
+            METRICS.increment("agent_classifier_fallback_total")
+            with METRICS.span("classify"):
+                template_name, confidence = await loop.run_in_executor(
+                    self.inference_executor, self.nlp_classifier.classify_intent, user_input
+                )
+            METRICS.increment("agent_confidence_total", source="classifier", bucket=confidence_bucket(confidence))
+        
+        # Steps 2-3: Extraction and validation are cheap enough to run inline
+        variables, response = self._extract_and_validate(user_input, template_name, confidence)
+        if response is not None:
+            return response
+        
+        # Steps 4-5: Prefer a native coroutine, otherwise run the sync function in a thread
+        function = self.async_function_registry.get(template_name)
+        sync_function = self.function_registry.get(template_name)
+        if not function and not sync_function:
+            return {"error": f"No function found for template {template_name}"}
+        
+        async def run():
+            if function:
+                return await function(**variables)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, lambda: sync_function(**variables))
+        
+        with METRICS.span("execute", template=template_name) as span:
+            try:
+                if self.execution_cache:
+                    result, cached = await self.execution_cache.arun(template_name, variables, run)
+                else:
+                    result, cached = await run(), False
+                response = self._success(template_name, variables, result, cached=cached)
+            except Exception as e:
+                response = self._failure(template_name, e)
+            span.update(outcome=self._outcome(response))
+            return response
+    
+    def _identify(self, user_input: str) -> Tuple[Optional[str], float]:
+        """Keyword identification, timed and counted by confidence bucket"""
+        with METRICS.span("identify") as span:
+            template_name, confidence = self.template_identifier.identify_template(user_input)
+            span["template"] = template_name
+        METRICS.increment("agent_confidence_total", source="keyword", bucket=confidence_bucket(confidence))
+        return template_name, confidence
+    
+    def _classify(self, user_input: str) -> Tuple[Optional[str], float]:
+        """NLI fallback for low-confidence keyword matches"""
+        METRICS.increment("agent_classifier_fallback_total")
+        with METRICS.span("classify") as span:
             template_name, confidence = self.nlp_classifier.classify_intent(user_input)
+            span["template"] = template_name
+        METRICS.increment("agent_confidence_total", source="classifier", bucket=confidence_bucket(confidence))
+        return template_name, confidence
+    
+    def _profile(self, name: str) -> ContextManager:
+        if self.slow_request_profiler is None:
+            return nullcontext()
+        return self.slow_request_profiler.profile(name)
+    
+    def _start_preparation(self, template_name: Optional[str],
+                           current: Optional[Preparation] = None) -> Optional[Preparation]:
+        """Speculative preparation for template_name in pipelined mode, replacing current if it prepares another"""
+        if self.preparer is None:
+            return None
+        if current is not None:
+            if current.template_name == template_name:
+                return current
+            self.preparer.discard(current)
+        return self.preparer.start(template_name) if template_name else None
+    
+    def _await_preparation(self, preparation: Optional[Preparation], variables: Dict) -> None:
+        """
+        Inits the backend of a preparation for a run about to execute and waits for it, so
+        the run skips init; only called with validated variables on an execution cache miss,
+        since a backend init can create the workspace
+        """
+        if preparation is None:
+            return
+        self.preparer.bind(preparation, variables)
+        with METRICS.span("prepare_wait", template=preparation.template_name) as span:
+            span["outcome"] = "ready" if self.preparer.wait(preparation) else "not_ready"
+    
+    def _finish_preparation(self, preparation: Optional[Preparation]) -> None:
+        """Releases a preparation no run claimed: failed validation, abandoned, queued or cached requests"""
+        if preparation is not None:
+            self.preparer.discard(preparation)
+    
+    def _on_session_drop(self, session: Session) -> None:
+        self._finish_preparation(session.preparation)
+    
+    def _execute(self, template_name: str, variables: Dict, preparation: Optional[Preparation] = None) -> Dict:
+        """Looks up and calls the template's function, first binding preparation if the run is not cached"""
+        # Step 4: Get and call the function
+        function = self.function_registry.get(template_name)
+        if not function:
+            return {"error": f"No function found for template {template_name}"}
+        
+        def run():
+            # Only a run that executes binds: the backend init can create the workspace
+            self._await_preparation(preparation, variables)
+            return function(**variables)
+        
+        # Step 5: Execute the function, or reuse an identical earlier or in-flight run
+        with METRICS.span("execute", template=template_name) as span:
+            try:
+                if self.execution_cache:
+                    result, cached = self.execution_cache.run(template_name, variables, run)
+                else:
+                    result, cached = run(), False
+                response = self._success(template_name, variables, result, cached=cached)
+            except Exception as e:
+                response = self._failure(template_name, e)
+            span.update(outcome=self._outcome(response), cached=response.get("cached", False))
+            return response
+    
+    def _enqueue(self, template_name: str, variables: Dict) -> Dict:
+        """Queues the template's function and returns a job handle instead of the result"""
+        if self.job_scheduler is None:
+            raise ValueError("Agent has no job scheduler; pass job_scheduler to queue requests")
+        if template_name not in self.job_scheduler.function_registry:
+            return {"error": f"No function found for template {template_name}"}
         
+        job_id = self.job_scheduler.submit(template_name, variables)
+        return {
+            "status": "queued",
+            "template": template_name,
+            "variables": variables,
+            "job_id": job_id
+        }
+    
+    def _extract_and_validate(self, user_input: str, template_name: Optional[str],
+                              confidence: float) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Returns (variables, None) when ready to execute, else (None, response)"""
         if not template_name or confidence < 0.2:  # Lower threshold since we have fewer templates
-            return {"error": "Could not identify GCP infrastructure request"}
+            return None, {"error": "Could not identify GCP infrastructure request"}
         
         # Step 2: Extract variables
-        variables = self.variable_extractor.extract_variables(user_input, template_name)
+        with METRICS.span("extract", template=template_name):
+            variables = self.variable_extractor.extract_variables(user_input, template_name)
         
+        return self._validate(template_name, variables)
+    
+    def _validate(self, template_name: str, variables: Dict) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Returns (variables, None) when every required variable is set, else (None, missing_variables response)"""
         # Step 3: Validate required variables
-        template_config = self.template_registry["templates"][template_name]
-        missing_vars = []
-        for required_var in template_config["required_vars"]:
-            if not variables.get(required_var):
-                missing_vars.append(required_var)
+        with METRICS.span("validate", template=template_name) as span:
+            template_config = self.registry.current.templates[template_name]
+            missing_vars = []
+            for required_var in template_config["required_vars"]:
+                if not variables.get(required_var):
+                    missing_vars.append(required_var)
+            if missing_vars:
+                span["outcome"] = "missing_variables"
         
         if missing_vars:
-            return {
+            for missing_var in missing_vars:
+                METRICS.increment("agent_missing_variables_total", template=template_name, variable=missing_var)
+            return None, {
                 "status": "missing_variables",
                 "template": template_name,
                 "missing": missing_vars,
                 "extracted": variables
             }
         
-        # Step 4: Get and call the function
-        function = self.function_registry.get(template_name)
-        if not function:
-            return {"error": f"No function found for template {template_name}"}
-        
-        # Step 5: Execute the function
-        try:
-            result = function(**variables)
-            return {
-                "status": "success",
-                "template": template_name,
-                "variables": variables,
-                "result": result
-            }
-        except Exception as e:
-            return {
-                "status": "error", 
-                "template": template_name,
-                "error": str(e)
-            }
+        return variables, None
+    
+    def _on_registry_reload(self, compiled: CompiledRegistry) -> None:
+        """Follows template rollouts: new functions and paths, warnings for unknown functions"""
+        self._bind_functions(compiled)
+        if self.execution_cache:
+            self.execution_cache.template_paths = compiled.template_paths
+        if self.preparer:
+            self.preparer.template_paths = self._preparable_paths(compiled)
+        self._check_functions(compiled)
+
+    def _bind_functions(self, compiled: CompiledRegistry) -> None:
+        """Resolves every template's functions by name, passing provisioning functions its registry path"""
+        functions, async_functions, batch_functions, namers = {}, {}, {}, {}
+        for template_name, function_name in compiled.function_names.items():
+            template_path = compiled.template_paths[template_name]
+            if function_name in PROVISIONING_FUNCTIONS:
+                functions[template_name] = partial(PROVISIONING_FUNCTIONS[function_name], template_path=template_path)
+            if function_name in ASYNC_PROVISIONING_FUNCTIONS:
+                async_functions[template_name] = partial(ASYNC_PROVISIONING_FUNCTIONS[function_name],
+                                                         template_path=template_path)
+            if function_name in BATCH_PROVISIONING_FUNCTIONS:
+                batch_functions[template_name] = BATCH_PROVISIONING_FUNCTIONS[function_name]
+            if function_name in WORKSPACE_NAMERS:
+                namers[template_name] = WORKSPACE_NAMERS[function_name]
+        for table, resolved in ((self.function_registry, functions), (self.async_function_registry, async_functions),
+                                (self.batch_function_registry, batch_functions), (self.workspace_namers, namers)):
+            table.update(resolved)
+            for template_name in set(table) - set(resolved):
+                table.pop(template_name, None)
+
+    def _preparable_paths(self, compiled: CompiledRegistry) -> Dict[str, str]:
+        """Registry paths of the templates whose runs a workspace can be named for ahead of time"""
+        return {name: path for name, path in compiled.template_paths.items() if name in self.workspace_namers}
+    
+    def _check_functions(self, compiled: CompiledRegistry) -> None:
+        for template_name, function_name in compiled.function_names.items():
+            if function_name not in PROVISIONING_FUNCTIONS:
+                logger.warning("Template %s names unknown function %s", template_name, function_name)
+    
+    @staticmethod
+    def _outcome(response: Dict) -> str:
+        """Outcome label for a pipeline response"""
+        if response.get("status") == "success" and not is_successful(response.get("result")):
+            return "terraform_error"
+        if response.get("status"):
+            return response["status"]
+        return "error" if response.get("error") else "ok"
+    
+    @staticmethod
+    def _success(template_name: str, variables: Dict, result, cached: bool = False) -> Dict:
+        response = {
+            "status": "success",
+            "template": template_name,
+            "variables": variables,
+            "result": result
+        }
+        if cached:
+            response["cached"] = True
+        return response
+    
+    @staticmethod
+    def _failure(template_name: str, error: Exception) -> Dict:
+        return {
+            "status": "error", 
+            "template": template_name,
+            "error": str(error)
+        }
 
 # Usage example
 if __name__ == "__main__":
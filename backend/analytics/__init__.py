@@ -0,0 +1,5 @@
+from .utilization import UtilizationStats, METRICS, IDLE_THRESHOLD, DOWNSIZE_P95
+from .loaders import load_csv, load_cloud_monitoring_json, load_cloudwatch_json, load_file
+
+__all__ = ['UtilizationStats', 'METRICS', 'IDLE_THRESHOLD', 'DOWNSIZE_P95', 'load_csv', 'load_cloud_monitoring_json',
+           'load_cloudwatch_json', 'load_file']
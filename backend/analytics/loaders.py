@@ -0,0 +1,267 @@
+"""
+Chunked loaders for exported monitoring time series
+
+Formats:
+    - CSV in long form: one sample per line with resource_id, metric and value
+      columns, plus optional project, machine_type and timestamp columns
+    - Cloud Monitoring JSON: timeSeries objects as returned by
+      projects.timeSeries.list, as a response page, an array of them, or one
+      series per line
+    - CloudWatch JSON: GetMetricData responses whose result labels read
+      "<resource id> <metric name>", e.g. from the label
+      "${PROP('Dim.InstanceId')} ${PROP('MetricName')}"
+
+Every loader feeds a UtilizationStats in chunks and never holds a whole file.
+"""
+import csv
+import io
+from typing import Any, Dict, Iterator, Optional, TextIO
+import numpy as np
+from backend.state.json_stream import JSONStreamReader
+from .utilization import UtilizationStats
+
+# Source metric name -> (metric, scale to a fraction)
+METRIC_ALIASES = {
+    "cpu": ("cpu", 1.0),
+    "cpu_utilization": ("cpu", 1.0),
+    "cpu_percent": ("cpu", 0.01),
+    "compute.googleapis.com/instance/cpu/utilization": ("cpu", 1.0),
+    "agent.googleapis.com/cpu/utilization": ("cpu", 0.01),
+    "CPUUtilization": ("cpu", 0.01),
+    "memory": ("memory", 1.0),
+    "memory_utilization": ("memory", 1.0),
+    "memory_percent": ("memory", 0.01),
+    "agent.googleapis.com/memory/percent_used": ("memory", 0.01),
+    "mem_used_percent": ("memory", 0.01),
+    "MemoryUtilization": ("memory", 0.01)
+}
+
+# Bytes of CSV parsed per chunk
+CSV_CHUNK_BYTES = 16 << 20
+
+# Samples of JSON series collected before they are recorded together
+JSON_BATCH_SAMPLES = 1 << 18
+
+class SeriesBatch:
+    def __init__(self, stats: UtilizationStats, max_samples: int = JSON_BATCH_SAMPLES):
+        """
+        Collects many short series and records them with one UtilizationStats.add per metric
+
+        Args:
+            stats: Accumulator the series go to
+            max_samples: Samples held before the batch is recorded
+        """
+        self.stats = stats
+        self.max_samples = max_samples
+        # Metric -> (resource rows, value arrays) of the series held
+        self._pending: Dict[str, tuple] = {}
+        self._samples = 0
+
+    def add(self, resource: int, metric: str, values: np.ndarray) -> None:
+        rows, chunks = self._pending.setdefault(metric, ([], []))
+        rows.append(np.full(len(values), resource, dtype=np.int64))
+        chunks.append(values)
+        self._samples += len(values)
+        if self._samples >= self.max_samples:
+            self.flush()
+
+    def flush(self) -> None:
+        pending, self._pending, self._samples = self._pending, {}, 0
+        for metric, (rows, chunks) in pending.items():
+            self.stats.add(np.concatenate(rows), metric, np.concatenate(chunks))
+
+def load_csv(stats: UtilizationStats, fileobj: io.BufferedIOBase, chunk_bytes: int = CSV_CHUNK_BYTES) -> int:
+    """
+    Loads a long-form CSV from a binary stream; returns the number of samples recorded
+
+    Unquoted chunks are split and converted by NumPy in bulk; a chunk
+    containing quotes falls back to the csv module.
+    """
+    header = fileobj.readline().decode("utf-8").strip().split(",")
+    columns = {name.strip(): index for index, name in enumerate(header)}
+    for required in ("resource_id", "metric", "value"):
+        if required not in columns:
+            raise ValueError(f"CSV is missing the {required} column")
+
+    recorded = 0
+    remainder = b""
+    while True:
+        block = fileobj.read(chunk_bytes)
+        data = remainder + block
+        if not block:
+            remainder = b""
+        else:
+            cut = data.rfind(b"\n") + 1
+            data, remainder = data[:cut], data[cut:]
+        if data.strip():
+            recorded += _load_csv_block(stats, data, columns, len(header))
+        if not block:
+            return recorded
+
+def load_cloud_monitoring_json(stats: UtilizationStats, fileobj: TextIO) -> int:
+    """Loads Cloud Monitoring timeSeries; returns the number of samples recorded"""
+    batch = SeriesBatch(stats)
+    recorded = 0
+    for series in _iter_json_items(fileobj, "timeSeries"):
+        alias = METRIC_ALIASES.get((series.get("metric") or {}).get("type", ""))
+        if not alias:
+            continue
+        metric, scale = alias
+        labels = (series.get("resource") or {}).get("labels") or {}
+        system_labels = (series.get("metadata") or {}).get("systemLabels") or {}
+        resource_id = labels.get("instance_id") or labels.get("instance_name")
+        if not resource_id:
+            continue
+        index = stats.resource_index(resource_id, labels.get("project_id"), system_labels.get("machine_type"))
+
+        values = np.array([_point_value(point) for point in series.get("points") or []], dtype=np.float64)
+        batch.add(index, metric, values * scale)
+        recorded += len(values)
+    batch.flush()
+    return recorded
+
+def load_cloudwatch_json(stats: UtilizationStats, fileobj: TextIO,
+                         inventory: Optional[Dict[str, Dict[str, str]]] = None) -> int:
+    """
+    Loads CloudWatch GetMetricData results; returns the number of samples recorded
+
+    Args:
+        stats: Accumulator to feed
+        fileobj: JSON text stream
+        inventory: Resource ID -> {"project": ..., "machine_type": ...}; CloudWatch
+            results carry neither, so an account or instance type listing can fill them in
+    """
+    inventory = inventory or {}
+    batch = SeriesBatch(stats)
+    recorded = 0
+    for result in _iter_json_items(fileobj, "MetricDataResults"):
+        resource_id, _, metric_name = (result.get("Label") or "").partition(" ")
+        alias = METRIC_ALIASES.get(metric_name.strip())
+        if not resource_id or not alias:
+            continue
+        metric, scale = alias
+        details = inventory.get(resource_id, {})
+        index = stats.resource_index(resource_id, details.get("project"), details.get("machine_type"))
+
+        values = np.asarray(result.get("Values") or [], dtype=np.float64)
+        batch.add(index, metric, values * scale)
+        recorded += len(values)
+    batch.flush()
+    return recorded
+
+def load_file(stats: UtilizationStats, path: str, inventory: Optional[Dict[str, Dict[str, str]]] = None) -> int:
+    """Loads a .csv export, or a JSON export whose format is told apart by its first keys"""
+    if path.endswith(".csv"):
+        with open(path, "rb") as f:
+            return load_csv(stats, f)
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(4096)
+    with open(path, "r", encoding="utf-8") as f:
+        if "MetricDataResults" in head or '"Values"' in head:
+            return load_cloudwatch_json(stats, f, inventory)
+        return load_cloud_monitoring_json(stats, f)
+
+def _load_csv_block(stats: UtilizationStats, data: bytes, columns: Dict[str, int], width: int) -> int:
+    if b'"' in data:
+        rows = [row for row in csv.reader(io.StringIO(data.decode("utf-8"))) if row]
+        if any(len(row) != width for row in rows):
+            raise ValueError("CSV rows must all have the header's number of columns")
+        table = np.array(rows, dtype=object).astype(bytes) if rows else np.zeros((0, width), dtype=bytes)
+        column = lambda name, rows=slice(None): table[rows, columns[name]] if name in columns else None
+    else:
+        # Fields are cut out of the raw buffer by delimiter offsets, without a Python object per field
+        data = data.strip().replace(b"\r", b"") + b"\n"
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        delimiters = np.flatnonzero((buffer == ord(",")) | (buffer == ord("\n")))
+        if len(delimiters) % width:
+            raise ValueError("CSV rows must all have the header's number of columns")
+        ends = delimiters.reshape(-1, width)
+        starts = np.empty_like(ends)
+        starts[:, 0] = np.concatenate([[0], ends[:-1, -1] + 1])
+        starts[:, 1:] = ends[:, :-1] + 1
+        column = lambda name, rows=slice(None): \
+            _field_column(buffer, starts[rows, columns[name]], ends[rows, columns[name]]) if name in columns else None
+
+    values = column("value")
+    present = values != b""
+    values = np.where(present, values, b"nan").astype(np.float64)
+
+    # Few distinct resources and metrics per block: map those, then broadcast
+    resource_keys, first_row, resource_rows = _unique_runs(column("resource_id"))
+    projects, machine_types = column("project", first_row), column("machine_type", first_row)
+    indexes = np.array([
+        stats.resource_index(
+            key.decode("utf-8"),
+            projects[position].decode("utf-8") if projects is not None else None,
+            machine_types[position].decode("utf-8") if machine_types is not None else None
+        )
+        for position, key in enumerate(resource_keys)
+    ], dtype=np.int64)
+    resources = indexes[resource_rows]
+
+    recorded = 0
+    metric_keys, _, metric_rows = _unique_runs(column("metric"))
+    for position, key in enumerate(metric_keys):
+        alias = METRIC_ALIASES.get(key.decode("utf-8"))
+        if not alias:
+            continue
+        metric, scale = alias
+        selected = metric_rows == position
+        stats.add(resources[selected], metric, values[selected] * scale)
+        recorded += int(np.count_nonzero(selected & present))
+    return recorded
+
+def _field_column(buffer: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Fixed-width bytes array of buffer[start:end] per row, gathered in one fancy index"""
+    starts = starts.astype(np.int32)
+    lengths = (ends - starts).astype(np.int32)
+    width = max(int(lengths.max()) if len(lengths) else 0, 1)
+    offsets = np.arange(width, dtype=np.int32)
+    gathered = buffer[np.minimum(starts[:, None] + offsets, len(buffer) - 1)]
+    gathered[offsets >= lengths[:, None]] = 0
+    return np.ascontiguousarray(gathered).view(f"S{width}").ravel()
+
+def _unique_runs(keys: np.ndarray):
+    """
+    np.unique(keys, return_index=True, return_inverse=True), but sorting only
+    the first key of every run; exports list each series' points together
+    """
+    heads = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    unique, first, inverse = np.unique(keys[heads], return_index=True, return_inverse=True)
+    run_lengths = np.diff(np.append(heads, len(keys)))
+    return unique, heads[first], np.repeat(inverse.ravel(), run_lengths)
+
+def _iter_json_items(fileobj: TextIO, key: str) -> Iterator[Dict[str, Any]]:
+    """
+    Items of every `key` array in a response page, an array of pages or items,
+    or newline-delimited documents, read one item at a time
+    """
+    reader = JSONStreamReader(fileobj)
+    while reader.peek():
+        if reader.peek() == "[":
+            for _ in reader.iter_array():
+                yield from _iter_document_items(reader, key)
+        else:
+            yield from _iter_document_items(reader, key)
+
+def _iter_document_items(reader: JSONStreamReader, key: str) -> Iterator[Dict[str, Any]]:
+    """Items of one object, which is either a page holding `key` or an item itself"""
+    item: Dict[str, Any] = {}
+    for field in reader.iter_object():
+        if field == key:
+            for _ in reader.iter_array():
+                yield reader.read_value()
+        else:
+            item[field] = reader.read_value()
+    if item and key not in item and _looks_like_item(item):
+        yield item
+
+def _looks_like_item(item: Dict[str, Any]) -> bool:
+    return "points" in item or "Values" in item
+
+def _point_value(point: Dict[str, Any]) -> float:
+    value = point.get("value") or {}
+    for field in ("doubleValue", "int64Value"):
+        if field in value:
+            return float(value[field])
+    return float("nan")
@@ -0,0 +1,39 @@
+"""
+Usage:
+    python -m backend.analytics.report metrics.csv cloudwatch.json --group-by project machine_type
+
+Prints per-resource summaries, or pooled groups with --group-by, as JSON.
+"""
+import argparse
+import json
+import sys
+from .loaders import load_file
+from .utilization import UtilizationStats
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Utilization summaries for rightsizing")
+    parser.add_argument("paths", nargs="+", help="CSV, Cloud Monitoring JSON or CloudWatch JSON exports")
+    parser.add_argument("--inventory", help="JSON object: resource ID -> {project, machine_type}")
+    parser.add_argument("--group-by", nargs="*", choices=["project", "machine_type"],
+                        help="Pool resources by these keys instead of listing them")
+    parser.add_argument("--bins", type=int, default=200, help="Histogram resolution over [0, 100]%%")
+    args = parser.parse_args(argv)
+
+    inventory = None
+    if args.inventory:
+        with open(args.inventory, "r") as f:
+            inventory = json.load(f)
+
+    stats = UtilizationStats(bins=args.bins)
+    samples = sum(load_file(stats, path, inventory) for path in args.paths)
+    report = {
+        "samples": samples,
+        "resources": len(stats),
+        "results": stats.group(args.group_by) if args.group_by is not None else stats.summaries()
+    }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Vectorized utilization statistics for rightsizing
+
+Samples are never kept: every (resource, metric) pair owns a fixed-width
+histogram of utilization in [0, 1], updated with one np.bincount per chunk of
+samples. Memory therefore depends on the number of resources, not on how many
+days of minute-level points are fed in, and percentiles, means and idle
+ratios for all resources come out of a few array operations.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+METRICS = ("cpu", "memory")
+
+# Below this utilization a sample counts as idle
+IDLE_THRESHOLD = 0.05
+
+# A resource whose p95 stays under both limits is suggested for a smaller machine type
+DOWNSIZE_P95 = {"cpu": 0.40, "memory": 0.50}
+
+PERCENTILES = (50, 95, 99)
+
+class UtilizationStats:
+    def __init__(self, metrics: Sequence[str] = METRICS, bins: int = 200, idle_threshold: float = IDLE_THRESHOLD):
+        """
+        Streaming accumulator of utilization samples per resource
+
+        Args:
+            metrics: Metric names samples are recorded under
+            bins: Histogram bins over [0, 1]; percentiles are exact to 1 / bins
+            idle_threshold: Utilization below which a sample counts as idle
+        """
+        self.metrics = list(metrics)
+        self.bins = bins
+        self.idle_threshold = idle_threshold
+
+        self.resource_ids: List[str] = []
+        self.projects: List[str] = []
+        self.machine_types: List[str] = []
+        self._index: Dict[str, int] = {}
+
+        self.counts = np.zeros((0, len(self.metrics), bins), dtype=np.int32)
+        self.sums = np.zeros((0, len(self.metrics)), dtype=np.float64)
+        self.idle = np.zeros((0, len(self.metrics)), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.resource_ids)
+
+    def resource_index(self, resource_id: str, project: Optional[str] = None,
+                       machine_type: Optional[str] = None) -> int:
+        """Row of resource_id, registering it on first sight; known metadata is filled in, never erased"""
+        index = self._index.get(resource_id)
+        if index is None:
+            index = len(self.resource_ids)
+            self._index[resource_id] = index
+            self.resource_ids.append(resource_id)
+            self.projects.append(project or "")
+            self.machine_types.append(machine_type or "")
+        else:
+            if project and not self.projects[index]:
+                self.projects[index] = project
+            if machine_type and not self.machine_types[index]:
+                self.machine_types[index] = machine_type
+        return index
+
+    def add(self, resources: np.ndarray, metric: str, values: np.ndarray) -> None:
+        """
+        Records a chunk of samples of one metric
+
+        Args:
+            resources: Row per sample, as returned by resource_index
+            metric: One of metrics
+            values: Utilization per sample as a fraction; NaNs are skipped
+        """
+        resources = np.asarray(resources, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if resources.ndim == 0:
+            resources = np.full(len(values), int(resources), dtype=np.int64)
+        valid = ~np.isnan(values)
+        if not valid.all():
+            resources, values = resources[valid], values[valid]
+        if not len(values):
+            return
+        self._grow(len(self.resource_ids))
+
+        metric_index = self.metrics.index(metric)
+        # Only the rows present in the chunk are touched, so the cost follows the chunk, not the
+        # number of known resources; samples are counted against positions within those rows
+        if (resources == resources[0]).all():
+            rows, local = resources[:1], np.zeros(len(resources), dtype=np.int64)
+        else:
+            rows, local = np.unique(resources, return_inverse=True)
+        bins = np.clip((values * self.bins).astype(np.int64), 0, self.bins - 1)
+        counts = np.bincount(local * self.bins + bins, minlength=len(rows) * self.bins)
+        self.counts[rows, metric_index, :] += counts.reshape(len(rows), self.bins).astype(np.int32)
+        self.sums[rows, metric_index] += np.bincount(local, weights=values, minlength=len(rows))
+        self.idle[rows, metric_index] += np.bincount(local[values < self.idle_threshold], minlength=len(rows))
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """Per resource: project, machine type and per-metric mean, percentiles, max and idle ratio"""
+        rows = len(self.resource_ids)
+        stats = self._stats(self.counts[:rows], self.sums[:rows], self.idle[:rows])
+        results = []
+        for index, resource_id in enumerate(self.resource_ids):
+            summary = {
+                "resource_id": resource_id,
+                "project": self.projects[index],
+                "machine_type": self.machine_types[index]
+            }
+            summary.update(self._metric_summaries(stats, index))
+            suggestion = self._suggestion(summary)
+            if suggestion:
+                summary["suggestion"] = suggestion
+            results.append(summary)
+        return results
+
+    def group(self, by: Sequence[str] = ("project", "machine_type")) -> List[Dict[str, Any]]:
+        """
+        Pooled statistics per group of resources
+
+        Args:
+            by: Any of "project" and "machine_type"
+
+        Returns:
+            Per group: its keys, resource count, pooled per-metric statistics
+            and how many of its resources would be suggested for downsizing
+        """
+        columns = {"project": self.projects, "machine_type": self.machine_types}
+        keys = list(zip(*(columns[name] for name in by))) if by else [()] * len(self.resource_ids)
+        group_keys = sorted(set(keys))
+        position = {key: index for index, key in enumerate(group_keys)}
+        groups = np.array([position[key] for key in keys], dtype=np.int64)
+
+        rows = len(self.resource_ids)
+        counts = np.zeros((len(group_keys),) + self.counts.shape[1:], dtype=np.int64)
+        np.add.at(counts, groups, self.counts[:rows])
+        sums = np.zeros((len(group_keys), len(self.metrics)))
+        np.add.at(sums, groups, self.sums[:rows])
+        idle = np.zeros((len(group_keys), len(self.metrics)), dtype=np.int64)
+        np.add.at(idle, groups, self.idle[:rows])
+        stats = self._stats(counts, sums, idle)
+
+        downsizable = np.zeros(len(group_keys), dtype=np.int64)
+        for summary, group in zip(self.summaries(), groups):
+            downsizable[group] += "suggestion" in summary
+
+        results = []
+        for index, key in enumerate(group_keys):
+            summary = dict(zip(by, key))
+            summary["resources"] = int(np.sum(groups == index))
+            summary.update(self._metric_summaries(stats, index))
+            summary["downsize_candidates"] = int(downsizable[index])
+            results.append(summary)
+        return results
+
+    def context_for(self, project: str, machine_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Compact utilization context for a proposed resource
+
+        Pooled statistics of existing resources in the same project (and
+        machine type, if given), meant to be attached to a provisioning
+        proposal. None when nothing comparable has been recorded.
+        """
+        by = ("project", "machine_type") if machine_type else ("project",)
+        wanted = (project, machine_type) if machine_type else (project,)
+        for summary in self.group(by):
+            if tuple(summary[name] for name in by) == wanted:
+                return summary
+        return None
+
+    def _grow(self, resources: int) -> None:
+        missing = resources - len(self.counts)
+        if missing <= 0:
+            return
+        # Grow in steps so registering resources one by one stays cheap
+        missing = max(missing, len(self.counts))
+        self.counts = np.concatenate([self.counts, np.zeros((missing,) + self.counts.shape[1:], dtype=np.int32)])
+        self.sums = np.concatenate([self.sums, np.zeros((missing, len(self.metrics)))])
+        self.idle = np.concatenate([self.idle, np.zeros((missing, len(self.metrics)), dtype=np.int64)])
+
+    def _stats(self, counts: np.ndarray, sums: np.ndarray, idle: np.ndarray) -> Dict[str, np.ndarray]:
+        """Vectorized statistics over histograms shaped (rows, metrics, bins)"""
+        totals = counts.sum(axis=2)
+        safe = np.maximum(totals, 1)
+        cumulative = np.cumsum(counts, axis=2)
+
+        stats = {"points": totals, "mean": sums / safe, "idle_ratio": idle / safe}
+        for percentile in PERCENTILES:
+            target = np.ceil(totals * percentile / 100.0)[..., None]
+            # First bin whose cumulative count reaches the target, reported at its midpoint
+            index = np.argmax(cumulative >= np.maximum(target, 1), axis=2)
+            stats[f"p{percentile}"] = (index + 0.5) / self.bins
+        nonzero = counts > 0
+        top = self.bins - 1 - np.argmax(nonzero[..., ::-1], axis=2)
+        stats["max"] = (top + 1.0) / self.bins
+        return stats
+
+    def _metric_summaries(self, stats: Dict[str, np.ndarray], row: int) -> Dict[str, Dict[str, float]]:
+        """Percent values rounded to 0.1 and idle ratios to 0.001, for metrics with samples"""
+        summaries = {}
+        for metric_index, metric in enumerate(self.metrics):
+            points = int(stats["points"][row, metric_index])
+            if not points:
+                continue
+            summary = {"points": points}
+            for name in ("mean", *(f"p{p}" for p in PERCENTILES), "max"):
+                summary[name] = round(float(stats[name][row, metric_index]) * 100, 1)
+            summary["idle_ratio"] = round(float(stats["idle_ratio"][row, metric_index]), 3)
+            summaries[metric] = summary
+        return summaries
+
+    @staticmethod
+    def _suggestion(summary: Dict[str, Any]) -> Optional[str]:
+        checked = [metric for metric in DOWNSIZE_P95 if metric in summary]
+        if checked and all(summary[metric]["p95"] < DOWNSIZE_P95[metric] * 100 for metric in checked):
+            return "downsize"
+        return None
@@ -0,0 +1,274 @@
+"""
+Batch processing of JSONL request files
+
+Usage:
+    python -m backend.batch prompts.jsonl --output results.jsonl --workers 8 --dry-run
+
+Every input line is a JSON string or an object with a "prompt" (and an
+optional "id"). Chunks of prompts run through InfrastructureAgent.process_requests
+in a process pool whose workers each build one agent, so the classifier is
+loaded once per worker. Results are written as JSONL in input order while the
+run progresses, and a checkpoint next to the output records how far the
+output is complete, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+# Keys an input object may carry its prompt under
+PROMPT_KEYS = ("prompt", "user_input", "text")
+
+# Agent of this worker process, built once by _init_worker
+_agent = None
+
+def _init_worker(agent_options: Dict[str, Any]) -> None:
+    global _agent
+    from backend.agent import InfrastructureAgent
+    _agent = InfrastructureAgent(**agent_options)
+
+def _process_chunk(prompts: List[str], dry_run: bool) -> List[Dict]:
+    return _agent.process_requests(prompts, dry_run=dry_run)
+
+class Checkpoint:
+    def __init__(self, path: str):
+        """
+        Progress of a batch run, replaced atomically
+
+        Args:
+            path: Checkpoint file, by default the output path plus ".checkpoint"
+        """
+        self.path = path
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version in {self.path}")
+        return state
+
+    def save(self, state: Dict[str, Any]) -> None:
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(dict(state, version=CHECKPOINT_VERSION), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def read_requests(fileobj: BinaryIO, line: int = 0) -> Iterator[Tuple[int, int, Optional[str], Any, Optional[str]]]:
+    """
+    Parses a JSONL stream one line at a time
+
+    Args:
+        fileobj: Binary stream positioned at the start of line number `line`
+        line: Number of the first line read, for resumed runs
+
+    Yields:
+        (line number, stream offset after the line, prompt or None, id, parse error or None);
+        blank lines are skipped
+    """
+    while True:
+        raw = fileobj.readline()
+        if not raw:
+            return
+        line += 1
+        if not raw.strip():
+            continue
+        request_id, prompt, error = None, None, None
+        try:
+            value = json.loads(raw)
+            if isinstance(value, dict):
+                request_id = value.get("id")
+                prompt = next((value[key] for key in PROMPT_KEYS if key in value), None)
+            else:
+                prompt = value
+            if not isinstance(prompt, str):
+                prompt, error = None, f"Expected a string or an object with one of {', '.join(PROMPT_KEYS)}"
+        except ValueError as e:
+            error = f"Invalid JSON: {e}"
+        yield line, fileobj.tell(), prompt, request_id, error
+
+def run_batch(input_path: str, output_path: str, workers: int = os.cpu_count() or 1, chunk_size: int = 64,
+              dry_run: bool = False, checkpoint_path: Optional[str] = None, checkpoint_interval: float = 5.0,
+              restart: bool = False, agent_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Streams input_path through the agent into output_path
+
+    Args:
+        input_path: JSONL requests
+        output_path: JSONL results, one {"line", "id", "prompt", "response"} object per request, in input order
+        workers: Worker processes; 0 runs in this process
+        chunk_size: Prompts per task; low-confidence prompts of a chunk share one classifier pass
+        dry_run: Identify and extract only; no provisioning function is executed
+        checkpoint_path: Progress file, by default output_path + ".checkpoint"; removed when the run completes
+        checkpoint_interval: Seconds between checkpoints
+        restart: Ignore an existing checkpoint and start over
+        agent_options: Keyword arguments for each worker's InfrastructureAgent
+
+    Returns:
+        Counts of processed requests and their outcomes, the line the run resumed after, and throughput
+    """
+    checkpoint = Checkpoint(checkpoint_path or f"{output_path}.checkpoint")
+    state = None if restart else checkpoint.load()
+    if state is not None:
+        if state["input"] != os.path.abspath(input_path) or state["dry_run"] != dry_run:
+            raise ValueError(f"Checkpoint {checkpoint.path} belongs to another run; pass restart to start over")
+        if os.path.getsize(input_path) < state["input_offset"]:
+            raise ValueError(f"{input_path} is shorter than when {checkpoint.path} was written")
+        logger.info("Resuming %s after line %d", input_path, state["line"])
+    else:
+        state = {"input": os.path.abspath(input_path), "dry_run": dry_run, "line": 0, "input_offset": 0,
+                 "output_offset": 0, "processed": 0, "outcomes": {}}
+    resumed_from = state["line"]
+    processed_before = state["processed"]
+
+    if workers > 0:
+        executor: Executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                 initargs=(agent_options or {},))
+    else:
+        executor = ThreadPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(agent_options or {},))
+
+    started = time.perf_counter()
+    with open(input_path, "rb") as source, open(output_path, "ab") as output:
+        # Anything after the checkpointed offset may be a partial chunk from the interrupted run
+        output.truncate(state["output_offset"])
+        output.seek(state["output_offset"])
+        source.seek(state["input_offset"])
+
+        pending: Dict[int, Tuple[List[Tuple], Optional[Future]]] = {}
+        next_to_submit = next_to_write = 0
+        last_checkpoint = time.monotonic()
+        requests = read_requests(source, state["line"])
+        exhausted = False
+        try:
+            while True:
+                # Keep every worker busy with a bounded number of chunks in flight
+                while not exhausted and len(pending) < max(workers, 1) * 2:
+                    chunk = [request for _, request in zip(range(chunk_size), requests)]
+                    if not chunk:
+                        exhausted = True
+                        break
+                    prompts = [prompt for _, _, prompt, _, _ in chunk if prompt is not None]
+                    future = executor.submit(_process_chunk, prompts, dry_run) if prompts else None
+                    pending[next_to_submit] = (chunk, future)
+                    next_to_submit += 1
+                if not pending:
+                    break
+
+                # Write the next chunk in input order once it finishes; later chunks wait their turn
+                chunk, future = pending.pop(next_to_write)
+                if future is not None:
+                    wait([future])
+                next_to_write += 1
+                responses = iter(_chunk_responses(future, sum(prompt is not None for _, _, prompt, _, _ in chunk)))
+                lines = []
+                for line, offset, prompt, request_id, error in chunk:
+                    response = next(responses) if prompt is not None else {"error": error}
+                    outcome = response.get("status") or ("error" if response.get("error") else "ok")
+                    state["outcomes"][outcome] = state["outcomes"].get(outcome, 0) + 1
+                    lines.append(json.dumps({"line": line, "id": request_id, "prompt": prompt, "response": response},
+                                            default=str))
+                    state["line"], state["input_offset"] = line, offset
+                output.write(("\n".join(lines) + "\n").encode("utf-8"))
+                state["processed"] += len(chunk)
+
+                if time.monotonic() - last_checkpoint >= checkpoint_interval:
+                    _save_checkpoint(checkpoint, state, output)
+                    last_checkpoint = time.monotonic()
+        except BaseException:
+            # Record what was fully written before giving up, so the next run resumes there
+            _save_checkpoint(checkpoint, state, output)
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+        output.flush()
+    checkpoint.remove()
+
+    seconds = time.perf_counter() - started
+    processed = state["processed"] - processed_before
+    return {
+        "processed": processed,
+        "resumed_after_line": resumed_from,
+        "outcomes": state["outcomes"],
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(processed / seconds, 1) if seconds else None
+    }
+
+def _chunk_responses(future: Optional[Future], count: int) -> List[Dict]:
+    """A chunk's responses; a chunk that raised gets the error as every prompt's response"""
+    if future is None:
+        return []
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        logger.exception("Chunk failed")
+        return [{"error": f"Batch worker failed: {e}"}] * count
+
+def _save_checkpoint(checkpoint: Checkpoint, state: Dict[str, Any], output: BinaryIO) -> None:
+    """Makes the output durable up to its current end, then points the checkpoint there"""
+    output.flush()
+    os.fsync(output.fileno())
+    state["output_offset"] = output.tell()
+    checkpoint.save(state)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a JSONL file of requests through InfrastructureAgent")
+    parser.add_argument("input", help="JSONL file: one prompt string or {\"prompt\", \"id\"} object per line")
+    parser.add_argument("--output", required=True, help="JSONL results, in input order")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes; 0 runs inline")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Prompts per worker task")
+    parser.add_argument("--dry-run", action="store_true", help="Identify and extract only; execute nothing")
+    parser.add_argument("--checkpoint", help="Progress file (default: OUTPUT.checkpoint)")
+    parser.add_argument("--checkpoint-interval", type=float, default=5.0, help="Seconds between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--classifier", choices=["zero-shot", "embedding"], default="zero-shot")
+    parser.add_argument("--classifier-runtime", choices=["pytorch", "int8", "onnx"],
+                        help="Zero-shot runtime (see model_loader.ZERO_SHOT_RUNTIMES)")
+    parser.add_argument("--classifier-threads", type=int,
+                        help="CPU threads per worker's classifier; keep workers x threads <= cores")
+    parser.add_argument("--cache-ttl", type=float, default=0.0,
+                        help="Per-worker execution cache TTL; 0 executes every request")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    classifier_options = {}
+    if args.classifier == "zero-shot":
+        if args.classifier_runtime:
+            classifier_options["runtime"] = args.classifier_runtime
+        if args.classifier_threads:
+            classifier_options["num_threads"] = args.classifier_threads
+    agent_options = {"classifier_backend": args.classifier, "classifier_options": classifier_options,
+                     "cache_ttl": args.cache_ttl}
+
+    try:
+        summary = run_batch(args.input, args.output, workers=args.workers, chunk_size=args.chunk_size,
+                            dry_run=args.dry_run, checkpoint_path=args.checkpoint,
+                            checkpoint_interval=args.checkpoint_interval, restart=args.restart,
+                            agent_options=agent_options)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; rerun the same command to resume")
+        return 130
+    json.dump(summary, sys.stderr, indent=2)
+    sys.stderr.write("\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
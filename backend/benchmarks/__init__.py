@@ -0,0 +1,6 @@
+"""
+Offline benchmarks for the NLP -> Terraform pipeline
+
+Run with `python -m backend.benchmarks.run` from the repository root; no
+Terraform Cloud credentials or model downloads are needed.
+"""
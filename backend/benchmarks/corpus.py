@@ -0,0 +1,108 @@
+"""
+Labeled prompt corpus for benchmarks
+
+Every prompt carries the template it should be routed to (None for
+requests no template covers) and the variables a perfect extractor would
+return, so speed and accuracy can be measured on the same data.
+"""
+import random
+from typing import Any, Dict, List, Optional
+
+VERBS = ["Create", "create", "Make", "Provision", "Set up", "Spin up", "I need", "Please create",
+         "Can you create", "Deploy"]
+ARTICLES = ["a", "a new", "one", "an additional"]
+PURPOSES = ["", " for storing images", " for backups", " to hold logs", " for our ML datasets",
+            " for static website assets"]
+LOCATIONS = ["US", "EU", "ASIA", "us-central1", "europe-west1", "asia-east1", "us-east4"]
+NAME_WORDS = ["data", "logs", "images", "backup", "archive", "assets", "ml", "raw", "export", "media"]
+PROJECT_WORDS = ["analytics", "platform", "web", "billing", "research", "infra", "mobile"]
+
+# Phrasings that carry no template keyword; only the classifier can route them
+KEYWORDLESS_PHRASES = [
+    "I need somewhere to keep files called {name} in project {project}",
+    "Set up object store {name} under project {project}",
+    "Give me a place for blobs named {name} in project {project}",
+]
+
+# Requests for infrastructure no template covers
+UNSUPPORTED = [
+    "Create a VM with 16 gb ram in project {project}",
+    "Spin up a Cloud SQL postgres database in project {project}",
+    "Make a GKE cluster named {name} in {location}",
+    "Open port 443 on the firewall for project {project}",
+    "Create a pub/sub topic called {name}",
+    "Delete the load balancer {name}",
+]
+
+def _bucket_name(rng: random.Random) -> str:
+    return f"{rng.choice(NAME_WORDS)}-{rng.choice(NAME_WORDS)}-{rng.randint(1, 9999)}"
+
+def _project_id(rng: random.Random) -> str:
+    return f"{rng.choice(PROJECT_WORDS)}-{rng.choice(['prod', 'dev', 'staging'])}-{rng.randint(100, 999)}"
+
+def _bucket_prompt(rng: random.Random) -> Dict[str, Any]:
+    name = _bucket_name(rng)
+    project = _project_id(rng)
+    location: Optional[str] = rng.choice(LOCATIONS + [None, None])
+
+    bucket_phrase = rng.choice([
+        f'GCS bucket called "{name}"',
+        f'GCS bucket named "{name}"',
+        f'storage bucket "{name}"',
+        f"gcs bucket {name}",
+        f"storage bucket {name}",
+        f'cloud storage bucket named "{name}"',
+    ])
+    project_phrase = rng.choice([
+        f"in project {project}",
+        f'in project id "{project}"',
+        f'in project "{project}"',
+        f"for project {project}",
+    ])
+    location_phrase = ""
+    if location:
+        location_phrase = rng.choice([f" in {location}", f' location "{location}"'])
+
+    parts = [f"{rng.choice(VERBS)} {rng.choice(ARTICLES)} {bucket_phrase}", project_phrase]
+    rng.shuffle(parts)
+    prompt = " ".join(parts) + location_phrase + rng.choice(PURPOSES)
+    return {
+        "prompt": prompt,
+        "template": "gcs-bucket",
+        "variables": {"bucket_name": name, "project_id": project, "location": location},
+        "kind": "keyword"
+    }
+
+def generate_corpus(size: int = 2000, seed: int = 7, keywordless_ratio: float = 0.05,
+                    unsupported_ratio: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    Builds a reproducible labeled corpus
+
+    Args:
+        size: Number of prompts
+        seed: Random seed; the same seed always yields the same corpus
+        keywordless_ratio: Share of bucket requests phrased without any template keyword
+        unsupported_ratio: Share of requests for resources no template covers
+
+    Returns:
+        Dicts with prompt, expected template, expected variables and kind
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        roll = rng.random()
+        if roll < unsupported_ratio:
+            prompt = rng.choice(UNSUPPORTED).format(name=_bucket_name(rng), project=_project_id(rng),
+                                                    location=rng.choice(LOCATIONS))
+            corpus.append({"prompt": prompt, "template": None, "variables": {}, "kind": "unsupported"})
+        elif roll < unsupported_ratio + keywordless_ratio:
+            name, project = _bucket_name(rng), _project_id(rng)
+            corpus.append({
+                "prompt": rng.choice(KEYWORDLESS_PHRASES).format(name=name, project=project),
+                "template": "gcs-bucket",
+                "variables": {"bucket_name": name, "project_id": project, "location": None},
+                "kind": "keywordless"
+            })
+        else:
+            corpus.append(_bucket_prompt(rng))
+    return corpus
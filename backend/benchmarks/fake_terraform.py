@@ -0,0 +1,82 @@
+"""
+Stand-in `terraform` executable for offline client benchmarks
+
+The script answers init, validate, plan and apply after configurable
+delays and prints output shaped like the real CLI's, so TerraformCloudClient
+runs end to end without network access or credentials. With
+FAKE_TERRAFORM_LOG set, every call appends a tab-separated line: the
+arguments, TF_PLUGIN_CACHE_DIR and TF_DATA_DIR. A backend init fails with
+"Backend configuration changed" when the data directory was initialized
+for another backend, unless -reconfigure is given.
+"""
+import os
+import stat
+from typing import Dict, Optional
+
+SCRIPT = """#!/bin/sh
+if [ -n "$FAKE_TERRAFORM_LOG" ]; then
+  printf '%s\\t%s\\t%s\\n' "$*" "$TF_PLUGIN_CACHE_DIR" "$TF_DATA_DIR" >> "$FAKE_TERRAFORM_LOG"
+fi
+case "$1" in
+  init)
+    # Provider installation is the slow part; a data directory that has it re-inits at once
+    if [ ! -e "${{TF_DATA_DIR:-.terraform}}/providers" ]; then
+      sleep {init}
+      mkdir -p "${{TF_DATA_DIR:-.terraform}}/providers"
+    fi
+    # Like the real CLI, refuse a backend other than the one the data directory was initialized with
+    case " $* " in
+      *" -backend=false "*) ;;
+      *)
+        saved="${{TF_DATA_DIR:-.terraform}}/backend.tf.json"
+        case " $* " in *" -reconfigure "*) rm -f "$saved";; esac
+        if [ -e "$saved" ] && ! cmp -s backend.tf.json "$saved"; then
+          echo "Error: Backend configuration changed" >&2
+          exit 1
+        fi
+        cp backend.tf.json "$saved" 2>/dev/null
+        ;;
+    esac
+    echo "Terraform has been successfully initialized!"
+    ;;
+  validate)
+    echo "Success! The configuration is valid."
+    ;;
+  plan)
+    sleep {plan}
+    i=0
+    while [ $i -lt {resources} ]; do
+      echo "  # google_storage_bucket.bucket[\\"b$i\\"] will be created"
+      i=$((i+1))
+    done
+    echo "Plan: {resources} to add, 0 to change, 0 to destroy."
+    # -detailed-exitcode reports pending changes as exit code 2
+    case " $* " in *" -detailed-exitcode "*) exit 2;; esac
+    ;;
+  apply)
+    sleep {apply}
+    echo "Apply complete! Resources: {resources} added, 0 changed, 0 destroyed."
+    ;;
+esac
+exit 0
+"""
+
+DEFAULT_DELAYS = {"init": 0.2, "plan": 0.5, "apply": 1.0}
+
+def install_fake_terraform(directory: str, delays: Optional[Dict[str, float]] = None,
+                           resources: int = 1) -> str:
+    """
+    Writes the fake executable into directory and returns its path
+
+    Args:
+        directory: Where to create the `terraform` script
+        delays: Seconds each of init, plan and apply takes
+        resources: Number of resources the fake plan reports
+    """
+    settings = {**DEFAULT_DELAYS, **(delays or {})}
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "terraform")
+    with open(path, "w") as f:
+        f.write(SCRIPT.format(resources=resources, **settings))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
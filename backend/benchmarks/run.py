@@ -0,0 +1,351 @@
+"""
+Offline benchmark runner
+
+Usage:
+    python -m backend.benchmarks.run --prompts 5000 --output results.json
+
+Times TemplateIdentifier, VariableExtractor, the classifier fallback and
+TerraformCloudClient (against a fake terraform executable), reports
+p50/p95/p99 latency and throughput next to accuracy, and writes JSON so
+results can be compared between runs.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from backend.benchmarks.corpus import generate_corpus
+from backend.benchmarks.fake_terraform import install_fake_terraform
+from backend.extractor.template_identifier import TemplateIdentifier
+from backend.extractor.variable_extractor import VariableExtractor
+from backend.metrics import METRICS
+from backend.registry import get_registry
+from backend.terraform.client import TerraformCloudClient
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGISTRY_PATH = os.path.join(BACKEND_DIR, "templates", "registry.json")
+BENCH_TEMPLATE_PATH = os.path.join(BACKEND_DIR, "templates", "gcp", "gcs-buckets")
+
+# Thresholds used by InfrastructureAgent
+KEYWORD_THRESHOLD = 0.4
+ACCEPT_THRESHOLD = 0.2
+
+class StubClassifier:
+    """
+    Stand-in for NLPTemplateClassifier with a fixed per-call cost
+
+    Like zero-shot classification it always names a template, with low
+    confidence when the prompt has no storage-related cue.
+    """
+    CUES = ("store", "storage", "bucket", "blob", "files", "object")
+
+    def __init__(self, template_name: str = "gcs-bucket", delay: float = 0.0):
+        self.template_name = template_name
+        self.delay = delay
+
+    def classify_intent(self, prompt: str) -> Tuple[str, float]:
+        if self.delay:
+            time.sleep(self.delay)
+        lowered = prompt.lower()
+        confidence = 0.8 if any(cue in lowered for cue in self.CUES) else 0.1
+        return self.template_name, confidence
+
+    def classify_intents(self, prompts: List[str]) -> List[Tuple[str, float]]:
+        return [self.classify_intent(prompt) for prompt in prompts]
+
+
+def latency_stats(samples: List[float], wall_time: Optional[float] = None) -> Dict[str, float]:
+    """Nearest-rank percentiles in milliseconds, plus throughput over wall_time (or the summed samples)"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))] * 1000
+
+    total = wall_time if wall_time is not None else sum(samples)
+    return {
+        "count": len(samples),
+        "throughput_per_s": len(samples) / total if total else 0.0,
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000
+    }
+
+def timed(function: Callable, items: List[Any]) -> Tuple[List[Any], List[float]]:
+    results, samples = [], []
+    for item in items:
+        start = time.perf_counter()
+        results.append(function(item))
+        samples.append(time.perf_counter() - start)
+    return results, samples
+
+def bench_identify(identifier: TemplateIdentifier, corpus: List[Dict]) -> Dict[str, Any]:
+    prompts = [entry["prompt"] for entry in corpus]
+    identified, samples = timed(identifier.identify_template, prompts)
+
+    confident = correct = 0
+    for entry, (template_name, confidence) in zip(corpus, identified):
+        if confidence >= KEYWORD_THRESHOLD:
+            confident += 1
+            correct += template_name == entry["template"]
+    return {
+        "latency": latency_stats(samples),
+        "accuracy": {
+            # Precision of the keyword stage on the prompts it decides alone
+            "keyword_precision": correct / confident if confident else None,
+            "fallback_rate": 1 - confident / len(corpus)
+        }
+    }
+
+def bench_extract(extractor: VariableExtractor, corpus: List[Dict]) -> Dict[str, Any]:
+    entries = [entry for entry in corpus if entry["template"] == "gcs-bucket"]
+    extracted, samples = timed(lambda prompt: extractor.extract_variables(prompt, "gcs-bucket"),
+                               [entry["prompt"] for entry in entries])
+
+    per_variable: Dict[str, int] = {}
+    exact = 0
+    for entry, variables in zip(entries, extracted):
+        expected = entry["variables"]
+        matches = {name: variables.get(name) == value for name, value in expected.items()}
+        for name, matched in matches.items():
+            per_variable[name] = per_variable.get(name, 0) + matched
+        exact += all(matches.values())
+    return {
+        "latency": latency_stats(samples),
+        "accuracy": {
+            "exact_match": exact / len(entries) if entries else None,
+            "per_variable": {name: count / len(entries) for name, count in per_variable.items()}
+        }
+    }
+
+def bench_classifier(classifier, corpus: List[Dict], limit: int) -> Dict[str, Any]:
+    entries = corpus[:limit]
+    prompts = [entry["prompt"] for entry in entries]
+    classified, samples = timed(classifier.classify_intent, prompts)
+
+    start = time.perf_counter()
+    classifier.classify_intents(prompts)
+    batch_time = time.perf_counter() - start
+
+    correct = sum(
+        (template_name if confidence >= ACCEPT_THRESHOLD else None) == entry["template"]
+        for entry, (template_name, confidence) in zip(entries, classified)
+    )
+    return {
+        "latency": latency_stats(samples),
+        "batched": {"count": len(prompts), "throughput_per_s": len(prompts) / batch_time if batch_time else 0.0},
+        "accuracy": {"routing": correct / len(entries) if entries else None}
+    }
+
+def bench_classifier_against_baseline(classifier, baseline, corpus: List[Dict], limit: int) -> Dict[str, Any]:
+    """Accuracy of classifier relative to a full-precision baseline on the same prompts"""
+    entries = corpus[:limit]
+    prompts = [entry["prompt"] for entry in entries]
+    rss_before = resident_memory_mb()
+    baseline_results, baseline_samples = timed(baseline.classify_intent, prompts)
+    baseline_rss = resident_memory_mb() - rss_before
+
+    candidate = [result for result in (classifier.classify_intent(prompt) for prompt in prompts)]
+
+    def routing_accuracy(results):
+        return sum(
+            (template_name if confidence >= ACCEPT_THRESHOLD else None) == entry["template"]
+            for entry, (template_name, confidence) in zip(entries, results)
+        ) / len(entries)
+
+    agreement = sum(
+        a[0] == b[0] and (a[1] >= ACCEPT_THRESHOLD) == (b[1] >= ACCEPT_THRESHOLD)
+        for a, b in zip(candidate, baseline_results)
+    )
+    return {
+        "baseline_latency": latency_stats(baseline_samples),
+        "baseline_memory_mb": baseline_rss,
+        "baseline_routing": routing_accuracy(baseline_results),
+        "routing_delta": routing_accuracy(candidate) - routing_accuracy(baseline_results),
+        "decision_agreement": agreement / len(entries),
+        "mean_confidence_delta": sum(a[1] - b[1] for a, b in zip(candidate, baseline_results)) / len(entries)
+    }
+
+def resident_memory_mb() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        import resource
+        # Peak rather than current RSS where /proc is unavailable (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+def bench_routing(identifier: TemplateIdentifier, classifier, corpus: List[Dict]) -> Dict[str, Any]:
+    """End-to-end template routing with the agent's thresholds, without execution"""
+    def route(prompt: str) -> Optional[str]:
+        template_name, confidence = identifier.identify_template(prompt)
+        if confidence < KEYWORD_THRESHOLD:
+            template_name, confidence = classifier.classify_intent(prompt)
+        return template_name if template_name and confidence >= ACCEPT_THRESHOLD else None
+
+    routed, samples = timed(route, [entry["prompt"] for entry in corpus])
+    by_kind: Dict[str, List[int]] = {}
+    for entry, template_name in zip(corpus, routed):
+        counts = by_kind.setdefault(entry["kind"], [0, 0])
+        counts[0] += template_name == entry["template"]
+        counts[1] += 1
+    return {
+        "latency": latency_stats(samples),
+        "accuracy": {
+            "overall": sum(c for c, _ in by_kind.values()) / len(corpus),
+            "by_kind": {kind: correct / total for kind, (correct, total) in by_kind.items()}
+        }
+    }
+
+def bench_terraform(runs: int, concurrency: int, workspaces: int, delays: Dict[str, float],
+                    saved_plans: bool) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="tf-bench-") as scratch:
+        client = TerraformCloudClient(
+            "benchmark",
+            token="offline",
+            isolated_runs=True,
+            reuse_run_dirs=True,
+            runs_dir=scratch,
+            plugin_cache_dir=os.path.join(scratch, "plugins"),
+            work_cache_dir=os.path.join(scratch, "work"),
+            cli_config_file=os.path.join(scratch, "cli.tfrc"),
+            saved_plans=saved_plans
+        )
+        client.terraform_path = install_fake_terraform(os.path.join(scratch, "bin"), delays)
+
+        def run(index: int) -> Tuple[Dict, float]:
+            start = time.perf_counter()
+            result = client.execute_template(
+                BENCH_TEMPLATE_PATH,
+                {"project_id": "bench-project", "buckets": {f"bucket-{index}": {}}},
+                f"bench-{index % workspaces}"
+            )
+            return result, time.perf_counter() - start
+
+        METRICS.reset()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(run, range(runs)))
+        wall_time = time.perf_counter() - start
+        client.close()
+
+    stages = {
+        entry["labels"]["stage"]: {"count": entry["count"], "mean_ms": entry["sum"] / entry["count"] * 1000}
+        for entry in METRICS.snapshot()["histograms"]
+        if entry["labels"].get("stage", "").startswith("terraform_")
+    }
+    succeeded = sum(result.get("status") == "success" for result, _ in outcomes)
+    return {
+        "latency": latency_stats([duration for _, duration in outcomes], wall_time=wall_time),
+        "stages": stages,
+        "accuracy": {"success_rate": succeeded / runs if runs else None},
+        "settings": {"runs": runs, "concurrency": concurrency, "workspaces": workspaces,
+                     "delays": delays, "saved_plans": saved_plans}
+    }
+
+def build_classifier(args: argparse.Namespace, baseline: bool = False):
+    """The classifier under test, or with baseline the full-precision zero-shot model it is compared to"""
+    if baseline:
+        from backend.extractor.nlp_classifier import NLPTemplateClassifier
+        return NLPTemplateClassifier(registry=get_registry(REGISTRY_PATH))
+    if args.classifier == "stub":
+        return StubClassifier(delay=args.classifier_delay)
+    if args.classifier == "embedding":
+        from backend.extractor.embedding_classifier import EmbeddingTemplateClassifier
+        kwargs = {"model_name": args.classifier_model} if args.classifier_model else {}
+        return EmbeddingTemplateClassifier(get_registry(REGISTRY_PATH),
+                                           index_path=os.path.join(tempfile.gettempdir(), "bench_index.npz"), **kwargs)
+    from backend.extractor.nlp_classifier import NLPTemplateClassifier
+    kwargs = {"model_name": args.classifier_model} if args.classifier_model else {}
+    return NLPTemplateClassifier(registry=get_registry(REGISTRY_PATH), runtime=args.classifier_runtime,
+                                 num_threads=args.classifier_threads, **kwargs)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the NLP -> Terraform pipeline")
+    parser.add_argument("--prompts", type=int, default=2000, help="Corpus size")
+    parser.add_argument("--seed", type=int, default=7, help="Corpus seed")
+    parser.add_argument("--classifier", choices=["stub", "zero-shot", "embedding"], default="stub",
+                        help="Fallback classifier; zero-shot and embedding need transformers")
+    parser.add_argument("--classifier-model", help="Model name for zero-shot or embedding, e.g. a tiny local model")
+    parser.add_argument("--classifier-runtime", choices=["pytorch", "int8", "onnx"], default="pytorch",
+                        help="Inference runtime for the zero-shot classifier")
+    parser.add_argument("--classifier-threads", type=int, help="CPU threads for the zero-shot classifier")
+    parser.add_argument("--compare-baseline", action="store_true",
+                        help="Also run full-precision facebook/bart-large-mnli and report the accuracy difference")
+    parser.add_argument("--classifier-delay", type=float, default=0.0, help="Seconds per stub classification")
+    parser.add_argument("--classifier-prompts", type=int, default=200, help="Prompts sent to the classifier benchmark")
+    parser.add_argument("--terraform-runs", type=int, default=20, help="Fake terraform executions; 0 skips them")
+    parser.add_argument("--terraform-concurrency", type=int, default=4)
+    parser.add_argument("--terraform-workspaces", type=int, default=5,
+                        help="Distinct workspaces; repeated ones can skip init")
+    parser.add_argument("--init-delay", type=float, default=0.2)
+    parser.add_argument("--plan-delay", type=float, default=0.5)
+    parser.add_argument("--apply-delay", type=float, default=1.0)
+    parser.add_argument("--saved-plans", action="store_true", help="Benchmark plan -out / apply tfplan")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.prompts, seed=args.seed)
+    identifier = TemplateIdentifier(REGISTRY_PATH)
+    extractor = VariableExtractor(identifier.registry)
+    rss_before = resident_memory_mb()
+    classifier = build_classifier(args)
+    classifier.classify_intent(corpus[0]["prompt"])  # Load the model outside the timed loops
+
+    results = {
+        "identify": bench_identify(identifier, corpus),
+        "extract": bench_extract(extractor, corpus),
+        "classifier": bench_classifier(classifier, corpus, args.classifier_prompts),
+        "routing": bench_routing(identifier, classifier, corpus)
+    }
+    results["classifier"]["memory_mb"] = resident_memory_mb() - rss_before
+    if args.compare_baseline:
+        results["classifier"]["baseline"] = bench_classifier_against_baseline(
+            classifier, build_classifier(args, baseline=True), corpus, args.classifier_prompts
+        )
+    if args.terraform_runs > 0:
+        results["terraform"] = bench_terraform(
+            args.terraform_runs, args.terraform_concurrency, max(1, args.terraform_workspaces),
+            {"init": args.init_delay, "plan": args.plan_delay, "apply": args.apply_delay},
+            args.saved_plans
+        )
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args)
+        },
+        "results": results
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+if __name__ == "__main__":
+    main()
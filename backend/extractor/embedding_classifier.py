@@ -0,0 +1,203 @@
+"""
+Embedding-index intent classifier
+
+Alternative to the zero-shot NLI backend: example utterances for every
+template are embedded once and stored in a NumPy similarity index on disk,
+so classifying a prompt costs one encoder pass plus a cosine search,
+independent of the number of templates.
+"""
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from backend.extractor.model_loader import sentence_encoder
+from backend.registry import BACKEND_DIR, TemplateRegistry, as_registry
+
+DEFAULT_INDEX_PATH = os.path.join(BACKEND_DIR, "templates", "embedding_index.npz")
+
+class EmbeddingIndex:
+    def __init__(self, vectors: np.ndarray, labels: np.ndarray, template_names: List[str], fingerprint: str):
+        """
+        Args:
+            vectors: L2-normalized example embeddings, shape (n_examples, dim)
+            labels: Index into template_names for every row of vectors
+            template_names: Template name per label
+            fingerprint: Hash of the model and examples the index was built from
+        """
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.template_names = list(template_names)
+        self.fingerprint = fingerprint
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized top-k cosine search
+
+        Args:
+            queries: L2-normalized query embeddings, shape (n_queries, dim)
+            k: Number of neighbours per query
+
+        Returns:
+            (rows, scores), both shaped (n_queries, k) and sorted best first
+        """
+        k = min(k, len(self.vectors))
+        scores = queries @ self.vectors.T
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def save(self, path: str) -> None:
+        """Writes the index atomically as an .npz archive"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                vectors=self.vectors,
+                labels=self.labels,
+                template_names=np.array(self.template_names),
+                fingerprint=np.array(self.fingerprint)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                vectors=data["vectors"],
+                labels=data["labels"],
+                template_names=[str(name) for name in data["template_names"]],
+                fingerprint=str(data["fingerprint"])
+            )
+
+
+class EmbeddingTemplateClassifier:
+    def __init__(self, registry: Union[TemplateRegistry, Dict, None] = None,
+                 index_path: str = DEFAULT_INDEX_PATH,
+                 model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 top_k: int = 5):
+        """
+        Args:
+            registry: Shared TemplateRegistry (or a parsed registry dict); the index is
+                rebuilt when a reload changes the registry
+            index_path: Where the example index is persisted
+            model_name: Sentence encoder used for examples and prompts
+            top_k: Neighbours considered per prompt
+        """
+        self.registry = as_registry(registry)
+        self.index_path = index_path
+        self.model_name = model_name
+        self.top_k = top_k
+        self.model = sentence_encoder(model_name)
+        self._index: Optional[EmbeddingIndex] = None
+        self._index_version: Optional[str] = None
+        self._index_lock = threading.Lock()
+
+    @property
+    def template_registry(self) -> Dict:
+        return self.registry.current.raw
+
+    @property
+    def is_ready(self) -> bool:
+        return self.model.is_ready and self._index is not None
+
+    def warm_up(self, background: bool = True) -> None:
+        """Loads the encoder (and builds the index) ahead of the first request"""
+        if background:
+            threading.Thread(target=lambda: self.index, name="index-warmup", daemon=True).start()
+        else:
+            self.index
+
+    @property
+    def index(self) -> EmbeddingIndex:
+        version = self.registry.current.version
+        if self._index is None or self._index_version != version:
+            with self._index_lock:
+                if self._index is None or self._index_version != version:
+                    self._index = self._load_or_build_index()
+                    self._index_version = version
+        return self._index
+
+    def classify_intent(self, user_input: str) -> Tuple[str, float]:
+        return self.classify_intents([user_input])[0]
+
+    def classify_intents(self, prompts: Sequence[str], batch_size: int = None) -> List[Tuple[str, float]]:
+        """
+        Args:
+            prompts: Prompts to classify
+            batch_size: Prompts per encoder pass; the encoder's default when None
+
+        Returns: list of (template_name, confidence_score) in input order
+        """
+        return [matches[0] if matches else (None, 0.0) for matches in self.top_templates(prompts, batch_size)]
+
+    def top_templates(self, prompts: Sequence[str], batch_size: int = None) -> List[List[Tuple[str, float]]]:
+        """
+        Ranks templates for every prompt by their best-matching example
+
+        Returns: per prompt, a list of (template_name, similarity) best first
+        """
+        prompts = list(prompts)
+        if not prompts:
+            return []
+
+        index = self.index
+        encode = self.model.get()
+        queries = encode(prompts, batch_size=batch_size) if batch_size else encode(prompts)
+        rows, scores = index.search(queries, self.top_k)
+        labels = index.labels[rows]
+
+        ranked = []
+        for prompt_labels, prompt_scores in zip(labels, scores):
+            seen = {}
+            for label, score in zip(prompt_labels, prompt_scores):
+                name = index.template_names[label]
+                if name not in seen:
+                    seen[name] = max(float(score), 0.0)
+            ranked.append(list(seen.items()))
+        return ranked
+
+    def _examples(self) -> Dict[str, List[str]]:
+        """Example utterances per template, falling back to its keywords"""
+        examples = {}
+        for template_name, config in self.registry.current.templates.items():
+            examples[template_name] = config.get("examples") or config["keywords"]
+        return examples
+
+    def _fingerprint(self, examples: Dict[str, List[str]]) -> str:
+        payload = json.dumps({"model": self.model_name, "examples": examples}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load_or_build_index(self) -> EmbeddingIndex:
+        examples = self._examples()
+        fingerprint = self._fingerprint(examples)
+
+        if os.path.exists(self.index_path):
+            try:
+                index = EmbeddingIndex.load(self.index_path)
+                if index.fingerprint == fingerprint:
+                    return index
+            except (OSError, ValueError, KeyError):
+                pass  # Corrupt or outdated archive, rebuild below
+
+        template_names = sorted(examples)
+        texts, labels = [], []
+        for label, template_name in enumerate(template_names):
+            texts.extend(examples[template_name])
+            labels.extend([label] * len(examples[template_name]))
+
+        index = EmbeddingIndex(
+            vectors=self.model.get()(texts),
+            labels=np.array(labels),
+            template_names=template_names,
+            fingerprint=fingerprint
+        )
+        index.save(self.index_path)
+        return index
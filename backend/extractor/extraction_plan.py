@@ -0,0 +1,190 @@
+import re
+from typing import Collection, Dict, Any, List, Optional
+
+# Pre-defined extraction patterns, highest priority first per variable
+EXTRACTION_PATTERNS = {
+    'bucket_name': [
+        r'bucket\s+(?:called|named)\s+"([^"]+)"',
+        r'bucket\s+"([^"]+)"',
+        r'gcs\s+bucket\s+([a-z0-9-]+)',
+        r'storage\s+bucket\s+([a-z0-9-]+)'
+    ],
+    'project_id': [
+        r'project\s+(?:id|ID)?\s+"([^"]+)"',
+        r'project\s+([a-z][-a-z0-9]{4,28}[a-z0-9])'
+    ],
+    'location': [
+        r'(?:location|region)\s+"([^"]+)"',
+        r'in\s+(US(?:-[A-Z]+)?|EU|ASIA|[a-z]+-[a-z]+\d+)',
+        r'region\s+(us-[a-z]+\d+|europe-[a-z]+\d+|asia-[a-z]+\d+)'
+    ]
+}
+
+# A single identifier-like value, optionally quoted
+ANSWER_VALUE = r'"?([A-Za-z0-9][-\w.]*[A-Za-z0-9]|[A-Za-z0-9])"?'
+ANSWER_VALUE_PATTERN = re.compile(ANSWER_VALUE)
+
+# Shape a follow-up answer must have to be taken as the variable's value
+VALUE_SHAPES = {
+    'bucket_name': r'[a-z0-9][-a-z0-9_.]{1,61}[a-z0-9]',
+    'project_id': r'[a-z][-a-z0-9]{4,28}[a-z0-9]',
+    'location': r'(?i:US|EU|ASIA)|[a-z]+-[a-z]+\d+'
+}
+
+# Replies and filler words that fit a value's shape but are never meant as one
+ANSWER_STOP_WORDS = {
+    'yes', 'yeah', 'yep', 'no', 'nope', 'ok', 'okay', 'sure', 'thanks', 'please', 'none', 'default',
+    'same', 'that', 'this', 'the', 'and', 'for', 'not', 'called', 'named', 'should', 'will', 'set'
+}
+
+class ExtractionPlan:
+    def __init__(self, variables: List[str], patterns: Dict[str, List[str]],
+                 shapes: Optional[Dict[str, str]] = None):
+        """
+        Extracts a fixed set of variables with one combined regex scan
+
+        Every pattern becomes one named alternative of a single compiled
+        regex. A variable keeps the value of its highest-priority pattern
+        (the earliest in its list) and that pattern's leftmost match, exactly
+        like trying the patterns one by one with re.search.
+
+        Args:
+            variables: Variables to extract, in template order
+            patterns: Extraction patterns per variable, highest priority first
+            shapes: Pattern a follow-up answer for the variable must fully match;
+                VALUE_SHAPES by default
+        """
+        self.variables = [var_name for var_name in variables if patterns.get(var_name)]
+
+        # Per variable: list of (alternative id, compiled pattern) by priority
+        self.alternatives: Dict[str, List] = {}
+        # Outer group index of the combined regex -> (alternative id, inner group index)
+        self.groups: Dict[int, tuple] = {}
+
+        parts = []
+        group_index = 1
+        alternative_id = 0
+        for var_name in self.variables:
+            self.alternatives[var_name] = []
+            for pattern in patterns[var_name]:
+                compiled = re.compile(pattern, re.IGNORECASE)
+                self.alternatives[var_name].append((alternative_id, compiled))
+                self.groups[group_index] = (alternative_id, group_index + 1)
+                parts.append(f'(?P<_p{alternative_id}>{pattern})')
+                group_index += 1 + compiled.groups
+                alternative_id += 1
+
+        self.combined = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+
+        # Follow-up answers naming the variable, e.g. 'project is my-gcp-project'; per variable one
+        # pattern for its full name and one for its short alias
+        self.answer_patterns = {var_name: self._answer_patterns(var_name) for var_name in variables}
+        shapes = VALUE_SHAPES if shapes is None else shapes
+        self.value_shapes = {var_name: re.compile(shapes[var_name]) for var_name in variables if var_name in shapes}
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        if self.combined is None:
+            return {}
+
+        # Single scan: leftmost match per alternative plus the spans it consumed
+        first_match = {}
+        spans = []
+        for match in self.combined.finditer(text):
+            alternative_id, inner_group = self.groups[match.lastindex]
+            if alternative_id not in first_match:
+                first_match[alternative_id] = (match.start(), match.group(inner_group))
+            spans.append((match.start(), match.end(), alternative_id))
+
+        extracted = {}
+        for var_name in self.variables:
+            extracted[var_name] = None
+            for alternative_id, compiled in self.alternatives[var_name]:
+                start, value = first_match.get(alternative_id, (len(text), None))
+                shadowed = self._match_in_spans(text, compiled, alternative_id, spans, start)
+                if shadowed is not None:
+                    value = shadowed
+                if value is not None:
+                    extracted[var_name] = value
+                    break
+
+        return extracted
+
+    def extract_answers(self, text: str, missing: List[str], settled: Collection[str] = ()) -> Dict[str, Any]:
+        """
+        Values a follow-up reply gives by naming the variable
+
+        Accepts '<variable> is <value>', '<variable> = <value>' and
+        '<variable>: <value>'; the full name ('bucket name') may also be
+        followed by 'should be'. When only one variable is missing, a reply
+        consisting of just the value answers it. Every value must have the
+        variable's shape and must not be a stop word such as 'yes'.
+
+        Args:
+            text: The follow-up utterance
+            missing: Required variables still without a value
+            settled: Variables that already have a value; only an answer naming
+                their full name replaces it
+        """
+        answers = {}
+        for var_name, (full_name, alias) in self.answer_patterns.items():
+            match = full_name.search(text)
+            if match is None and var_name not in settled:
+                match = alias.search(text) if alias is not None else None
+            if match and self.is_plausible(var_name, match.group(1)):
+                answers[var_name] = match.group(1)
+
+        if len(missing) == 1 and missing[0] not in answers:
+            match = ANSWER_VALUE_PATTERN.fullmatch(text.strip().rstrip('.'))
+            if match and self.is_plausible(missing[0], match.group(1)):
+                answers[missing[0]] = match.group(1)
+        return answers
+
+    def is_plausible(self, var_name: str, value: str) -> bool:
+        """Whether value has var_name's shape and is not a stop word"""
+        if value.lower() in ANSWER_STOP_WORDS:
+            return False
+        shape = self.value_shapes.get(var_name)
+        return shape is None or shape.fullmatch(value) is not None
+
+    @staticmethod
+    def _answer_patterns(var_name: str):
+        """
+        Patterns for answers naming var_name in full ('bucket name', 'bucket_name')
+        and by its short alias ('bucket'), or None for the alias of one-word names
+
+        The alias is an ordinary word, so it needs an explicit 'is', '=' or ':'
+        ('the bucket should be in us-central1' names no bucket).
+        """
+        words = var_name.split('_')
+        full_names = sorted({' '.join(words), var_name}, key=len, reverse=True)
+        full_name = re.compile(
+            r'(?<![-\w])(?:%s)\s*(?:[=:]|\bis\b|\bshould be\b)\s*%s' % ('|'.join(map(re.escape, full_names)), ANSWER_VALUE),
+            re.IGNORECASE
+        )
+        if len(words) == 1:
+            return full_name, None
+        alias = re.compile(
+            r'(?<![-\w])%s\s*(?:[=:]|\bis\b)\s*%s' % (re.escape(words[0]), ANSWER_VALUE),
+            re.IGNORECASE
+        )
+        return full_name, alias
+
+    @staticmethod
+    def _match_in_spans(text: str, compiled, alternative_id: int, spans: List, limit: int):
+        """
+        Finds a match the combined scan could not see
+
+        finditer never tries positions inside a consumed span, nor the
+        alternatives listed after the winner at the span's start, so a
+        pattern may still match there. Only those few positions are
+        re-checked, and only before the leftmost match already found.
+        """
+        for start, end, winner in spans:
+            if start >= limit:
+                break
+            first = start if alternative_id > winner else start + 1
+            for pos in range(first, min(end, limit)):
+                match = compiled.match(text, pos)
+                if match:
+                    return match.group(1)
+        return None
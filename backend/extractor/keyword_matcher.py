@@ -0,0 +1,74 @@
+import re
+from typing import Dict, List
+
+class KeywordMatcher:
+    def __init__(self, template_keywords: Dict[str, List[str]]):
+        """
+        Single-pass keyword matcher shared by all templates
+
+        All keywords are compiled once into one trie-shaped regex, so the
+        input is scanned a single time no matter how many templates or
+        keywords exist. At each position the longest keyword wins, which
+        keeps "cloud storage" from also counting as "storage".
+
+        Args:
+            template_keywords: Mapping of template name to its keywords
+        """
+        self.template_names = list(template_keywords)
+
+        # keyword -> indexes of the templates that list it
+        self.keyword_templates: Dict[str, List[int]] = {}
+        for index, keywords in enumerate(template_keywords.values()):
+            for keyword in keywords:
+                owners = self.keyword_templates.setdefault(keyword.lower(), [])
+                if index not in owners:
+                    owners.append(index)
+
+        self.pattern = self._compile(self.keyword_templates)
+
+        # IGNORECASE also matches case variants lower() leaves alone, e.g. "ſ" for "s", so
+        # hits are looked up by casefold, which maps them onto the same key
+        self._folded_templates: Dict[str, List[int]] = {}
+        for keyword, owners in self.keyword_templates.items():
+            folded = self._folded_templates.setdefault(keyword.casefold(), [])
+            folded.extend(index for index in owners if index not in folded)
+
+    def count(self, text: str) -> List[int]:
+        """Returns keyword hit counts per template, in template_names order"""
+        counts = [0] * len(self.template_names)
+        table = self._folded_templates
+        for match in self.pattern.finditer(text):
+            for index in table.get(match.group().casefold(), ()):
+                counts[index] += 1
+        return counts
+
+    def scores(self, text: str) -> Dict[str, int]:
+        """Returns keyword hit counts keyed by template name"""
+        return dict(zip(self.template_names, self.count(text)))
+
+    @classmethod
+    def _compile(cls, keywords) -> re.Pattern:
+        if not keywords:
+            return re.compile(r'(?!)')
+
+        trie: Dict = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = True
+
+        return re.compile(r'\b' + cls._trie_pattern(trie) + r'\b', re.IGNORECASE)
+
+    @classmethod
+    def _trie_pattern(cls, node: Dict) -> str:
+        branches = [re.escape(char) + cls._trie_pattern(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # Greedy optional suffix: prefer the longer keyword, fall back to this one
+            pattern = '(?:' + pattern + ')?'
+        return pattern
@@ -0,0 +1,220 @@
+"""
+Process-wide, lazily loaded models shared by all classifiers
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# How zero-shot models are executed:
+#   pytorch - full-precision transformers model
+#   int8    - the same model with torch dynamic int8 quantization of its Linear layers
+#   onnx    - ONNX Runtime export through optimum (pip install "optimum[onnxruntime]")
+ZERO_SHOT_RUNTIMES = ("pytorch", "int8", "onnx")
+
+# Exported ONNX models are kept here so that only the first load pays for the export
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.expanduser("~/.cache/chat-to-create/onnx"))
+# File a complete export always contains
+ONNX_MODEL_FILE = "model.onnx"
+
+logger = logging.getLogger(__name__)
+
+class LazyModel:
+    def __init__(self, loader: Callable[[], Any]):
+        """
+        Holds a model that is only loaded on first use
+
+        Args:
+            loader: Zero-argument callable that builds the model
+        """
+        self._loader = loader
+        self._model = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._warmup_thread = None
+        self.load_error: Optional[BaseException] = None
+
+    @property
+    def is_ready(self) -> bool:
+        """True once the model is loaded and get() will not block"""
+        return self._ready.is_set()
+
+    def get(self) -> Any:
+        """Returns the model, loading it on the first call (thread-safe)"""
+        if self._ready.is_set():
+            return self._model
+
+        with self._lock:
+            if not self._ready.is_set():
+                self._model = self._loader()
+                self.load_error = None
+                self._ready.set()
+        return self._model
+
+    def warm_up(self, background: bool = True) -> None:
+        """
+        Starts loading the model ahead of the first request
+
+        Args:
+            background: Load in a daemon thread instead of blocking the caller
+        """
+        if self._ready.is_set():
+            return
+        if not background:
+            self.get()
+            return
+
+        with self._lock:
+            if self._warmup_thread is not None and self._warmup_thread.is_alive():
+                return
+            self._warmup_thread = threading.Thread(
+                target=self._background_load,
+                name="model-warmup",
+                daemon=True
+            )
+            self._warmup_thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until the model is loaded; returns the readiness flag"""
+        return self._ready.wait(timeout)
+
+    def _background_load(self) -> None:
+        try:
+            self.get()
+        except Exception as e:
+            # Keep the error for health checks; the next get() retries the load
+            self.load_error = e
+
+
+_models: Dict[Hashable, LazyModel] = {}
+_models_lock = threading.Lock()
+
+def shared_model(key: Hashable, loader: Callable[[], Any]) -> LazyModel:
+    """Returns the process-wide holder for `key`, creating it on first request"""
+    with _models_lock:
+        holder = _models.get(key)
+        if holder is None:
+            holder = LazyModel(loader)
+            _models[key] = holder
+        return holder
+
+def zero_shot_model(model_name: str = "facebook/bart-large-mnli", runtime: str = "pytorch",
+                    num_threads: Optional[int] = None) -> LazyModel:
+    """
+    Shared holder for a transformers zero-shot-classification pipeline
+
+    Args:
+        model_name: NLI model; a distilled one cuts latency and memory further
+        runtime: One of ZERO_SHOT_RUNTIMES
+        num_threads: CPU threads for inference. For pytorch and int8 this sets
+            torch's intra-op thread count, which is process-wide: it applies to every
+            torch model of the process, and the last model loaded wins. ONNX Runtime
+            sessions keep their own count
+    """
+    if runtime not in ZERO_SHOT_RUNTIMES:
+        raise ValueError(f"Unknown zero-shot runtime {runtime}; expected one of {', '.join(ZERO_SHOT_RUNTIMES)}")
+
+    def load():
+        # Imported here so that importing the agent never pulls in torch
+        from transformers import pipeline
+        if runtime == "pytorch":
+            if num_threads:
+                _set_torch_threads(num_threads)
+            return pipeline("zero-shot-classification", model=model_name)
+
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if runtime == "int8":
+            import torch
+            from transformers import AutoModelForSequenceClassification
+            if num_threads:
+                _set_torch_threads(num_threads)
+            model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        else:
+            model = _onnx_sequence_classifier(model_name, num_threads)
+        return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer)
+
+    return shared_model(("zero-shot-classification", model_name, runtime, num_threads), load)
+
+def _onnx_sequence_classifier(model_name: str, num_threads: Optional[int]):
+    """Loads model_name through ONNX Runtime, exporting it once into ONNX_CACHE_DIR"""
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+
+    export_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "--"))
+    if os.path.isfile(os.path.join(export_dir, ONNX_MODEL_FILE)):
+        return ORTModelForSequenceClassification.from_pretrained(export_dir, session_options=options)
+
+    model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True, session_options=options)
+    # Save beside the cache entry and move it into place whole, so an interrupted export or a
+    # concurrent loader never finds a half-written directory
+    os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(export_dir)}-", dir=ONNX_CACHE_DIR)
+    try:
+        model.save_pretrained(staging_dir)
+        if os.path.isdir(export_dir) and not os.path.isfile(os.path.join(export_dir, ONNX_MODEL_FILE)):
+            # Left incomplete by an export that predates staging
+            shutil.rmtree(export_dir, ignore_errors=True)
+        try:
+            os.replace(staging_dir, export_dir)
+        except OSError:
+            # Another process completed the same export first
+            pass
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return model
+
+_torch_threads: Optional[int] = None
+
+def _set_torch_threads(num_threads: int) -> None:
+    """Sets torch's process-wide thread count, warning when another model already set a different one"""
+    global _torch_threads
+    import torch
+    if _torch_threads is not None and _torch_threads != num_threads:
+        logger.warning("torch thread count changed from %d to %d; it applies to every model of the process",
+                       _torch_threads, num_threads)
+    torch.set_num_threads(num_threads)
+    _torch_threads = num_threads
+
+def sentence_encoder(model_name: str = "sentence-transformers/all-MiniLM-L6-v2") -> LazyModel:
+    """
+    Shared holder for a mean-pooled sentence encoder
+
+    The loaded value is a callable mapping a list of texts to an
+    L2-normalized float32 NumPy array of shape (len(texts), dim).
+    """
+    def load():
+        import numpy as np
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+
+        def encode(texts, batch_size: int = 64):
+            chunks = []
+            for start in range(0, len(texts), batch_size):
+                batch = tokenizer(
+                    list(texts[start:start + batch_size]),
+                    padding=True,
+                    truncation=True,
+                    return_tensors="pt"
+                )
+                with torch.no_grad():
+                    hidden = model(**batch).last_hidden_state
+                mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                chunks.append(torch.nn.functional.normalize(pooled, dim=1).numpy())
+            return np.concatenate(chunks).astype(np.float32, copy=False)
+
+        return encode
+
+    return shared_model(("sentence-encoder", model_name), load)
@@ -1,33 +1,100 @@
-from transformers import pipeline
-from typing import Tuple
+from contextlib import nullcontext
+from typing import ContextManager, Dict, List, Optional, Sequence, Tuple
+from backend.extractor.model_loader import zero_shot_model
+from backend.registry import TemplateRegistry, get_registry
+
+# Smaller NLI model distilled from bart-large-mnli, with the same label layout
+DISTILLED_MODEL_NAME = "valhalla/distilbart-mnli-12-1"
 
 class NLPTemplateClassifier:
-    def __init__(self):
-        # Load pre-trained classification model or train custom one
-        self.classifier = pipeline(
-            "zero-shot-classification", 
-            model="facebook/bart-large-mnli"
-        )
-        
-        # Define possible intents/templates
-        self.candidate_labels = [
-            "create gcs bucket",
-            "create cloud storage bucket",
-            "create google storage"
-        ]
-        
-        # Map labels to template names
-        self.label_to_template = {
-            "create gcs bucket": "gcs-bucket",
-            "create cloud storage bucket": "gcs-bucket",
-            "create google storage": "gcs-bucket"
-        }
-    
+    def __init__(self, batch_size: int = 16, model_name: str = "facebook/bart-large-mnli",
+                 registry: Optional[TemplateRegistry] = None, runtime: str = "pytorch",
+                 num_threads: Optional[int] = None, inference_mode: bool = True):
+        """
+        Args:
+            batch_size: Number of (prompt, label) pairs padded into one forward pass
+            model_name: NLI model, e.g. DISTILLED_MODEL_NAME for CPU-only nodes
+            registry: Shared registry providing the candidate labels
+            runtime: "pytorch" (full precision), "int8" (dynamic quantization) or "onnx" (ONNX Runtime)
+            num_threads: CPU threads used for inference. With the pytorch and int8 runtimes this is
+                torch's process-wide setting, shared with every other torch model of the process;
+                give all classifiers of a process the same value
+            inference_mode: Run torch models under torch.inference_mode(), skipping autograd bookkeeping
+        """
+        # Pre-trained classification model, shared process-wide and loaded on first use
+        self.model = zero_shot_model(model_name, runtime=runtime, num_threads=num_threads)
+        self.model_name = model_name
+        self.runtime = runtime
+        self.inference_mode = inference_mode
+
+        self.batch_size = batch_size
+
+        # Possible intents come from the registry's label table, so new templates need no code change
+        self.registry = registry or get_registry()
+
+    @property
+    def candidate_labels(self) -> List[str]:
+        return self.registry.current.candidate_labels
+
+    @property
+    def label_to_template(self) -> Dict[str, str]:
+        return self.registry.current.label_to_template
+
+    @property
+    def classifier(self):
+        return self.model.get()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.model.is_ready
+
+    def warm_up(self, background: bool = True) -> None:
+        """Loads the model ahead of the first fallback classification"""
+        self.model.warm_up(background=background)
+
     def classify_intent(self, user_input: str) -> Tuple[str, float]:
-        result = self.classifier(user_input, self.candidate_labels)
-        
+        compiled = self.registry.current
+        with self._inference_context():
+            result = self.classifier(user_input, compiled.candidate_labels)
+        return self._to_template(result, compiled.label_to_template)
+
+    def classify_intents(self, prompts: Sequence[str], batch_size: int = None) -> List[Tuple[str, float]]:
+        """
+        Classifies many prompts at once.
+
+        Every prompt is paired with every candidate label and the pairs are
+        padded into batches of `batch_size`, so a burst of prompts costs a few
+        large forward passes instead of one small pass per prompt and label.
+
+        Returns: list of (template_name, confidence_score) in input order
+        """
+        prompts = list(prompts)
+        if not prompts:
+            return []
+
+        compiled = self.registry.current
+        with self._inference_context():
+            results = self.classifier(
+                prompts,
+                compiled.candidate_labels,
+                batch_size=batch_size or self.batch_size
+            )
+        # The pipeline unwraps single-item inputs
+        if isinstance(results, dict):
+            results = [results]
+
+        return [self._to_template(result, compiled.label_to_template) for result in results]
+
+    def _inference_context(self) -> ContextManager:
+        if not self.inference_mode or self.runtime == "onnx":
+            return nullcontext()
+        import torch
+        return torch.inference_mode()
+
+    @staticmethod
+    def _to_template(result: dict, label_to_template: Dict[str, str]) -> Tuple[str, float]:
         best_label = result['labels'][0]
         confidence = result['scores'][0]
-        
-        template_name = self.label_to_template.get(best_label)
+
+        template_name = label_to_template.get(best_label)
         return template_name, confidence
\ No newline at end of file
@@ -1,39 +1,45 @@
-import json
-import re
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+from backend.extractor.keyword_matcher import KeywordMatcher
+from backend.registry import TemplateRegistry, get_registry
 
 class TemplateIdentifier:
-    def __init__(self, registry_path="templates/registry.json"):
-        with open(registry_path, 'r') as f:
-            self.registry = json.load(f)
-        
-        # Pre-compile regex patterns for faster matching
-        self.keyword_patterns = {}
-        for template_name, config in self.registry["templates"].items():
-            pattern = r'\b(' + '|'.join(config["keywords"]) + r')\b'
-            self.keyword_patterns[template_name] = re.compile(pattern, re.IGNORECASE)
-    
+    def __init__(self, registry_path: Optional[str] = None, registry: Optional[TemplateRegistry] = None):
+        # Shared compiled registry; keywords are compiled into one matcher per registry version
+        self.registry = registry or get_registry(registry_path)
+
+    @property
+    def template_registry(self) -> Dict:
+        return self.registry.current.raw
+
+    @property
+    def keyword_matcher(self) -> KeywordMatcher:
+        return self.registry.current.keyword_matcher
+
     def identify_template(self, user_input: str) -> Tuple[str, float]:
         """
         Returns: (template_name, confidence_score)
         """
-        scores = {}
-        
-        for template_name, pattern in self.keyword_patterns.items():
-            matches = pattern.findall(user_input)
-            # Simple scoring: number of keyword matches
-            scores[template_name] = len(matches)
-        
+        # Simple scoring: number of keyword matches per template
+        scores = self.keyword_matcher.scores(user_input)
+
         # Get highest scoring template
         if not scores or max(scores.values()) == 0:
             return None, 0.0
-            
+
         best_template = max(scores, key=scores.get)
         confidence = scores[best_template] / len(user_input.split())
-        
+
         return best_template, confidence
 
+    def identify_templates(self, user_inputs: List[str]) -> List[Tuple[str, float]]:
+        """
+        Returns: list of (template_name, confidence_score) in input order
+        """
+        return [self.identify_template(user_input) for user_input in user_inputs]
+
 # Usage
-identifier = TemplateIdentifier()
-template, confidence = identifier.identify_template("Create an S3 bucket for storing images")
-# Returns: ("s3-bucket", 0.2)
\ No newline at end of file
+if __name__ == "__main__":
+    identifier = TemplateIdentifier()
+    template, confidence = identifier.identify_template("Create a GCS bucket for storing images")
+    # Returns: ("gcs-bucket", 0.29)
+    print(template, confidence)
@@ -1,56 +1,59 @@
 import re
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from backend.extractor.extraction_plan import EXTRACTION_PATTERNS, ExtractionPlan
+from backend.registry import TemplateRegistry, as_registry
 
 class VariableExtractor:
-    def __init__(self, template_registry):
-        self.template_registry = template_registry
-        
+    def __init__(self, registry=None):
+        # Shared compiled registry; a parsed registry dict is compiled once here
+        self.registry: TemplateRegistry = as_registry(registry)
+
         # Pre-defined extraction patterns
-        self.extraction_patterns = {
-            'bucket_name': [
-                r'bucket\s+(?:called|named)\s+"([^"]+)"',
-                r'bucket\s+"([^"]+)"',
-                r'gcs\s+bucket\s+([a-z0-9-]+)',
-                r'storage\s+bucket\s+([a-z0-9-]+)'
-            ],
-            'project_id': [
-                r'project\s+(?:id|ID)?\s+"([^"]+)"',
-                r'project\s+([a-z][-a-z0-9]{4,28}[a-z0-9])'
-            ],
-            'location': [
-                r'(?:location|region)\s+"([^"]+)"',
-                r'in\s+(US(?:-[A-Z]+)?|EU|ASIA|[a-z]+-[a-z]+\d+)',
-                r'region\s+(us-[a-z]+\d+|europe-[a-z]+\d+|asia-[a-z]+\d+)'
-            ]
-        }
-    
+        self.extraction_patterns = EXTRACTION_PATTERNS
+        self.ram_pattern = re.compile(r'(\d+)\s*gb\s*ram')
+
+    @property
+    def template_registry(self) -> Dict:
+        return self.registry.current.raw
+
+    @property
+    def extraction_plans(self) -> Dict[str, ExtractionPlan]:
+        """One extraction plan per template, compiled with the registry"""
+        return self.registry.current.extraction_plans
+
     def extract_variables(self, user_input: str, template_name: str) -> Dict[str, Any]:
-        template_config = self.template_registry["templates"][template_name]
-        required_vars = template_config["required_vars"]
-        optional_vars = template_config["optional_vars"]
-        
-        extracted = {}
-        
-        # Extract each required/optional variable
-        for var_name in required_vars + optional_vars:
-            if var_name in self.extraction_patterns:
-                extracted[var_name] = self._extract_variable(user_input, var_name)
-        
+        compiled = self.registry.current
+        required_vars = compiled.templates[template_name]["required_vars"]
+
+        # Extract every required/optional variable in a single scan
+        extracted = compiled.extraction_plans[template_name].extract(user_input)
+
         # Handle special cases (like RAM -> instance_type conversion)
         if 'instance_type' in required_vars and not extracted.get('instance_type'):
-            ram_match = re.search(r'(\d+)\s*gb\s*ram', user_input.lower())
+            ram_match = self.ram_pattern.search(user_input.lower())
             if ram_match:
                 ram_size = ram_match.group(1)
                 extracted['instance_type'] = self.ram_to_instance.get(ram_size, 't3.medium')
-        
+
         return extracted
-    
-    def _extract_variable(self, text: str, var_name: str) -> Any:
-        patterns = self.extraction_patterns.get(var_name, [])
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1)
-        
-        return None
\ No newline at end of file
+
+    def extract_follow_up(self, user_input: str, template_name: str, missing: List[str],
+                          known: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Variables a follow-up turn provides for an already identified template
+
+        Only values found in user_input are returned; answers naming the
+        variable take precedence over the template's regular patterns. A
+        variable that already has a value in known is only replaced by an
+        answer naming it in full, e.g. 'project id is other-project'.
+        """
+        plan = self.registry.current.extraction_plans[template_name]
+        settled = {var_name for var_name, value in (known or {}).items() if value}
+        found = {var_name: value for var_name, value in plan.extract(user_input).items()
+                 if value and var_name not in settled}
+        found.update(plan.extract_answers(user_input, missing, settled))
+        return found
+
+    def extract_many(self, prompts: List[str], template_name: str) -> List[Dict[str, Any]]:
+        """Extracts variables for many prompts of the same template, in input order"""
+        return [self.extract_variables(prompt, template_name) for prompt in prompts]
@@ -0,0 +1,234 @@
+"""
+Content-addressed cache of provisioning results
+
+Runs are keyed by template name, normalized variables and the contents of
+the template's files, so a resent request returns the earlier result and an
+edited template always runs again. Identical requests arriving while a run
+is in flight wait for that run instead of starting their own.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from backend.terraform.client import GENERATED_FILES, LOCK_FILE
+
+# Files terraform writes into a template directory; the lock file pins providers, so it counts
+IGNORED_TEMPLATE_FILES = GENERATED_FILES - {LOCK_FILE}
+
+logger = logging.getLogger(__name__)
+
+def is_successful(result: Any) -> bool:
+    """Whether a provisioning function's result reports success"""
+    if isinstance(result, dict):
+        return not result.get("error") and result.get("status") != "error"
+    return result is not None
+
+class ExecutionCache:
+    def __init__(self, template_paths: Dict[str, str], max_entries: int = 256, ttl: float = 600.0,
+                 persist_path: Optional[str] = None):
+        """
+        Args:
+            template_paths: Template name -> template directory, as in the registry
+            max_entries: Successful results kept; the least recently used are evicted first
+            ttl: Seconds a successful result is reused
+            persist_path: JSON file the cache is loaded from and saved to, so it survives restarts
+        """
+        self.template_paths = template_paths
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_path = persist_path
+
+        # Key -> (expiry timestamp, template name, result)
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._template_digests: Dict[str, Tuple[tuple, str]] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+        if persist_path:
+            self._load()
+
+    def key(self, template_name: str, variables: Dict[str, Any]) -> str:
+        """Fingerprint of one run: template, normalized variables and template contents"""
+        normalized = {name: value for name, value in variables.items() if value is not None}
+        digest = hashlib.sha256()
+        digest.update(template_name.encode("utf-8"))
+        digest.update(json.dumps(normalized, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(self._template_digest(template_name).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached result for key, or None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, result = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def run(self, template_name: str, variables: Dict[str, Any],
+            function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Returns the cached result, the result of an identical in-flight run, or function()
+
+        Returns:
+            (result, cached) where cached tells whether function was skipped
+        """
+        key = self.key(template_name, variables)
+        future, owner = self._claim(key)
+        if not owner:
+            return future.result(), True
+
+        try:
+            result = function()
+        except BaseException as e:
+            self._settle(key, template_name, future, exception=e)
+            raise
+        self._settle(key, template_name, future, result=result)
+        return result, False
+
+    async def arun(self, template_name: str, variables: Dict[str, Any],
+                   function: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Coroutine counterpart of run; attaches to in-flight runs from any thread or loop"""
+        key = self.key(template_name, variables)
+        future, owner = self._claim(key)
+        if not owner:
+            return await asyncio.wrap_future(future), True
+
+        try:
+            result = await function()
+        except BaseException as e:
+            self._settle(key, template_name, future, exception=e)
+            raise
+        self._settle(key, template_name, future, result=result)
+        return result, False
+
+    def invalidate(self, template_name: Optional[str] = None) -> None:
+        """Forgets the cached results of template_name, or of every template"""
+        with self._lock:
+            for key, (_, entry_template, _) in list(self._entries.items()):
+                if template_name is None or entry_template == template_name:
+                    del self._entries[key]
+        if self.persist_path:
+            self._save()
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        """Future for key's result, and whether the caller must produce it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                future: Future = Future()
+                future.set_result(entry[2])
+                return future, False
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def _settle(self, key: str, template_name: str, future: Future, result: Any = None,
+                exception: Optional[BaseException] = None) -> None:
+        """Stores a successful result and releases callers waiting on the run"""
+        store = exception is None and is_successful(result)
+        with self._lock:
+            del self._in_flight[key]
+            if store:
+                self._entries[key] = (time.time() + self.ttl, template_name, result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+        if store and self.persist_path:
+            self._save()
+
+    def _template_digest(self, template_name: str) -> str:
+        """
+        Hash of the template's files
+
+        Files are re-read only when a file's size or modification time
+        changed, so an unchanged template costs one stat per file.
+        """
+        path = self.template_paths.get(template_name)
+        if not path or not os.path.isdir(path):
+            return ""
+
+        files = []
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d not in IGNORED_TEMPLATE_FILES)
+            for name in sorted(names):
+                if name in IGNORED_TEMPLATE_FILES:
+                    continue
+                file_path = os.path.join(root, name)
+                stat = os.stat(file_path)
+                files.append((os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns))
+        signature = tuple(files)
+
+        with self._lock:
+            cached = self._template_digests.get(template_name)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        for relative_path, _, _ in files:
+            digest.update(relative_path.encode("utf-8"))
+            with open(os.path.join(path, relative_path), "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        with self._lock:
+            self._template_digests[template_name] = (signature, digest.hexdigest())
+        return digest.hexdigest()
+
+    def _load(self) -> None:
+        try:
+            with open(self.persist_path, "r") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, expires_at, template_name, result in stored:
+            if expires_at > now:
+                self._entries[key] = (expires_at, template_name, result)
+
+    def _save(self) -> None:
+        """
+        Writes the live entries atomically, least recently used first
+
+        Runs after the provisioning already succeeded, so a failure is logged
+        and the previous file kept rather than failing the request.
+        """
+        with self._save_lock:
+            with self._lock:
+                now = time.time()
+                stored = [[key, expires_at, template_name, result]
+                          for key, (expires_at, template_name, result) in self._entries.items()
+                          if expires_at > now]
+
+            try:
+                directory = os.path.dirname(os.path.abspath(self.persist_path))
+                os.makedirs(directory, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w") as f:
+                        json.dump(stored, f, default=str)
+                    os.replace(temp_path, self.persist_path)
+                except BaseException:
+                    os.unlink(temp_path)
+                    raise
+            except Exception:
+                logger.exception("Could not save the execution cache to %s", self.persist_path)
@@ -1,35 +1,357 @@
 # functions/terraform_functions.py
 import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+try:
+    import fcntl
+except ImportError:  # Windows: batches are only serialized within the process
+    fcntl = None
 from backend.terraform.client import TerraformCloudClient
+from backend.terraform.async_client import AsyncTerraformCloudClient
+from backend.terraform.api_client import TerraformCloudAPIClient
+from backend.terraform.pool import get_client
+from backend.registry import BACKEND_DIR, get_registry
+from backend.state import (LocalStateSource, StateIndex, TerraformCloudStateSource, iter_state_instances,
+                           local_state_sources, terraform_cloud_state_sources)
 
 # Get Terraform Cloud settings from environment variables
 TF_ORGANIZATION = os.getenv("TF_ORGANIZATION")
 TF_TOKEN = os.getenv("TF_TOKEN_app_terraform_io")
+# Persistent per-workspace .terraform data so repeated runs can skip init
+TF_WORK_CACHE_DIR = os.getenv("TF_WORK_CACHE_DIR")
+# Plan once and apply the saved plan (requires Terraform >= 1.6 for the cloud block)
+TF_SAVED_PLANS = os.getenv("TF_SAVED_PLANS", "").lower() in ("1", "true", "yes")
+# Directory of <workspace>.tfstate files queried instead of the organization's Terraform Cloud workspaces
+TF_STATE_DIR = os.getenv("TF_STATE_DIR")
+TF_STATE_INDEX_DIR = os.getenv(
+    "TF_STATE_INDEX_DIR", os.path.join(os.path.expanduser("~"), ".cache", "chat-to-create", "state-index")
+)
+# Seconds between checks of the workspaces' state serials
+TF_STATE_REFRESH_INTERVAL = float(os.getenv("TF_STATE_REFRESH_INTERVAL", "30"))
 
-def create_gcs_bucket(bucket_name: str, project_id: str, location: str = "US", **kwargs):
-    """Creates GCS bucket using Terraform Cloud API"""
-    template_path = "templates/gcp/gcs-bucket"
+# Bulk template driven by create_gcs_buckets; not a registry entry, since no prompt selects it directly
+GCS_BUCKETS_TEMPLATE_PATH = os.path.join(BACKEND_DIR, "templates", "gcp", "gcs-buckets")
+
+# Per-bucket settings understood by the bulk template's `buckets` map
+GCS_BUCKET_SPEC_FIELDS = ("storage_class", "labels")
+
+def create_gcs_bucket(bucket_name: str, project_id: str, location: str = "US",
+                      template_path: Optional[str] = None, **kwargs):
+    """
+    Creates GCS bucket using Terraform Cloud API
+
+    template_path is the directory the caller's registry resolves for the
+    template; without one, the process-wide registry's is used.
+    """
     variables = {
         "bucket_name": bucket_name,
         "project_id": project_id,
         "location": location,
         **kwargs
     }
-    
+
     # Create workspace name based on bucket name
-    workspace_name = f"gcs-{bucket_name}"
-    
-    terraform_client = TerraformCloudClient(
-        organization=TF_ORGANIZATION,
-        token=TF_TOKEN
-    )
+    workspace_name = gcs_bucket_workspace_name(variables)
+
+    terraform_client = _terraform_client(TerraformCloudClient)
     return terraform_client.execute_template(
-        template_path=template_path,
+        template_path=template_path or registry_template_path("gcs-bucket"),
         variables=variables,
         workspace_name=workspace_name
     )
 
-# Function registry - maps template names to actual functions
-FUNCTION_REGISTRY = {
-    "gcs-bucket": create_gcs_bucket
-}
\ No newline at end of file
+async def acreate_gcs_bucket(bucket_name: str, project_id: str, location: str = "US",
+                             template_path: Optional[str] = None, **kwargs):
+    """Async variant of create_gcs_bucket for the asyncio pipeline"""
+    variables = {
+        "bucket_name": bucket_name,
+        "project_id": project_id,
+        "location": location,
+        **kwargs
+    }
+
+    terraform_client = _terraform_client(AsyncTerraformCloudClient)
+    return await terraform_client.aexecute_template(
+        template_path=template_path or registry_template_path("gcs-bucket"),
+        variables=variables,
+        workspace_name=gcs_bucket_workspace_name(variables)
+    )
+
+def registry_template_path(template_name: str) -> str:
+    """
+    Directory a template's function runs terraform in, from the process-wide registry
+
+    Only for calls that pass no template_path; the agent binds the path of
+    its own registry, which its execution cache fingerprints too.
+    """
+    return get_registry().current.template_paths[template_name]
+
+def gcs_bucket_workspace_name(variables: Dict[str, Any]) -> str:
+    """Workspace create_gcs_bucket runs in for the given variables"""
+    return f"gcs-{variables['bucket_name']}"
+
+def create_gcs_buckets(bucket_specs: List[Dict[str, Any]], max_parallel_runs: int = 4) -> List[Dict[str, Any]]:
+    """
+    Creates many GCS buckets with one terraform run per (project, location)
+
+    Buckets sharing a project and location are applied together through the
+    for_each-driven gcs-buckets template instead of one workspace each.
+
+    Args:
+        bucket_specs: Dicts with bucket_name, project_id and optional location,
+            storage_class and labels
+        max_parallel_runs: Groups provisioned concurrently
+
+    Returns:
+        One result per spec, in input order
+    """
+    results: List[Dict[str, Any]] = [None] * len(bucket_specs)
+    groups: Dict[tuple, Dict[str, int]] = {}
+
+    for index, spec in enumerate(bucket_specs):
+        bucket_name = spec.get("bucket_name")
+        project_id = spec.get("project_id")
+        location = spec.get("location") or "US"
+        result = {"bucket_name": bucket_name, "project_id": project_id, "location": location}
+
+        if not bucket_name or not project_id:
+            results[index] = {**result, "status": "error", "error": "bucket_name and project_id are required"}
+            continue
+
+        members = groups.setdefault((project_id, location), {})
+        if bucket_name in members:
+            results[index] = {**result, "status": "error", "error": f"Duplicate bucket {bucket_name} in batch"}
+            continue
+        members[bucket_name] = index
+
+    terraform_client = _terraform_client(TerraformCloudClient)
+
+    def provision(group):
+        (project_id, location), members = group
+        requested = {
+            bucket_name: {
+                field: bucket_specs[index][field]
+                for field in GCS_BUCKET_SPEC_FIELDS
+                if bucket_specs[index].get(field) is not None
+            }
+            for bucket_name, index in members.items()
+        }
+        workspace_name = _bulk_workspace_name(project_id, location)
+        # The buckets map is the workspace's whole desired state: read and apply it as one step
+        with _bulk_workspace_lock(workspace_name):
+            try:
+                existing = _bulk_workspace_buckets(workspace_name)
+            except Exception as e:
+                run = {"status": "error", "error": f"Could not read the state of workspace {workspace_name}: {e}"}
+                return project_id, location, workspace_name, members, run
+            # Settings a batch leaves out keep their current value rather than falling back to defaults
+            buckets = {**existing, **{name: {**existing.get(name, {}), **spec} for name, spec in requested.items()}}
+            run = terraform_client.execute_template(
+                template_path=GCS_BUCKETS_TEMPLATE_PATH,
+                variables={"project_id": project_id, "location": location, "buckets": buckets},
+                workspace_name=workspace_name
+            )
+        return project_id, location, workspace_name, members, run
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel_runs)) as executor:
+        for project_id, location, workspace_name, members, run in executor.map(provision, groups.items()):
+            actions = {
+                resource["address"]: resource["action"]
+                for resource in run.get("plan", {}).get("resources", [])
+            }
+            for bucket_name, index in members.items():
+                bucket_result = {
+                    "bucket_name": bucket_name,
+                    "project_id": project_id,
+                    "location": location,
+                    "workspace_name": workspace_name,
+                    "status": run.get("status", "error"),
+                    "details": run.get("details", run)
+                }
+                action = actions.get(f'google_storage_bucket.bucket["{bucket_name}"]')
+                if action:
+                    bucket_result["action"] = action
+                results[index] = bucket_result
+
+    return results
+
+def get_terraform_state(resource_type: Optional[str] = None, project_id: Optional[str] = None,
+                        address: Optional[str] = None, workspace_name: Optional[str] = None,
+                        with_attributes: bool = False, refresh: bool = True) -> Dict[str, Any]:
+    """
+    Looks up resources across the state of every workspace
+
+    Answers come from an on-disk index that is refreshed at most every
+    TF_STATE_REFRESH_INTERVAL seconds, re-reading only workspaces whose
+    state serial changed.
+
+    Args:
+        resource_type: Terraform resource type, e.g. google_storage_bucket
+        project_id: GCP project the resources belong to
+        address: Exact resource instance address
+        workspace_name: Restrict the lookup to one workspace
+        with_attributes: Include each resource's full state attributes
+        refresh: Check the workspaces for new state before the lookup
+
+    Returns:
+        Dict with the matching resources and their count, marked stale when the
+        refresh failed; an error when no state can be read and no index was
+        ever built
+    """
+    index = _state_index()
+    try:
+        if refresh:
+            index.refresh(_state_sources())
+        elif not index.is_built:
+            raise ValueError("the state index has not been built yet")
+    except Exception as e:
+        if not index.is_built:
+            # Nothing to fall back on: an empty answer would claim there are no such resources
+            return {"status": "error", "error": f"Could not read any workspace state: {e}"}
+        # Answer from the last index rather than failing the lookup
+        stale = str(e)
+    else:
+        stale = None
+
+    resources = index.find(resource_type=resource_type, project=project_id, address=address,
+                           workspace=workspace_name, with_attributes=with_attributes)
+    result = {"status": "success", "resources": resources, "count": len(resources)}
+    if stale:
+        result["stale"] = stale
+    return result
+
+_state_index_instance: Optional[StateIndex] = None
+_state_api_client: Optional[TerraformCloudAPIClient] = None
+_state_lock = threading.Lock()
+
+def _state_index() -> StateIndex:
+    global _state_index_instance
+    with _state_lock:
+        if _state_index_instance is None:
+            _state_index_instance = StateIndex(TF_STATE_INDEX_DIR, refresh_interval=TF_STATE_REFRESH_INTERVAL)
+        return _state_index_instance
+
+def _state_api() -> TerraformCloudAPIClient:
+    global _state_api_client
+    if not TF_ORGANIZATION or not TF_TOKEN:
+        raise ValueError("No state source configured: set TF_STATE_DIR, or TF_ORGANIZATION and "
+                         "TF_TOKEN_app_terraform_io")
+    with _state_lock:
+        if _state_api_client is None:
+            _state_api_client = TerraformCloudAPIClient(TF_ORGANIZATION, TF_TOKEN)
+        return _state_api_client
+
+def _state_sources():
+    """Local state files when TF_STATE_DIR is set, otherwise every Terraform Cloud workspace"""
+    if TF_STATE_DIR:
+        return local_state_sources(TF_STATE_DIR)
+    return terraform_cloud_state_sources(_state_api())
+
+def _workspace_state_source(workspace_name: str):
+    """Source of one workspace's current state, read directly rather than from the index"""
+    if TF_STATE_DIR:
+        return LocalStateSource(os.path.join(TF_STATE_DIR, f"{workspace_name}.tfstate"))
+    workspace = _state_api().get_workspace(workspace_name)
+    return TerraformCloudStateSource(_state_api(), workspace) if workspace else None
+
+def provisioning_client() -> TerraformCloudClient:
+    """The pooled client create_gcs_bucket runs with, for speculative preparation of its runs"""
+    return _terraform_client(TerraformCloudClient)
+
+def _terraform_client(client_class):
+    """
+    Shared client for provisioning functions
+
+    Isolated runs let several buckets be provisioned concurrently; the pooled
+    client keeps credentials and prepared scratch directories between calls.
+    """
+    return get_client(
+        TF_ORGANIZATION,
+        TF_TOKEN,
+        client_class=client_class,
+        isolated_runs=True,
+        reuse_run_dirs=True,
+        work_cache_dir=TF_WORK_CACHE_DIR,
+        saved_plans=TF_SAVED_PLANS
+    )
+
+def _bulk_workspace_name(project_id: str, location: str) -> str:
+    """Workspace managing every bulk-created bucket of one project and location"""
+    return f"gcs-bulk-{project_id}-{location.lower()}"
+
+_bulk_workspace_locks: Dict[str, threading.Lock] = {}
+_bulk_workspace_locks_guard = threading.Lock()
+
+@contextmanager
+def _bulk_workspace_lock(workspace_name: str) -> Iterator[None]:
+    """
+    Serializes batches of one workspace, so neither applies a bucket set missing the other's buckets
+
+    Batches also run in other processes, e.g. the workers of the batch CLI, so
+    the thread lock is backed by an flock on a per-workspace file under the
+    work cache (the temp directory without one) where fcntl is available.
+    """
+    with _bulk_workspace_locks_guard:
+        lock = _bulk_workspace_locks.setdefault(workspace_name, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        lock_dir = os.path.join(TF_WORK_CACHE_DIR or tempfile.gettempdir(), "gcs-bulk-locks")
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, f"{workspace_name}.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _bulk_workspace_buckets(workspace_name: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Buckets a bulk workspace already manages, as entries of the template's buckets map
+
+    Merged under each new batch, so buckets of earlier batches stay in the
+    desired state and a bucket named again is a no-op rather than a new create.
+
+    Returns:
+        Bucket name -> storage_class and labels from the current state; empty for a new workspace
+    """
+    source = _workspace_state_source(workspace_name)
+    if source is None or source.version() is None:
+        return {}
+    buckets = {}
+    with source.open() as f:
+        for record in iter_state_instances(f):
+            if (record["type"] != "google_storage_bucket" or record["mode"] != "managed"
+                    or not isinstance(record["index_key"], str)):
+                continue
+            attributes = record["attributes"]
+            buckets[record["index_key"]] = {
+                "storage_class": attributes.get("storage_class") or "STANDARD",
+                "labels": attributes.get("labels") or {}
+            }
+    return buckets
+
+# Provisioning functions by the name a registry template gives in its "function" key.
+# Each takes the template's variables plus template_path
+PROVISIONING_FUNCTIONS = {
+    "create_gcs_bucket": create_gcs_bucket
+}
+
+# Workspace each function runs in, used to order queued jobs per workspace
+WORKSPACE_NAMERS = {
+    "create_gcs_bucket": gcs_bucket_workspace_name
+}
+
+# Coroutine variants used by InfrastructureAgent.aprocess_request
+ASYNC_PROVISIONING_FUNCTIONS = {
+    "create_gcs_bucket": acreate_gcs_bucket
+}
+
+# Bulk variants taking a list of variable dicts, used by InfrastructureAgent.process_requests
+BATCH_PROVISIONING_FUNCTIONS = {
+    "create_gcs_bucket": create_gcs_buckets
+}
@@ -0,0 +1,4 @@
+from .store import JobStore, QUEUED, RUNNING, SUCCEEDED, FAILED
+from .scheduler import JobScheduler
+
+__all__ = ['JobStore', 'JobScheduler', 'QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED']
@@ -0,0 +1,234 @@
+"""
+Bounded worker pool executing queued provisioning jobs
+"""
+import logging
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+from .store import FAILED, SUCCEEDED, JobStore
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: rate limits, server errors, network trouble and
+# workspace state locks held by another run. Status codes only count next to
+# an HTTP status context, and timeouts only as whole error phrases, so a bucket
+# or project named "x-500", "timeout-logs" or "temporary-data" is not one
+TRANSIENT_ERROR_PATTERN = re.compile(
+    r"(?:\bHTTP(?:/[\d.]+)?|\bstatus(?: code)?|\bAPI error|\bresponse(?: code)?)[ :=]*(?:429|50[0234])\b"
+    r"|\b(?:429 Too Many Requests|50[0234] (?:Internal Server Error|Bad Gateway|Service Unavailable|Gateway Time-?out))"
+    r"|too many requests|rate limit|\b(?:i/o|TLS handshake) timeout\b|context deadline exceeded"
+    r"|Client\.Timeout exceeded|\b(?:operation|connection|request|read|write|dial) timed out\b"
+    r"|temporarily unavailable|temporary failure in name resolution|connection (?:reset|refused|aborted)"
+    r"|remote end closed connection|error acquiring the state lock|workspace .* is (?:currently )?locked",
+    re.IGNORECASE
+)
+TRANSIENT_EXCEPTIONS = (ConnectionError, TimeoutError)
+
+class JobScheduler:
+    def __init__(self, store: JobStore, function_registry: Dict[str, Callable[..., Any]],
+                 workspace_namers: Optional[Dict[str, Callable[[Dict[str, Any]], str]]] = None,
+                 max_workers: int = 4, per_workspace_limit: int = 1, max_attempts: int = 3,
+                 retry_backoff: float = 5.0, max_retry_backoff: float = 300.0, poll_interval: float = 1.0):
+        """
+        Runs jobs from store through the functions of function_registry
+
+        Args:
+            store: Durable job store
+            function_registry: Template name -> provisioning function
+            workspace_namers: Template name -> function deriving the workspace from the variables.
+                Jobs of a template without a namer share one queue named after the template
+            max_workers: Jobs running at once across all workspaces
+            per_workspace_limit: Jobs running at once in one workspace
+            max_attempts: Default attempts per job, including the first one
+            retry_backoff: Delay before the first retry; doubles with every further attempt
+            max_retry_backoff: Upper bound for the retry delay
+            poll_interval: Longest time an idle worker sleeps before checking for due jobs
+        """
+        self.store = store
+        self.function_registry = function_registry
+        self.workspace_namers = workspace_namers or {}
+        self.max_workers = max_workers
+        self.per_workspace_limit = per_workspace_limit
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.poll_interval = poll_interval
+
+        self._workers: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._wakeup = threading.Condition()
+        # IDs of the jobs this scheduler's workers are running, whose leases the lease keeper renews
+        self._active: Set[str] = set()
+        self._active_lock = threading.Lock()
+
+    def start(self) -> "JobScheduler":
+        """
+        Starts the workers and the lease keeper
+
+        Jobs whose lease expired, because the process running them died, are
+        re-queued now and whenever the lease keeper runs; jobs another live
+        process is running keep their lease and are left alone.
+        """
+        if self._workers:
+            return self
+        self._requeue_expired()
+
+        self._stopping.clear()
+        for index in range(self.max_workers):
+            worker = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        keeper = threading.Thread(target=self._keep_leases, name="job-leases", daemon=True)
+        keeper.start()
+        self._workers.append(keeper)
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stops the workers after their current job; queued jobs stay in the store"""
+        self._stopping.set()
+        self._notify()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def submit(self, template_name: str, variables: Dict[str, Any], workspace_name: Optional[str] = None,
+               max_attempts: Optional[int] = None) -> str:
+        """
+        Queues a provisioning job and returns its ID immediately
+
+        Args:
+            template_name: Template whose registered function runs the job
+            variables: Keyword arguments for the function
+            workspace_name: Queue the job is ordered in. Derived from the variables by default
+            max_attempts: Overrides the scheduler's max_attempts for this job
+
+        Returns:
+            Job ID for status lookups
+        """
+        if template_name not in self.function_registry:
+            raise ValueError(f"No function found for template {template_name}")
+
+        if workspace_name is None:
+            namer = self.workspace_namers.get(template_name)
+            workspace_name = namer(variables) if namer else template_name
+
+        job_id = self.store.enqueue(template_name, workspace_name, variables,
+                                    max_attempts=max_attempts or self.max_attempts)
+        self._notify()
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Blocks until the job has succeeded or failed, or timeout passes; returns its latest state"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job["status"] in (SUCCEEDED, FAILED):
+                return job
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return job
+            with self._wakeup:
+                self._wakeup.wait(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+
+    def _work(self) -> None:
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                job = self.store.claim(self.per_workspace_limit)
+            except Exception:
+                # e.g. the database is locked by another process for longer than the busy timeout
+                failures += 1
+                logger.exception("Could not claim a job")
+                self._stopping.wait(min(self.max_retry_backoff, self.poll_interval * 2 ** failures))
+                continue
+            failures = 0
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self._idle_timeout())
+                continue
+            with self._active_lock:
+                self._active.add(job["id"])
+            try:
+                self._run(job)
+            except Exception:
+                # The outcome could not be recorded; the lease lapses and the job is re-queued
+                logger.exception("Could not finish job %s", job["id"])
+            finally:
+                with self._active_lock:
+                    self._active.discard(job["id"])
+                # Finishing a job may unblock the next one in its workspace
+                self._notify()
+
+    def _keep_leases(self) -> None:
+        """Renews the leases of running jobs and re-queues expired ones, every third of a lease"""
+        while not self._stopping.wait(self.store.lease_seconds / 3):
+            try:
+                with self._active_lock:
+                    active = list(self._active)
+                self.store.renew_leases(active)
+                self._requeue_expired()
+            except Exception:
+                logger.exception("Could not renew job leases")
+
+    def _requeue_expired(self) -> None:
+        recovered = self.store.requeue_expired()
+        if recovered:
+            logger.warning("Re-queued %d job(s) whose lease expired", recovered)
+            self._notify()
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        function = self.function_registry.get(job["template"])
+        if function is None:
+            self.store.fail(job["id"], f"No function found for template {job['template']}")
+            return
+
+        try:
+            result = function(**job["variables"])
+        except Exception as e:
+            self._handle_failure(job, str(e), transient=isinstance(e, TRANSIENT_EXCEPTIONS))
+            return
+
+        error = self._result_error(result)
+        if error is None:
+            self.store.complete(job["id"], result)
+        else:
+            self._handle_failure(job, error, result=result)
+
+    def _handle_failure(self, job: Dict[str, Any], error: str, result: Any = None,
+                        transient: bool = False) -> None:
+        if not transient:
+            transient = bool(TRANSIENT_ERROR_PATTERN.search(error))
+
+        if transient and job["attempts"] < job["max_attempts"]:
+            delay = min(self.max_retry_backoff, self.retry_backoff * 2 ** (job["attempts"] - 1))
+            delay *= random.uniform(1.0, 1.2)  # Jitter so retried jobs do not hit the API together
+            logger.info("Retrying job %s in %.1fs after: %s", job["id"], delay, error)
+            self.store.retry(job["id"], error, delay)
+        else:
+            self.store.fail(job["id"], error, result)
+
+    @staticmethod
+    def _result_error(result: Any) -> Optional[str]:
+        """Error text of a failed terraform result dict, None when the job succeeded"""
+        if not isinstance(result, dict):
+            return None
+        if not result.get("error") and result.get("status") != "error":
+            return None
+        details = result.get("details") if isinstance(result.get("details"), dict) else {}
+        parts = [result.get("error"), details.get("error"), result.get("stderr"), details.get("stderr")]
+        return "\n".join(str(part) for part in parts if part) or "Terraform run failed"
+
+    def _idle_timeout(self) -> float:
+        next_due = self.store.next_run_after()
+        if next_due is None:
+            return self.poll_interval
+        return max(0.01, min(self.poll_interval, next_due - time.time()))
+
+    def _notify(self) -> None:
+        with self._wakeup:
+            self._wakeup.notify_all()
@@ -0,0 +1,222 @@
+"""
+SQLite-backed store for provisioning jobs
+
+Jobs survive restarts, and claiming one is a single transaction, so two
+workers can never start the same job. A claimed job is leased to the store
+that claimed it; its scheduler renews the lease while the job runs, so only
+jobs whose owner stopped renewing (most likely because it died) are ever
+taken back.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE NOT NULL,
+    template TEXT NOT NULL,
+    workspace TEXT NOT NULL,
+    variables TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    lease_expires REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_workspace ON jobs (workspace, status, seq);
+"""
+
+# The oldest queued job of each workspace, if it is due and the workspace has room
+CLAIM_QUERY = """
+SELECT * FROM jobs AS job
+WHERE job.status = 'queued'
+  AND job.run_after <= ?
+  AND job.seq = (SELECT MIN(seq) FROM jobs WHERE workspace = job.workspace AND status = 'queued')
+  AND (SELECT COUNT(*) FROM jobs WHERE workspace = job.workspace AND status = 'running') < ?
+ORDER BY job.seq
+LIMIT 1
+"""
+
+# Columns added after the first schema, with their types, for databases created before them
+MIGRATED_COLUMNS = {"owner": "TEXT", "lease_expires": "REAL"}
+
+class JobStore:
+    def __init__(self, path: str = "jobs.sqlite3", owner: Optional[str] = None, lease_seconds: float = 60.0):
+        """
+        Opens (creating if needed) the job database
+
+        Args:
+            path: SQLite database file, or ":memory:" for a throwaway store
+            owner: Identifies this store's claims among processes sharing the database. Unique per
+                instance by default
+            lease_seconds: How long a claimed job stays leased without being renewed
+        """
+        self.path = path
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in MIGRATED_COLUMNS.items():
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+
+    def enqueue(self, template_name: str, workspace_name: str, variables: Dict[str, Any],
+                max_attempts: int = 3) -> str:
+        """Adds a job behind every earlier job of the same workspace and returns its ID"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, template, workspace, variables, status, max_attempts, run_after,"
+                " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, template_name, workspace_name, json.dumps(variables), QUEUED, max_attempts, now, now, now)
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally only those with the given status"""
+        query = "SELECT * FROM jobs"
+        params: tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._lock:
+            rows = self._db.execute(f"{query} ORDER BY seq DESC LIMIT ?", (*params, limit)).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def claim(self, per_workspace_limit: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        Marks the next runnable job as running, leased to this store, and returns it
+
+        A job is runnable when it is the oldest queued job of its workspace,
+        its retry delay has passed and fewer than per_workspace_limit jobs of
+        that workspace are running.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(CLAIM_QUERY, (now, per_workspace_limit)).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, owner = ?, lease_expires = ?,"
+                        " updated_at = ? WHERE seq = ?",
+                        (RUNNING, self.owner, now + self.lease_seconds, now, row["seq"])
+                    )
+                    row = self._db.execute("SELECT * FROM jobs WHERE seq = ?", (row["seq"],)).fetchone()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return self._to_job(row) if row else None
+
+    def complete(self, job_id: str, result: Any) -> None:
+        self._finish(job_id, SUCCEEDED, result, None)
+
+    def fail(self, job_id: str, error: str, result: Any = None) -> None:
+        self._finish(job_id, FAILED, result, error)
+
+    def retry(self, job_id: str, error: str, delay: float) -> None:
+        """Puts a job this store is running back at the head of its workspace after delay seconds"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, run_after = ?, owner = NULL, lease_expires = NULL,"
+                " updated_at = ? WHERE id = ? AND status = ? AND owner = ?",
+                (QUEUED, error, now + delay, now, job_id, RUNNING, self.owner)
+            )
+
+    def renew_leases(self, job_ids: Iterable[str]) -> int:
+        """Extends the leases of the given jobs this store is running; returns how many it still holds"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+        now = time.time()
+        placeholders = ", ".join("?" for _ in job_ids)
+        with self._lock:
+            cursor = self._db.execute(
+                f"UPDATE jobs SET lease_expires = ? WHERE status = ? AND owner = ? AND id IN ({placeholders})",
+                (now + self.lease_seconds, RUNNING, self.owner, *job_ids)
+            )
+        return cursor.rowcount
+
+    def requeue_expired(self) -> int:
+        """
+        Returns running jobs whose lease expired to the queue
+
+        Their owner stopped renewing the lease, most likely because its
+        process died mid-run. That run may have been cut off part way through
+        an apply, so the next attempt is not a clean re-run: it plans against
+        whatever state was left, and fails (and is retried) while the
+        workspace is still locked by the abandoned run.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE status = ? AND (lease_expires IS NULL OR lease_expires < ?)",
+                (QUEUED, now, RUNNING, now)
+            )
+        return cursor.rowcount
+
+    def next_run_after(self) -> Optional[float]:
+        """Earliest time a queued job becomes due, if any job is queued"""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(run_after) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+        return row[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _finish(self, job_id: str, status: str, result: Any, error: Optional[str]) -> None:
+        """Records the outcome of a job this store is running; a job whose lease was taken back is left alone"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, owner = NULL, lease_expires = NULL,"
+                " updated_at = ? WHERE id = ? AND status = ? AND owner = ?",
+                (status, json.dumps(result, default=str) if result is not None else None, error,
+                 time.time(), job_id, RUNNING, self.owner)
+            )
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "template": row["template"],
+            "workspace": row["workspace"],
+            "variables": json.loads(row["variables"]),
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"]
+        }
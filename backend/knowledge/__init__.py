@@ -0,0 +1,7 @@
+from .readers import Chunk, read_asset_chunks, read_state_chunks, read_terraform_code_chunks
+from .embedders import HashingEmbedder, SentenceEmbedder
+from .store import VectorStore
+from .pipeline import KnowledgeBase
+
+__all__ = ['Chunk', 'read_asset_chunks', 'read_state_chunks', 'read_terraform_code_chunks', 'HashingEmbedder',
+           'SentenceEmbedder', 'VectorStore', 'KnowledgeBase']
@@ -0,0 +1,60 @@
+"""
+Text embedders for the knowledge base
+
+Every embedder maps a list of texts to an L2-normalized float32 array of
+shape (len(texts), dim) and names itself with a fingerprint, so a store can
+tell when its vectors were made by a different model.
+"""
+import re
+import zlib
+from typing import List, Sequence
+import numpy as np
+from backend.extractor.model_loader import sentence_encoder
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 512):
+        """
+        Offline embedder: signed feature hashing of word unigrams and bigrams
+
+        Needs no model download, so ingestion and retrieval work without
+        network access. Similarity is lexical rather than semantic.
+
+        Args:
+            dim: Vector size
+        """
+        self.dim = dim
+        self.fingerprint = f"hashing-v1-{dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            if not features:
+                continue
+            digests = np.array([zlib.crc32(feature.encode("utf-8")) for feature in features], dtype=np.uint64)
+            np.add.at(vectors[row], (digests % self.dim).astype(np.intp),
+                      np.where(digests >> 31, 1.0, -1.0).astype(np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+class SentenceEmbedder:
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2", dim: int = 384):
+        """
+        Semantic embedder backed by the shared sentence encoder (needs transformers)
+
+        Args:
+            model_name: Sentence encoder model
+            dim: Output size of model_name
+        """
+        self.model = sentence_encoder(model_name)
+        self.dim = dim
+        self.fingerprint = f"sentence-{model_name}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        texts: List[str] = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return self.model.get()(texts)
@@ -0,0 +1,141 @@
+"""
+Incremental ETL into the vector store, and retrieval on top of it
+
+Usage:
+    python -m backend.knowledge.pipeline ingest --store kb --state prod.tfstate --assets assets.json
+    python -m backend.knowledge.pipeline search --store kb --project project-alpha "existing VMs"
+
+Every ingestion run is a full snapshot of its sources: chunks whose content
+hash is unchanged keep their vectors, new and changed chunks are embedded in
+batches, and chunks that disappeared from a source are removed.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from .embedders import HashingEmbedder, SentenceEmbedder
+from .readers import Chunk, read_asset_chunks, read_state_chunks, read_terraform_code_chunks
+from .store import VectorStore
+
+class KnowledgeBase:
+    def __init__(self, directory: str, embedder=None, batch_size: int = 256):
+        """
+        Args:
+            directory: Vector store directory
+            embedder: HashingEmbedder (default, offline) or SentenceEmbedder
+            batch_size: Chunks embedded and written per batch
+        """
+        self.embedder = embedder or HashingEmbedder()
+        self.batch_size = batch_size
+        self.store = VectorStore(directory, self.embedder.dim, self.embedder.fingerprint)
+
+    def ingest(self, source: str, chunks: Iterable[Chunk]) -> Dict[str, int]:
+        """
+        Syncs the store with one source's current chunks
+
+        Args:
+            source: Name of the export, e.g. its path; chunk IDs are scoped to it
+            chunks: Every chunk the source holds now
+
+        Returns:
+            Counts of embedded, unchanged, removed and duplicate chunks
+        """
+        known = self.store.hashes(source)
+        stats = {"embedded": 0, "unchanged": 0, "removed": 0, "duplicate": 0}
+        seen = set()
+        batch: List[Tuple[Chunk, str]] = []
+
+        for chunk in chunks:
+            if chunk.chunk_id in seen:
+                stats["duplicate"] += 1
+                continue
+            seen.add(chunk.chunk_id)
+            content_hash = chunk.content_hash
+            if known.get(chunk.chunk_id) == content_hash:
+                stats["unchanged"] += 1
+                continue
+            batch.append((chunk, content_hash))
+            if len(batch) >= self.batch_size:
+                stats["embedded"] += self._write(source, batch)
+                batch = []
+        stats["embedded"] += self._write(source, batch)
+
+        stats["removed"] = self.store.delete([chunk_id for chunk_id in known if chunk_id not in seen])
+        return stats
+
+    def ingest_state(self, path: str) -> Dict[str, int]:
+        """Ingests a state file or `terraform show -json` output"""
+        with open(path, "r", encoding="utf-8") as f:
+            return self.ingest(os.path.abspath(path), read_state_chunks(f, os.path.abspath(path)))
+
+    def ingest_assets(self, path: str) -> Dict[str, int]:
+        """Ingests a Cloud Asset Inventory export"""
+        with open(path, "r", encoding="utf-8") as f:
+            return self.ingest(os.path.abspath(path), read_asset_chunks(f, os.path.abspath(path)))
+
+    def ingest_terraform(self, path: str) -> Dict[str, int]:
+        """Ingests the blocks of a .tf file or of every .tf file under a directory"""
+        return self.ingest(os.path.abspath(path), read_terraform_code_chunks(path, os.path.abspath(path)))
+
+    def search(self, queries: Sequence[str], k: int = 5, project_id: Optional[str] = None,
+               resource_type: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """Top-k chunks for every query, embedded and searched as one batch"""
+        return self.store.search(self.embedder.embed(list(queries)), k=k, project_id=project_id,
+                                 resource_type=resource_type)
+
+    def close(self) -> None:
+        self.store.close()
+
+    def _write(self, source: str, batch: List[Tuple[Chunk, str]]) -> int:
+        if not batch:
+            return 0
+        # Identical texts in a batch (e.g. copies of one resource) are embedded once
+        unique: Dict[str, int] = {}
+        for chunk, _ in batch:
+            unique.setdefault(chunk.text, len(unique))
+        vectors = self.embedder.embed(list(unique))
+        self.store.upsert(source, batch, vectors[[unique[chunk.text] for chunk, _ in batch]])
+        return len(batch)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Infrastructure knowledge base")
+    parser.add_argument("--store", required=True, help="Vector store directory")
+    parser.add_argument("--embedder", choices=["hashing", "sentence"], default="hashing",
+                        help="hashing works offline; sentence needs transformers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Sync exports into the store")
+    ingest.add_argument("--state", action="append", default=[], help="State or `terraform show -json` file")
+    ingest.add_argument("--assets", action="append", default=[], help="Cloud Asset Inventory export")
+    ingest.add_argument("--terraform", action="append", default=[], help=".tf file or directory")
+
+    search = commands.add_parser("search", help="Query the store")
+    search.add_argument("queries", nargs="+")
+    search.add_argument("-k", type=int, default=5)
+    search.add_argument("--project", help="Only resources of this project")
+    search.add_argument("--type", dest="resource_type", help="Only this resource type")
+    args = parser.parse_args(argv)
+
+    knowledge_base = KnowledgeBase(args.store, SentenceEmbedder() if args.embedder == "sentence" else None)
+    try:
+        if args.command == "ingest":
+            report = {}
+            for path in args.state:
+                report[path] = knowledge_base.ingest_state(path)
+            for path in args.assets:
+                report[path] = knowledge_base.ingest_assets(path)
+            for path in args.terraform:
+                report[path] = knowledge_base.ingest_terraform(path)
+        else:
+            report = dict(zip(args.queries, knowledge_base.search(
+                args.queries, k=args.k, project_id=args.project, resource_type=args.resource_type
+            )))
+    finally:
+        knowledge_base.close()
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+Streaming readers turning infrastructure exports into one chunk per resource
+
+Sources:
+    - Terraform state: `terraform state pull` / .tfstate files and `terraform show -json`
+    - Cloud Asset Inventory: `gcloud asset export` (newline-delimited JSON) or
+      `gcloud asset list --format=json` (a JSON array)
+    - Terraform code: resource, data and module blocks of .tf files
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+from backend.state.index import iter_resource_instances
+from backend.state.json_stream import JSONStreamReader
+
+# Longest text embedded per chunk; long attribute maps are cut here
+MAX_CHUNK_CHARS = 2000
+
+PROJECT_IN_NAME = re.compile(r"/projects/([^/]+)/")
+BLOCK_START = re.compile(r'^[ \t]*(resource|data|module)[ \t]+"([^"]+)"(?:[ \t]+"([^"]+)")?[ \t]*\{', re.MULTILINE)
+
+class Chunk:
+    def __init__(self, chunk_id: str, text: str, metadata: Dict[str, Any]):
+        """
+        One retrievable piece of infrastructure knowledge
+
+        Args:
+            chunk_id: Stable identity across ingestion runs, e.g. the resource address
+            text: What gets embedded
+            metadata: Filterable fields (project_id, resource_type, kind, ...) returned with results
+        """
+        self.chunk_id = chunk_id
+        self.text = text
+        self.metadata = metadata
+
+    @property
+    def content_hash(self) -> str:
+        """Hash of everything stored for the chunk; unchanged hashes are not re-embedded"""
+        payload = json.dumps([self.text, self.metadata], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def read_state_chunks(fileobj: TextIO, source: str) -> Iterator[Chunk]:
+    """
+    One chunk per resource instance of a state document
+
+    Accepts raw state (version 4, as stored by Terraform) and the
+    `terraform show -json` representation, detected from the top-level keys.
+    """
+    reader = JSONStreamReader(fileobj)
+    for key in reader.iter_object():
+        if key == "resources":
+            for record in iter_resource_instances(reader):
+                yield _state_chunk(record, source)
+        elif key == "values":
+            for record in _iter_show_values(reader):
+                yield _state_chunk(record, source)
+        else:
+            reader.read_value()
+
+def read_asset_chunks(fileobj: TextIO, source: str) -> Iterator[Chunk]:
+    """One chunk per Cloud Asset Inventory asset, from a JSON array or newline-delimited JSON"""
+    reader = JSONStreamReader(fileobj)
+    if reader.peek() == "[":
+        for _ in reader.iter_array():
+            yield _asset_chunk(reader.read_value(), source)
+        return
+    while reader.peek():
+        yield _asset_chunk(reader.read_value(), source)
+
+def read_terraform_code_chunks(path: str, source: Optional[str] = None) -> Iterator[Chunk]:
+    """One chunk per resource, data or module block of the .tf files under path"""
+    if os.path.isdir(path):
+        files = []
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(".tf"))
+    else:
+        files = [path]
+
+    for file_path in files:
+        with open(file_path, "r", encoding="utf-8") as f:
+            code = f.read()
+        relative = os.path.relpath(file_path, path) if os.path.isdir(path) else os.path.basename(file_path)
+        for match in BLOCK_START.finditer(code):
+            end = _block_end(code, match.end())
+            kind, first, second = match.groups()
+            if kind == "module":
+                address = f"module.{first}"
+            elif kind == "data":
+                address = f"data.{first}.{second}"
+            else:
+                address = f"{first}.{second}"
+            block = code[match.start():end].strip()
+            project = re.search(r'^\s*project\s*=\s*"([^"]+)"', block, re.MULTILINE)
+            metadata = {
+                "kind": "terraform",
+                "source": source or path,
+                "file": relative,
+                "address": address,
+                "resource_type": first if kind != "module" else "module",
+                "project_id": project.group(1) if project else ""
+            }
+            yield Chunk(f"{source or path}:{relative}:{address}", block[:MAX_CHUNK_CHARS], metadata)
+
+def _iter_show_values(reader: JSONStreamReader) -> Iterator[Dict[str, Any]]:
+    """Resources of `terraform show -json` values, walking root_module and child_modules"""
+    for key in reader.iter_object():
+        if key == "root_module":
+            yield from _iter_show_module(reader)
+        else:
+            reader.read_value()
+
+def _iter_show_module(reader: JSONStreamReader) -> Iterator[Dict[str, Any]]:
+    for key in reader.iter_object():
+        if key == "resources":
+            for _ in reader.iter_array():
+                resource = reader.read_value()
+                attributes = resource.get("values") or {}
+                yield {
+                    "address": resource.get("address"),
+                    "type": resource.get("type"),
+                    "project": attributes.get("project") or attributes.get("project_id") or "",
+                    "id": attributes.get("id"),
+                    "mode": resource.get("mode"),
+                    "name": resource.get("name"),
+                    "provider": resource.get("provider_name"),
+                    "attributes": attributes
+                }
+        elif key == "child_modules":
+            for _ in reader.iter_array():
+                yield from _iter_show_module(reader)
+        else:
+            reader.read_value()
+
+def _state_chunk(record: Dict[str, Any], source: str) -> Chunk:
+    metadata = {
+        "kind": "state",
+        "source": source,
+        "address": record["address"],
+        "resource_type": record["type"],
+        "project_id": record["project"],
+        "resource_id": record.get("id")
+    }
+    header = f"{record['type']} {record['address']} in project {record['project'] or 'unknown'}"
+    return Chunk(f"{source}:{record['address']}", _describe(header, record["attributes"]), metadata)
+
+def _asset_chunk(asset: Dict[str, Any], source: str) -> Chunk:
+    name = asset.get("name", "")
+    resource = asset.get("resource") or {}
+    data = resource.get("data") or {}
+    # Names carry the project ID, or the project number for some services; buckets and other
+    # global resources carry neither and only name the project number in their ancestry.
+    # Numbers are kept apart, since project filters and state chunks use IDs
+    project = PROJECT_IN_NAME.search(name)
+    in_name = project.group(1) if project and project.group(1) != "_" else ""
+    project_id = "" if in_name.isdigit() else in_name or data.get("projectId") or ""
+    project_number = in_name if in_name.isdigit() else next(
+        (ancestor.split("/", 1)[1] for ancestor in asset.get("ancestors") or [] if ancestor.startswith("projects/")),
+        str(data.get("projectNumber") or "")
+    )
+    metadata = {
+        "kind": "asset",
+        "source": source,
+        "name": name,
+        "resource_type": asset.get("asset_type") or asset.get("assetType", ""),
+        "project_id": project_id,
+        "project_number": project_number,
+        "location": resource.get("location", "")
+    }
+    project_label = project_id or (f"number {project_number}" if project_number else "unknown")
+    header = f"{metadata['resource_type']} {name} in project {project_label}"
+    return Chunk(f"{source}:{name}", _describe(header, data), metadata)
+
+def _describe(header: str, attributes: Dict[str, Any]) -> str:
+    """Header plus flattened, sorted key: value lines, cut at MAX_CHUNK_CHARS"""
+    lines = [header]
+    length = len(header)
+    for key, value in _flatten(attributes):
+        line = f"{key}: {value}"
+        length += len(line) + 1
+        if length > MAX_CHUNK_CHARS:
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+def _flatten(value: Any, prefix: str = "") -> List[tuple]:
+    if isinstance(value, dict):
+        items = []
+        for key in sorted(value):
+            items.extend(_flatten(value[key], f"{prefix}.{key}" if prefix else str(key)))
+        return items
+    if isinstance(value, list):
+        if all(not isinstance(item, (dict, list)) for item in value):
+            return [(prefix, ", ".join(str(item) for item in value))] if value else []
+        items = []
+        for index, item in enumerate(value):
+            items.extend(_flatten(item, f"{prefix}[{index}]"))
+        return items
+    if value is None or value == "":
+        return []
+    return [(prefix, value)]
+
+def _block_end(code: str, position: int) -> int:
+    """Index just past the brace closing the block whose body starts at position"""
+    depth = 1
+    index = position
+    length = len(code)
+    while index < length and depth:
+        char = code[index]
+        if char == '"':
+            index += 1
+            while index < length and code[index] != '"':
+                index += 2 if code[index] == "\\" else 1
+        elif char == "#" or code.startswith("//", index):
+            index = code.find("\n", index)
+            if index < 0:
+                return length
+        elif code.startswith("/*", index):
+            index = code.find("*/", index)
+            if index < 0:
+                return length
+            index += 1
+        elif code.startswith("<<", index):
+            heredoc = re.match(r"<<-?([A-Za-z_]+)\n", code[index:index + 64])
+            if heredoc:
+                closing = re.compile(rf"^\s*{heredoc.group(1)}\s*$", re.MULTILINE)
+                found = closing.search(code, index + heredoc.end())
+                index = found.end() if found else length
+                continue
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+        index += 1
+    return index
@@ -0,0 +1,273 @@
+"""
+Memory-mapped vector store with a SQLite catalog
+
+Vectors live in one float32 file mapped with numpy.memmap, row by row; the
+catalog maps chunk IDs to rows and keeps hashes, metadata and text. Filter
+columns are held as small integer code arrays so a project or resource type
+filter is a vectorized mask instead of a query per row.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+CATALOG_FILE = "catalog.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    row INTEGER UNIQUE NOT NULL,
+    source TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    project_id TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_by_source ON chunks (source);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class VectorStore:
+    def __init__(self, directory: str, dim: int, fingerprint: str):
+        """
+        Opens (creating if needed) the store in directory
+
+        Args:
+            directory: Holds the vector file and the catalog
+            dim: Vector size
+            fingerprint: Embedder identity; a store built by another embedder is emptied
+        """
+        self.directory = directory
+        self.dim = dim
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, CATALOG_FILE), check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+        settings = dict(self._db.execute("SELECT key, value FROM settings"))
+        if settings and (settings.get("dim") != str(dim) or settings.get("fingerprint") != fingerprint):
+            logger.warning("Vector store %s was built by %s; re-embedding everything with %s",
+                           directory, settings.get("fingerprint"), fingerprint)
+            self._db.execute("DELETE FROM chunks")
+            if os.path.exists(self._vectors_path):
+                os.remove(self._vectors_path)
+        self._db.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                             [("dim", str(dim)), ("fingerprint", fingerprint)])
+
+        self._vectors: Optional[np.memmap] = None
+        self._capacity = 0
+        self._open_vectors()
+
+        # Per row: code of its project / resource type, -1 for unused rows
+        self._projects: Dict[str, int] = {}
+        self._types: Dict[str, int] = {}
+        self._project_codes = np.full(self._capacity, -1, dtype=np.int32)
+        self._type_codes = np.full(self._capacity, -1, dtype=np.int32)
+        for row, project_id, resource_type in self._db.execute("SELECT row, project_id, resource_type FROM chunks"):
+            self._set_codes(row, project_id, resource_type)
+        used = np.flatnonzero(self._type_codes >= 0)
+        self._rows = int(used[-1]) + 1 if len(used) else 0
+        self._free = [int(row) for row in np.flatnonzero(self._type_codes[:self._rows] < 0)]
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, VECTORS_FILE)
+
+    def __len__(self) -> int:
+        return self._rows - len(self._free)
+
+    def hashes(self, source: str) -> Dict[str, str]:
+        """Chunk ID -> content hash of every stored chunk of source"""
+        with self._lock:
+            return dict(self._db.execute("SELECT id, hash FROM chunks WHERE source = ?", (source,)))
+
+    def upsert(self, source: str, chunks: Sequence[Tuple[Any, str]], vectors: np.ndarray) -> None:
+        """
+        Stores chunks with their vectors, overwriting the rows of chunks already present
+
+        Args:
+            source: Source the chunks belong to
+            chunks: (Chunk, content hash) pairs
+            vectors: One normalized vector per chunk
+        """
+        if not len(chunks):
+            return
+        with self._lock:
+            ids = [chunk.chunk_id for chunk, _ in chunks]
+            existing = {}
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                existing.update(self._db.execute(
+                    f"SELECT id, row FROM chunks WHERE id IN ({','.join('?' * len(part))})", part
+                ))
+
+            rows = []
+            for chunk_id in ids:
+                row = existing.get(chunk_id)
+                if row is None:
+                    row = self._free.pop() if self._free else self._rows
+                    self._rows = max(self._rows, row + 1)
+                rows.append(row)
+            self._ensure_capacity(self._rows)
+
+            self._vectors[rows] = np.asarray(vectors, dtype=np.float32)
+            self._vectors.flush()
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (id, row, source, hash, project_id, resource_type, metadata, text)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (chunk.chunk_id, row, source, content_hash, chunk.metadata.get("project_id") or "",
+                     chunk.metadata.get("resource_type") or "", json.dumps(chunk.metadata, default=str), chunk.text)
+                    for (chunk, content_hash), row in zip(chunks, rows)
+                ]
+            )
+            self._db.execute("COMMIT")
+            for (chunk, _), row in zip(chunks, rows):
+                self._set_codes(row, chunk.metadata.get("project_id") or "", chunk.metadata.get("resource_type") or "")
+
+    def delete(self, chunk_ids: Sequence[str]) -> int:
+        """Removes chunks by ID and frees their rows; returns how many existed"""
+        removed = 0
+        with self._lock:
+            for start in range(0, len(chunk_ids), 500):
+                part = list(chunk_ids[start:start + 500])
+                placeholders = ",".join("?" * len(part))
+                rows = [row for (row,) in self._db.execute(f"SELECT row FROM chunks WHERE id IN ({placeholders})", part)]
+                self._db.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", part)
+                for row in rows:
+                    self._project_codes[row] = -1
+                    self._type_codes[row] = -1
+                    self._free.append(row)
+                removed += len(rows)
+        return removed
+
+    def search(self, queries: np.ndarray, k: int = 5, project_id: Optional[str] = None,
+               resource_type: Optional[str] = None, block_rows: int = 65536) -> List[List[Dict[str, Any]]]:
+        """
+        Batched top-k cosine search
+
+        All queries are scored together against blocks of at most block_rows
+        vectors, so memory stays bounded however large the store grows.
+
+        Args:
+            queries: Normalized query vectors, shape (n_queries, dim)
+            k: Results per query
+            project_id: Only chunks of this project
+            resource_type: Only chunks of this resource type
+            block_rows: Vectors scored per matrix product
+
+        Returns:
+            Per query, up to k dicts with id, score, text and metadata, best first
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            candidates = self._candidates(project_id, resource_type)
+            if not self._rows or (candidates is not None and not len(candidates)):
+                return [[] for _ in range(len(queries))]
+            best_rows, best_scores = self._top_k(queries, candidates, k, block_rows)
+
+            wanted = sorted({int(row) for row in best_rows.ravel()})
+            chunks = {}
+            for start in range(0, len(wanted), 500):
+                part = wanted[start:start + 500]
+                for row, chunk_id, metadata, text in self._db.execute(
+                    f"SELECT row, id, metadata, text FROM chunks WHERE row IN ({','.join('?' * len(part))})", part
+                ):
+                    chunks[row] = (chunk_id, json.loads(metadata), text)
+
+        results = []
+        for rows, scores in zip(best_rows, best_scores):
+            matches = []
+            for row, score in zip(rows, scores):
+                if int(row) in chunks:
+                    chunk_id, metadata, text = chunks[int(row)]
+                    matches.append({"id": chunk_id, "score": float(score), "text": text, "metadata": metadata})
+            results.append(matches)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            self._db.close()
+
+    def _candidates(self, project_id: Optional[str], resource_type: Optional[str]) -> Optional[np.ndarray]:
+        """Rows passing the filters, or None when every row up to the high-water mark is live and wanted"""
+        if project_id is None and resource_type is None and not self._free:
+            return None
+        mask = self._type_codes[:self._rows] >= 0
+        if project_id is not None:
+            mask &= self._project_codes[:self._rows] == self._projects.get(project_id, -2)
+        if resource_type is not None:
+            mask &= self._type_codes[:self._rows] == self._types.get(resource_type, -2)
+        return np.flatnonzero(mask)
+
+    def _top_k(self, queries: np.ndarray, candidates: Optional[np.ndarray], k: int,
+               block_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+        total = self._rows if candidates is None else len(candidates)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, total, block_rows):
+            stop = min(start + block_rows, total)
+            if candidates is None:
+                rows = np.arange(start, stop)
+                block = self._vectors[start:stop]
+            else:
+                rows = candidates[start:stop]
+                block = self._vectors[rows]
+            scores = queries @ block.T
+
+            # Keep the block's own top k, then the best k of those and the running ones
+            take = min(k, scores.shape[1])
+            top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            merged_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            merged_rows = np.concatenate([best_rows, rows[top]], axis=1)
+            if merged_scores.shape[1] > k:
+                keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+                merged_scores = np.take_along_axis(merged_scores, keep, axis=1)
+                merged_rows = np.take_along_axis(merged_rows, keep, axis=1)
+            best_scores, best_rows = merged_scores, merged_rows
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _set_codes(self, row: int, project_id: str, resource_type: str) -> None:
+        self._project_codes[row] = self._projects.setdefault(project_id, len(self._projects))
+        self._type_codes[row] = self._types.setdefault(resource_type, len(self._types))
+
+    def _ensure_capacity(self, rows: int) -> None:
+        """Grows the vector file (doubling) and the code arrays to hold rows"""
+        if rows <= self._capacity:
+            return
+        capacity = max(1024, self._capacity * 2, rows)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self._open_vectors()
+        grow = self._capacity - len(self._type_codes)
+        self._project_codes = np.concatenate([self._project_codes, np.full(grow, -1, dtype=np.int32)])
+        self._type_codes = np.concatenate([self._type_codes, np.full(grow, -1, dtype=np.int32)])
+
+    def _open_vectors(self) -> None:
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        self._capacity = size // (self.dim * 4)
+        self._vectors = (
+            np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self._capacity, self.dim))
+            if self._capacity else None
+        )
@@ -0,0 +1,239 @@
+"""
+Latency and outcome instrumentation for the agent pipeline
+
+Stages are timed with `span`, which records a histogram sample and emits a
+structured JSON log line. Everything recorded in the process-wide METRICS
+registry can be exported in Prometheus text format or as JSON.
+"""
+import bisect
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; spans cover both sub-millisecond regex work and minute-long applies
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+CONFIDENCE_BUCKETS = (0.2, 0.4, 0.6, 0.8)
+
+STAGE_DURATION = "agent_stage_duration_seconds"
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+def confidence_bucket(confidence: float) -> str:
+    """Label for the confidence range a score falls in, e.g. "0.2-0.4" """
+    index = bisect.bisect_right(CONFIDENCE_BUCKETS, confidence)
+    lower = CONFIDENCE_BUCKETS[index - 1] if index else 0.0
+    upper = CONFIDENCE_BUCKETS[index] if index < len(CONFIDENCE_BUCKETS) else 1.0
+    return f"{lower:.1f}-{upper:.1f}"
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate: upper bound of the bucket holding the q-th sample, capped by the largest sample"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Thread-safe counters and histograms keyed by metric name and labels"""
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._histograms: Dict[str, Dict[LabelSet, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: float = 1, **labels: Any) -> None:
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage: str, **labels: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Times a pipeline stage
+
+        Yields the label dict so the block can add labels it learns on the
+        way, such as the template or outcome. The outcome defaults to "ok",
+        or "error" when the block raises.
+        """
+        labels = {"stage": stage, **labels}
+        start = time.perf_counter()
+        try:
+            yield labels
+        except BaseException:
+            labels["outcome"] = "error"
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            labels.setdefault("outcome", "ok")
+            self.observe(STAGE_DURATION, duration, **labels)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({"metric": STAGE_DURATION, "duration_ms": round(duration * 1000, 3),
+                                        **{k: str(v) for k, v in labels.items()}}))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All metrics as JSON-serializable data, with p50/p95/p99 estimates per histogram"""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(key), "value": value}
+                for name, series in self._counters.items() for key, value in series.items()
+            ]
+            histograms = [
+                {
+                    "name": name, "labels": dict(key), "count": h.count, "sum": h.sum,
+                    "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99)
+                }
+                for name, series in self._histograms.items() for key, h in series.items()
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def prometheus_text(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{self._format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._format_labels(key, le=repr(bound))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._format_labels(key, le='+Inf')} {histogram.count}")
+                    lines.append(f"{name}_sum{self._format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{self._format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def serve(self, port: int = 9464, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serves /metrics (Prometheus) and /metrics.json from a daemon thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.prometheus_text(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> LabelSet:
+        return tuple(sorted(
+            (key, str(value).lower() if isinstance(value, bool) else str(value))
+            for key, value in labels.items() if value is not None
+        ))
+
+    @staticmethod
+    def _format_labels(key: LabelSet, **extra: str) -> str:
+        pairs = list(key) + sorted(extra.items())
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold: float = 5.0, sample_rate: float = 0.05, output_dir: str = "profiles"):
+        """
+        Profiles a sample of requests with cProfile and keeps the slow ones
+
+        Args:
+            threshold: Requests taking longer than this many seconds are dumped
+            sample_rate: Fraction of requests profiled
+            output_dir: Directory for .prof files, readable with pstats or snakeviz
+        """
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        # cProfile cannot profile two overlapping requests reliably; extra ones are not sampled
+        self._active = threading.Lock()
+
+    @contextmanager
+    def profile(self, name: str) -> Iterator[None]:
+        if random.random() >= self.sample_rate or not self._active.acquire(blocking=False):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - start
+            self._active.release()
+            if duration >= self.threshold:
+                self._dump(profiler, name, duration)
+
+    def _dump(self, profiler: cProfile.Profile, name: str, duration: float) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{name}-{int(time.time() * 1000)}-{duration:.2f}s.prof")
+        profiler.dump_stats(path)
+        METRICS.increment("agent_slow_requests_total", stage=name)
+        logger.warning(json.dumps({"event": "slow_request", "stage": name,
+                                   "duration_ms": round(duration * 1000, 3), "profile": path}))
+
+
+# Process-wide registry used by the agent and the terraform clients
+METRICS = MetricsRegistry()
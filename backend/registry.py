@@ -0,0 +1,205 @@
+"""
+Shared, compiled template registry with hot reload
+
+templates/registry.json is parsed, validated and compiled once into a
+CompiledRegistry holding the keyword matcher, the extraction plans and the
+classifier label table. Every consumer reads the same TemplateRegistry,
+which notices edits to the file and swaps in a freshly compiled registry
+without a restart.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+from backend.extractor.extraction_plan import EXTRACTION_PATTERNS, ExtractionPlan
+from backend.extractor.keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REGISTRY_PATH = os.path.join(BACKEND_DIR, "templates", "registry.json")
+
+# Key -> expected type for every template entry
+REQUIRED_TEMPLATE_KEYS = {"path": str, "function": str, "keywords": list, "required_vars": list}
+OPTIONAL_TEMPLATE_KEYS = {"optional_vars": list, "labels": list, "examples": list}
+
+RegistryListener = Callable[["CompiledRegistry"], None]
+
+class RegistryError(ValueError):
+    pass
+
+
+def validate_registry(raw: Any) -> None:
+    """Raises RegistryError describing the first problem found in a parsed registry"""
+    if not isinstance(raw, dict) or not isinstance(raw.get("templates"), dict) or not raw["templates"]:
+        raise RegistryError('Registry must contain a non-empty "templates" object')
+
+    for template_name, config in raw["templates"].items():
+        if not isinstance(config, dict):
+            raise RegistryError(f"Template {template_name} must be an object")
+        for key, expected in {**REQUIRED_TEMPLATE_KEYS, **OPTIONAL_TEMPLATE_KEYS}.items():
+            if key not in config:
+                if key in REQUIRED_TEMPLATE_KEYS:
+                    raise RegistryError(f"Template {template_name} is missing {key}")
+                continue
+            if not isinstance(config[key], expected):
+                raise RegistryError(f"Template {template_name}: {key} must be a {expected.__name__}")
+            if expected is list and not all(isinstance(item, str) for item in config[key]):
+                raise RegistryError(f"Template {template_name}: {key} must only contain strings")
+        if not config["keywords"]:
+            raise RegistryError(f"Template {template_name} needs at least one keyword")
+
+
+class CompiledRegistry:
+    def __init__(self, raw: Dict[str, Any], version: str, base_dir: str = BACKEND_DIR):
+        """
+        Immutable snapshot of one registry version with everything derived from it
+
+        Args:
+            raw: Validated registry contents
+            version: Content hash of the registry file
+            base_dir: Directory template paths are relative to
+        """
+        self.raw = raw
+        self.version = version
+        self.templates: Dict[str, Dict[str, Any]] = raw["templates"]
+
+        self.keyword_matcher = KeywordMatcher({
+            template_name: config["keywords"] for template_name, config in self.templates.items()
+        })
+        self.extraction_plans = {
+            template_name: ExtractionPlan(config["required_vars"] + config.get("optional_vars", []),
+                                          EXTRACTION_PATTERNS)
+            for template_name, config in self.templates.items()
+        }
+
+        # NLI candidate label -> template; templates without labels are described by their name
+        self.label_to_template: Dict[str, str] = {}
+        for template_name, config in self.templates.items():
+            for label in config.get("labels") or [f"create {template_name.replace('-', ' ')}"]:
+                self.label_to_template[label] = template_name
+        self.candidate_labels: List[str] = list(self.label_to_template)
+
+        self.template_paths = {
+            template_name: os.path.normpath(os.path.join(base_dir, config["path"]))
+            for template_name, config in self.templates.items()
+        }
+        self.function_names = {template_name: config["function"] for template_name, config in self.templates.items()}
+
+
+class TemplateRegistry:
+    def __init__(self, path: str = DEFAULT_REGISTRY_PATH, check_interval: float = 1.0):
+        """
+        Loads and compiles a registry file, recompiling it when the file changes
+
+        Args:
+            path: Registry JSON file
+            check_interval: Minimum seconds between checks of the file's mtime
+        """
+        self.path = os.path.abspath(path) if path else None
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._listeners: List[RegistryListener] = []
+        self._checked_at = 0.0
+        self._stat_key = None
+        self._compiled: Optional[CompiledRegistry] = None
+        if self.path:
+            self.reload(force=True, strict=True)
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> "TemplateRegistry":
+        """Fixed registry for an already parsed dict; never reloads"""
+        validate_registry(raw)
+        registry = cls(path=None)
+        version = hashlib.sha256(json.dumps(raw, sort_keys=True).encode("utf-8")).hexdigest()
+        registry._compiled = CompiledRegistry(raw, version)
+        return registry
+
+    @property
+    def current(self) -> CompiledRegistry:
+        """The latest compiled registry; checks the file at most every check_interval seconds"""
+        if self.path and time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload()
+        return self._compiled
+
+    def subscribe(self, listener: RegistryListener) -> None:
+        """Calls listener with every newly compiled registry after a reload"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def reload(self, force: bool = False, strict: bool = False) -> bool:
+        """
+        Recompiles the registry if the file changed
+
+        An invalid file is logged and the previous registry stays active,
+        unless strict is set (used for the first load).
+
+        Returns:
+            Whether a new registry was swapped in
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                stat = os.stat(self.path)
+            except OSError as e:
+                if strict:
+                    raise
+                logger.error("Cannot stat template registry %s: %s", self.path, e)
+                return False
+            stat_key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            if not force and stat_key == self._stat_key:
+                return False
+            self._stat_key = stat_key
+
+            with open(self.path, "rb") as f:
+                content = f.read()
+            version = hashlib.sha256(content).hexdigest()
+            if self._compiled is not None and version == self._compiled.version:
+                return False
+
+            try:
+                raw = json.loads(content)
+                validate_registry(raw)
+                compiled = CompiledRegistry(raw, version, base_dir=os.path.dirname(os.path.dirname(self.path)))
+            except (ValueError, KeyError) as e:
+                if strict:
+                    raise RegistryError(f"Invalid template registry {self.path}: {e}") from e
+                logger.error("Ignoring invalid template registry %s: %s", self.path, e)
+                return False
+
+            # Readers see either the old or the new registry, never a mix
+            self._compiled = compiled
+            listeners = list(self._listeners)
+
+        logger.info("Loaded template registry %s (version %s)", self.path, version[:12])
+        # The new registry is already live; a failing listener must not fail the caller that triggered the reload
+        for listener in listeners:
+            try:
+                listener(compiled)
+            except Exception:
+                logger.exception("Template registry listener %r failed", listener)
+        return True
+
+
+_registries: Dict[str, TemplateRegistry] = {}
+_registries_lock = threading.Lock()
+
+def get_registry(path: Optional[str] = None) -> TemplateRegistry:
+    """Process-wide TemplateRegistry for path (default: backend/templates/registry.json)"""
+    path = os.path.abspath(path or DEFAULT_REGISTRY_PATH)
+    with _registries_lock:
+        registry = _registries.get(path)
+        if registry is None:
+            registry = _registries[path] = TemplateRegistry(path)
+    return registry
+
+def as_registry(registry: Union[TemplateRegistry, Dict[str, Any], None]) -> TemplateRegistry:
+    """Accepts a TemplateRegistry, a parsed registry dict, or None for the shared default"""
+    if registry is None:
+        return get_registry()
+    if isinstance(registry, TemplateRegistry):
+        return registry
+    return TemplateRegistry.from_dict(registry)
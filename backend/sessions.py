@@ -0,0 +1,120 @@
+"""
+In-memory conversation state for multi-turn provisioning requests
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+class Session:
+    def __init__(self, template_name: str, variables: Dict[str, Any], missing: List[str]):
+        """
+        A request waiting for missing variables
+
+        Args:
+            template_name: Template identified on the first turn
+            variables: Values extracted so far, None for variables not given yet
+            missing: Required variables still without a value
+        """
+        self.session_id = uuid.uuid4().hex
+        self.template_name = template_name
+        self.variables = variables
+        self.missing = missing
+        self.turns = 1
+        self.updated_at = time.monotonic()
+        # Speculative terraform preparation kept across turns in pipelined mode
+        self.preparation: Any = None
+
+    def merge(self, variables: Dict[str, Any]) -> None:
+        """Adds the values of a new turn; values given later override earlier ones"""
+        self.variables.update({var_name: value for var_name, value in variables.items() if value})
+        self.turns += 1
+        self.updated_at = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "template": self.template_name,
+            "variables": dict(self.variables),
+            "missing": list(self.missing),
+            "turns": self.turns
+        }
+
+class SessionStore:
+    def __init__(self, ttl: float = 1800.0, max_sessions: int = 10000,
+                 on_drop: Optional[Callable[[Session], None]] = None):
+        """
+        Thread-safe session map with idle expiry
+
+        Args:
+            ttl: Seconds a session survives without a new turn
+            max_sessions: Sessions kept at most; the least recently used are dropped first
+            on_drop: Called with every session that expires or is evicted, e.g. to release
+                what it holds; not called for remove()
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.on_drop = on_drop
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, session: Session) -> Session:
+        dropped = []
+        with self._lock:
+            self._sessions[session.session_id] = session
+            # Least recently used first: expired sessions sit at the front
+            now = time.monotonic()
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if len(self._sessions) <= self.max_sessions and now - oldest.updated_at <= self.ttl:
+                    break
+                dropped.append(self._sessions.popitem(last=False)[1])
+        self._dropped(dropped)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """The live session with session_id, None when unknown or expired"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            expired = time.monotonic() - session.updated_at > self.ttl
+            if expired:
+                del self._sessions[session_id]
+            else:
+                self._sessions.move_to_end(session_id)
+        if expired:
+            self._dropped([session])
+            return None
+        return session
+
+    def pop(self, session_id: str) -> Optional[Session]:
+        """
+        Takes the live session with session_id out of the store, None when unknown or expired
+
+        Only one caller can take a session, so concurrent turns of one
+        session never both act on it; add() puts a session that still
+        waits for variables back.
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return None
+        if time.monotonic() - session.updated_at > self.ttl:
+            self._dropped([session])
+            return None
+        return session
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _dropped(self, sessions: List[Session]) -> None:
+        if self.on_drop is None:
+            return
+        for session in sessions:
+            self.on_drop(session)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
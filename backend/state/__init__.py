@@ -0,0 +1,6 @@
+from .json_stream import JSONStreamReader
+from .index import StateIndex, iter_state_instances
+from .sources import LocalStateSource, TerraformCloudStateSource, local_state_sources, terraform_cloud_state_sources
+
+__all__ = ['JSONStreamReader', 'StateIndex', 'iter_state_instances', 'LocalStateSource', 'TerraformCloudStateSource',
+           'local_state_sources', 'terraform_cloud_state_sources']
@@ -0,0 +1,423 @@
+"""
+On-disk, memory-mapped index of resources across many Terraform states
+"""
+import hashlib
+import heapq
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from contextlib import ExitStack
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, TextIO
+from .json_stream import JSONStreamReader
+from .sources import StateSource, StateVersion
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+SEGMENTS_DIR = "segments"
+
+# Sort keys of each index; every line is <keys>, workspace, offset, length
+INDEX_KEYS = {
+    "type": ("type", "project", "address"),
+    "project": ("project", "type", "address"),
+    "address": ("address", "type", "project")
+}
+FIELD_SEPARATOR = b"\x1f"
+
+def iter_state_instances(fileobj: TextIO) -> Iterator[Dict[str, Any]]:
+    """
+    Yields one record per resource instance of a version 4 state document
+
+    The state is read incrementally; only one instance is in memory at a time.
+    """
+    reader = JSONStreamReader(fileobj)
+    for key in reader.iter_object():
+        if key == "resources":
+            yield from iter_resource_instances(reader)
+        else:
+            reader.read_value()
+
+def iter_resource_instances(reader: JSONStreamReader) -> Iterator[Dict[str, Any]]:
+    """Instance records of the state resources array the reader is positioned on"""
+    for _ in reader.iter_array():
+        resource: Dict[str, Any] = {}
+        # Terraform writes instances last; buffer them only if a state does not
+        pending = []
+        for field in reader.iter_object():
+            if field != "instances":
+                resource[field] = reader.read_value()
+                continue
+            for _ in reader.iter_array():
+                instance = reader.read_value()
+                if "mode" in resource and "type" in resource and "name" in resource:
+                    yield instance_record(resource, instance)
+                else:
+                    pending.append(instance)
+        for instance in pending:
+            yield instance_record(resource, instance)
+
+def instance_record(resource: Dict[str, Any], instance: Dict[str, Any]) -> Dict[str, Any]:
+    """Flattens a state resource and one of its instances into an index record"""
+    attributes = instance.get("attributes") or {}
+    return {
+        "address": resource_address(resource, instance.get("index_key")),
+        "type": resource.get("type"),
+        "project": attributes.get("project") or attributes.get("project_id") or "",
+        "id": attributes.get("id"),
+        "mode": resource.get("mode"),
+        "module": resource.get("module"),
+        "name": resource.get("name"),
+        "provider": resource.get("provider"),
+        "index_key": instance.get("index_key"),
+        "attributes": attributes
+    }
+
+def resource_address(resource: Dict[str, Any], index_key: Any = None) -> str:
+    """Terraform address of a resource instance, e.g. module.a.google_storage_bucket.b["x"]"""
+    address = f"{resource.get('type')}.{resource.get('name')}"
+    if resource.get("mode") == "data":
+        address = f"data.{address}"
+    if resource.get("module"):
+        address = f"{resource['module']}.{address}"
+    if isinstance(index_key, str):
+        address += f"[{json.dumps(index_key)}]"
+    elif index_key is not None:
+        address += f"[{index_key}]"
+    return address
+
+class SortedLines:
+    def __init__(self, path: str):
+        """Memory-mapped file of newline-terminated, byte-sorted lines searched by prefix"""
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def scan(self, prefix: bytes) -> Iterator[bytes]:
+        """Lines starting with prefix, in order, found by binary search"""
+        data = self._map
+        if data is None:
+            return
+        lo, hi = 0, len(data)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = data.rfind(b"\n", 0, mid) + 1
+            end = data.find(b"\n", start)
+            if data[start:end] < prefix:
+                lo = end + 1
+            else:
+                hi = start
+
+        while lo < len(data):
+            end = data.find(b"\n", lo)
+            line = data[lo:end]
+            if not line.startswith(prefix):
+                return
+            yield line
+            lo = end + 1
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+class StateIndex:
+    def __init__(self, index_dir: str, refresh_interval: float = 0.0):
+        """
+        Resource index over the states of many workspaces
+
+        Each workspace's state is parsed once per serial into a segment: its
+        instance records as JSON lines plus small sorted key files. The
+        segments' key files are merged into one sorted file per index (by
+        type, project and address) that lookups binary-search through mmap,
+        so queries never touch the state files themselves.
+
+        Args:
+            index_dir: Directory holding the index; created with owner-only
+                permissions because records contain state attributes
+            refresh_interval: refresh() calls within this many seconds of the
+                previous one return without checking the sources
+        """
+        self.index_dir = index_dir
+        self.refresh_interval = refresh_interval
+        os.makedirs(index_dir, mode=0o700, exist_ok=True)
+        os.makedirs(os.path.join(index_dir, SEGMENTS_DIR), mode=0o700, exist_ok=True)
+
+        self.manifest = self._load_manifest()
+        self._indexes: Dict[str, SortedLines] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._last_refresh: Optional[float] = None
+        self._open_indexes()
+
+    def refresh(self, sources: Iterable[StateSource], force: bool = False) -> Optional[Dict[str, int]]:
+        """
+        Brings the index up to date with sources, the complete set of workspaces
+
+        Only workspaces whose serial or lineage changed are re-read;
+        workspaces missing from sources are dropped.
+
+        Returns:
+            Counts of checked, reindexed, removed and failed workspaces, or None when
+            skipped because of refresh_interval
+        """
+        with self._refresh_lock:
+            if (not force and self._last_refresh is not None
+                    and time.monotonic() - self._last_refresh < self.refresh_interval):
+                return None
+
+            # Parsing and merging happen beside the live index; lookups only wait for the final swap
+            workspaces = dict(self.manifest["workspaces"])
+            stats = {"checked": 0, "reindexed": 0, "removed": 0, "failed": 0}
+            seen = set()
+            reindexed = []
+            removed = []
+            dirty = False
+            for source in sources:
+                seen.add(source.workspace)
+                stats["checked"] += 1
+                previous = workspaces.get(source.workspace)
+                try:
+                    version = source.version(previous)
+                except Exception as e:
+                    # Keep serving the last indexed state of a workspace that cannot be read right now
+                    logger.warning("Could not check state of workspace %s: %s", source.workspace, e)
+                    stats["failed"] += 1
+                    continue
+                if version is None:
+                    if previous is not None:
+                        removed.append(workspaces.pop(source.workspace))
+                    continue
+                if version.same_state(previous):
+                    if previous.get("stamp") != version.stamp:
+                        workspaces[source.workspace] = {**previous, "stamp": version.stamp}
+                        dirty = True
+                    continue
+                try:
+                    workspaces[source.workspace] = self._index_workspace(source, version)
+                except Exception as e:
+                    logger.warning("Could not index state of workspace %s: %s", source.workspace, e)
+                    stats["failed"] += 1
+                    continue
+                reindexed.append(workspaces[source.workspace]["segment"])
+
+            for workspace in set(workspaces) - seen:
+                removed.append(workspaces.pop(workspace))
+            stats["reindexed"] = len(reindexed)
+            stats["removed"] = len(removed)
+
+            changed = bool(reindexed or removed)
+            if changed:
+                self._merge([entry["segment"] for entry in workspaces.values()], set(reindexed))
+            with self._lock:
+                for segment in reindexed:
+                    base = os.path.join(self.index_dir, SEGMENTS_DIR, segment)
+                    for suffix in ["jsonl", *INDEX_KEYS]:
+                        os.replace(f"{base}.{suffix}.tmp", f"{base}.{suffix}")
+                if changed:
+                    for name in INDEX_KEYS:
+                        path = os.path.join(self.index_dir, f"{name}.idx")
+                        os.replace(f"{path}.tmp", path)
+                    self._open_indexes()
+                first_build = not self.is_built
+                self.manifest = {"version": INDEX_FORMAT_VERSION, "workspaces": workspaces,
+                                 "built_at": self.manifest.get("built_at") or time.time()}
+
+            for entry in removed:
+                self._remove_segment(entry)
+            if changed or dirty or first_build:
+                self._save_manifest()
+            self._last_refresh = time.monotonic()
+            return stats
+
+    @property
+    def is_built(self) -> bool:
+        """Whether a refresh has ever completed, so an empty lookup means no such resources"""
+        return "built_at" in self.manifest or bool(self.manifest["workspaces"])
+
+    def find(self, resource_type: Optional[str] = None, project: Optional[str] = None,
+             address: Optional[str] = None, workspace: Optional[str] = None,
+             with_attributes: bool = False) -> List[Dict[str, Any]]:
+        """
+        Resource instances matching every given filter
+
+        Args:
+            resource_type: Terraform resource type, e.g. google_storage_bucket
+            project: GCP project of the resource
+            address: Exact resource instance address
+            workspace: Workspace the resource belongs to
+            with_attributes: Also load each instance's full record from its segment
+
+        Returns:
+            Records with workspace, address, type and project, in index order
+        """
+        criteria = {"type": resource_type, "project": project, "address": address}
+        if address is not None:
+            index_name = "address"
+        elif resource_type is None and project is not None:
+            index_name = "project"
+        else:
+            index_name = "type"
+
+        # Longest leading run of given keys forms the search prefix
+        prefix = []
+        for key in INDEX_KEYS[index_name]:
+            if criteria[key] is None:
+                break
+            prefix.append(self._encode(criteria[key]))
+        prefix_bytes = FIELD_SEPARATOR.join(prefix) + FIELD_SEPARATOR if prefix else b""
+
+        results = []
+        with self._lock:
+            if workspace is not None:
+                # The workspace's own key file holds just its resources, sorted the same way
+                indexed = self.manifest["workspaces"].get(workspace)
+                if indexed is None:
+                    return results
+                index = SortedLines(self._segment_path(indexed["segment"], index_name))
+            else:
+                index = self._indexes.get(index_name)
+                if index is None:
+                    return results
+            try:
+                lines = list(index.scan(prefix_bytes))
+            finally:
+                if workspace is not None:
+                    index.close()
+            for line in lines:
+                entry = self._decode(index_name, line)
+                if workspace is not None and entry["workspace"] != workspace:
+                    continue
+                if any(value is not None and entry[key] != value for key, value in criteria.items()):
+                    continue
+                if with_attributes:
+                    results.append(self._read_record(entry))
+                else:
+                    entry.pop("offset")
+                    entry.pop("length")
+                    results.append(entry)
+        return results
+
+    def workspaces(self) -> Dict[str, Dict[str, Any]]:
+        """Indexed workspaces with their serial, lineage and resource count"""
+        with self._lock:
+            return {
+                name: {"serial": entry["serial"], "lineage": entry["lineage"], "resources": entry["resources"]}
+                for name, entry in self.manifest["workspaces"].items()
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            for index in self._indexes.values():
+                index.close()
+            self._indexes = {}
+
+    def _index_workspace(self, source: StateSource, version: StateVersion) -> Dict[str, Any]:
+        """Streams one workspace's state into a new segment, written as .tmp files until swapped in"""
+        segment = hashlib.sha1(source.workspace.encode("utf-8")).hexdigest()[:16]
+        base = os.path.join(self.index_dir, SEGMENTS_DIR, segment)
+        keys: Dict[str, List[bytes]] = {name: [] for name in INDEX_KEYS}
+        workspace = self._encode(source.workspace)
+
+        offset = 0
+        with open(f"{base}.jsonl.tmp", "wb") as records, source.open() as state:
+            for record in iter_state_instances(state):
+                line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+                records.write(line)
+                tail = FIELD_SEPARATOR.join([workspace, str(offset).encode(), str(len(line)).encode()])
+                for name, fields in INDEX_KEYS.items():
+                    keys[name].append(
+                        FIELD_SEPARATOR.join([self._encode(record[field]) for field in fields] + [tail])
+                    )
+                offset += len(line)
+
+        for name, lines in keys.items():
+            lines.sort()
+            with open(f"{base}.{name}.tmp", "wb") as f:
+                f.writelines(line + b"\n" for line in lines)
+
+        logger.info("Indexed %d resource instance(s) of workspace %s at serial %s",
+                    len(keys["type"]), source.workspace, version.serial)
+        return {
+            "serial": version.serial,
+            "lineage": version.lineage,
+            "stamp": version.stamp,
+            "segment": segment,
+            "resources": len(keys["type"])
+        }
+
+    def _merge(self, segments: List[str], pending: Set[str]) -> None:
+        """Writes each index as <name>.idx.tmp, merging the already sorted key files of segments"""
+        for name in INDEX_KEYS:
+            path = os.path.join(self.index_dir, f"{name}.idx")
+            with ExitStack() as stack, open(f"{path}.tmp", "wb") as out:
+                files = [
+                    stack.enter_context(open(self._segment_path(segment, name, segment in pending), "rb"))
+                    for segment in segments
+                ]
+                out.writelines(heapq.merge(*files))
+
+    def _open_indexes(self) -> None:
+        for index in self._indexes.values():
+            index.close()
+        self._indexes = {}
+        for name in INDEX_KEYS:
+            path = os.path.join(self.index_dir, f"{name}.idx")
+            if os.path.exists(path):
+                self._indexes[name] = SortedLines(path)
+
+    def _segment_path(self, segment: str, suffix: str, pending: bool = False) -> str:
+        path = os.path.join(self.index_dir, SEGMENTS_DIR, f"{segment}.{suffix}")
+        return f"{path}.tmp" if pending else path
+
+    def _read_record(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        segment = self.manifest["workspaces"][entry["workspace"]]["segment"]
+        with open(self._segment_path(segment, "jsonl"), "rb") as f:
+            record = json.loads(os.pread(f.fileno(), entry["length"], entry["offset"]))
+        record["workspace"] = entry["workspace"]
+        return record
+
+    def _remove_segment(self, entry: Dict[str, Any]) -> None:
+        base = os.path.join(self.index_dir, SEGMENTS_DIR, entry["segment"])
+        for suffix in ["jsonl", *INDEX_KEYS]:
+            try:
+                os.remove(f"{base}.{suffix}")
+            except FileNotFoundError:
+                pass
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        path = os.path.join(self.index_dir, MANIFEST_FILE)
+        try:
+            with open(path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        if not manifest or manifest.get("version") != INDEX_FORMAT_VERSION:
+            # Missing or from another format version: every workspace is re-indexed
+            return {"version": INDEX_FORMAT_VERSION, "workspaces": {}}
+        return manifest
+
+    def _save_manifest(self) -> None:
+        path = os.path.join(self.index_dir, MANIFEST_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(f"{path}.tmp", path)
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        """Index field bytes; separators and newlines cannot occur inside a field"""
+        text = "" if value is None else str(value)
+        return text.replace("\x1f", " ").replace("\n", " ").encode("utf-8")
+
+    @staticmethod
+    def _decode(index_name: str, line: bytes) -> Dict[str, Any]:
+        fields = line.decode("utf-8").split("\x1f")
+        entry = dict(zip(INDEX_KEYS[index_name], fields))
+        entry["workspace"] = fields[3]
+        entry["offset"] = int(fields[4])
+        entry["length"] = int(fields[5])
+        return entry
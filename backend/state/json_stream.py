@@ -0,0 +1,115 @@
+"""
+Incremental JSON reading for documents too large to load at once
+"""
+import json
+from typing import Any, Iterator, TextIO
+
+WHITESPACE = " \t\n\r"
+
+class JSONStreamReader:
+    def __init__(self, fileobj: TextIO, chunk_size: int = 1 << 16):
+        """
+        Pull parser over a JSON text stream
+
+        Containers are walked with iter_object/iter_array and only the values
+        passed to read_value are materialized, so memory follows the largest
+        value read rather than the document size. Values are decoded by the C
+        json decoder from a buffer that is refilled on demand.
+
+        Args:
+            fileobj: Text stream positioned at the start of a JSON value
+            chunk_size: Characters read per refill
+        """
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def iter_object(self) -> Iterator[str]:
+        """
+        Yields the keys of the object at the current position
+
+        After each key the caller must consume its value with read_value,
+        iter_object or iter_array before advancing the iterator.
+        """
+        self._expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            if not isinstance(key, str):
+                raise self._error("Expecting property name")
+            self._expect(":")
+            yield key
+            if not self._separator("}"):
+                return
+
+    def iter_array(self) -> Iterator[None]:
+        """Positions the reader on each element of the array at the current position; the caller consumes it"""
+        self._expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield None
+            if not self._separator("]"):
+                return
+
+    def read_value(self) -> Any:
+        """Decodes the complete value at the current position"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                # Grow geometrically so a large value is not re-decoded once per chunk
+                self._fill(max(self.chunk_size, len(self.buffer) - self.pos))
+                continue
+            if end == len(self.buffer) and not self.eof and isinstance(value, (int, float)):
+                # A number at the end of the buffer may continue in the next chunk
+                self._fill(self.chunk_size)
+                continue
+            self.pos = end
+            return value
+
+    def _separator(self, closing: str) -> bool:
+        """Consumes ',' (True, more items follow) or the closing bracket (False)"""
+        char = self.peek()
+        self.pos += 1
+        if char == ",":
+            return True
+        if char == closing:
+            return False
+        self.pos -= 1
+        raise self._error(f"Expecting ',' or '{closing}'")
+
+    def _expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise self._error(f"Expecting '{char}'")
+        self.pos += 1
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character, '' at the end of the stream"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return ""
+            self._fill(self.chunk_size)
+
+    def _fill(self, size: int) -> None:
+        chunk = self.fileobj.read(size)
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buffer, self.pos)
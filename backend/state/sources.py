@@ -0,0 +1,128 @@
+"""
+Where Terraform state comes from: local state files or Terraform Cloud workspaces
+"""
+import glob
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, TextIO
+from .json_stream import JSONStreamReader
+
+class StateVersion:
+    def __init__(self, serial: Optional[int], lineage: Optional[str], stamp: Any = None):
+        """
+        Identity of one state snapshot
+
+        Args:
+            serial: Terraform state serial, incremented on every write
+            lineage: State lineage; a new lineage restarts serials
+            stamp: Source-specific token that changes whenever the state may have changed
+        """
+        self.serial = serial
+        self.lineage = lineage
+        self.stamp = stamp
+
+    def same_state(self, entry: Optional[Dict[str, Any]]) -> bool:
+        """Whether a manifest entry describes this snapshot"""
+        return bool(entry) and entry.get("serial") == self.serial and entry.get("lineage") == self.lineage
+
+class StateSource:
+    """A workspace's state: a cheap version check plus a streamed read of the full document"""
+    workspace: str
+
+    def version(self, previous: Optional[Dict[str, Any]] = None) -> Optional[StateVersion]:
+        """Current version, None when the workspace has no state; previous is its last manifest entry"""
+        raise NotImplementedError
+
+    def open(self) -> Iterator[TextIO]:
+        """Context manager yielding the state JSON as a text stream"""
+        raise NotImplementedError
+
+class LocalStateSource(StateSource):
+    def __init__(self, path: str, workspace: Optional[str] = None):
+        """
+        State file on disk, such as terraform.tfstate or the output of `terraform state pull`
+
+        Args:
+            path: State file path
+            workspace: Name the state is indexed under; the file name without extension by default
+        """
+        self.path = path
+        self.workspace = workspace or os.path.splitext(os.path.basename(path))[0]
+
+    def version(self, previous: Optional[Dict[str, Any]] = None) -> Optional[StateVersion]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        if previous and previous.get("stamp") == stamp:
+            # Unchanged file: skip even the header read
+            return StateVersion(previous.get("serial"), previous.get("lineage"), stamp)
+
+        serial = lineage = None
+        with self.open() as f:
+            reader = JSONStreamReader(f, chunk_size=4096)
+            for key in reader.iter_object():
+                if key == "resources":
+                    break
+                value = reader.read_value()
+                if key == "serial":
+                    serial = value
+                elif key == "lineage":
+                    lineage = value
+                if serial is not None and lineage is not None:
+                    break
+        return StateVersion(serial, lineage, stamp)
+
+    @contextmanager
+    def open(self) -> Iterator[TextIO]:
+        with open(self.path, "r", encoding="utf-8") as f:
+            yield f
+
+class TerraformCloudStateSource(StateSource):
+    def __init__(self, api_client, workspace: Dict[str, Any]):
+        """
+        Current state version of a Terraform Cloud workspace
+
+        Args:
+            api_client: TerraformCloudAPIClient used for lookups and downloads
+            workspace: Workspace data as returned by TerraformCloudAPIClient.list_workspaces
+        """
+        self.api_client = api_client
+        self.workspace = workspace["attributes"]["name"]
+        relationship = (workspace.get("relationships") or {}).get("current-state-version") or {}
+        self.state_version_id = (relationship.get("data") or {}).get("id")
+        self._download_url = None
+
+    def version(self, previous: Optional[Dict[str, Any]] = None) -> Optional[StateVersion]:
+        if self.state_version_id is None:
+            return None
+        if previous and previous.get("stamp") == self.state_version_id:
+            # The workspace listing already names the current state version
+            return StateVersion(previous.get("serial"), previous.get("lineage"), self.state_version_id)
+
+        attributes = self.api_client.get_state_version(self.state_version_id)["attributes"]
+        self._download_url = attributes.get("hosted-state-download-url")
+        return StateVersion(attributes.get("serial"), attributes.get("lineage"), self.state_version_id)
+
+    @contextmanager
+    def open(self) -> Iterator[TextIO]:
+        if self._download_url is None:
+            self.version()
+        # Spool to disk so the state is never held in memory as a whole
+        with tempfile.TemporaryFile(mode="w+b") as spool:
+            self.api_client.download_state(self._download_url, spool)
+            spool.seek(0)
+            with open(spool.fileno(), "r", encoding="utf-8", closefd=False) as f:
+                yield f
+
+def local_state_sources(directory: str) -> Iterator[LocalStateSource]:
+    """One source per *.tfstate file in directory, named after the file"""
+    for path in sorted(glob.glob(os.path.join(directory, "*.tfstate"))):
+        yield LocalStateSource(path)
+
+def terraform_cloud_state_sources(api_client) -> Iterator[TerraformCloudStateSource]:
+    """One source per workspace of the client's organization, listed lazily"""
+    for workspace in api_client.list_workspaces():
+        yield TerraformCloudStateSource(api_client, workspace)
@@ -0,0 +1,24 @@
+terraform {
+  required_version = ">= 1.3"
+
+  required_providers {
+    google = {
+      source  = "hashicorp/google"
+      version = "~> 4.0"
+    }
+  }
+}
+
+provider "google" {
+  project = var.project_id
+}
+
+# One resource instance per bucket, so a whole batch shares one plan/apply
+resource "google_storage_bucket" "bucket" {
+  for_each = var.buckets
+
+  name          = each.key
+  location      = var.location
+  storage_class = each.value.storage_class
+  labels        = each.value.labels
+}
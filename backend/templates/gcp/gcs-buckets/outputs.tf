@@ -0,0 +1,4 @@
+output "bucket_urls" {
+  description = "gs:// URL of every bucket, keyed by bucket name"
+  value       = { for name, bucket in google_storage_bucket.bucket : name => bucket.url }
+}
@@ -0,0 +1,18 @@
+variable "project_id" {
+  description = "GCP Project ID"
+  type        = string
+}
+
+variable "location" {
+  description = "Location shared by every bucket in this workspace"
+  type        = string
+  default     = "US"
+}
+
+variable "buckets" {
+  description = "Buckets to manage, keyed by bucket name"
+  type = map(object({
+    storage_class = optional(string, "STANDARD")
+    labels        = optional(map(string), {})
+  }))
+}
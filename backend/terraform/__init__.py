@@ -1,3 +1,8 @@
 from .client import TerraformCloudClient
+from .async_client import AsyncTerraformCloudClient
+from .api_client import TerraformCloudAPIClient, TerraformCloudAPIError
+from .pool import get_client, clear_clients
+from .speculative import Preparation, SpeculativePreparer
 
-__all__ = ['TerraformCloudClient']
+__all__ = ['TerraformCloudClient', 'AsyncTerraformCloudClient', 'TerraformCloudAPIClient', 'TerraformCloudAPIError',
+           'get_client', 'clear_clients', 'Preparation', 'SpeculativePreparer']
@@ -0,0 +1,471 @@
+"""
+API-driven Terraform Cloud execution backend
+
+Talks to the Terraform Cloud v2 API directly instead of shelling out to the
+terraform CLI: configuration is uploaded as a tarball, variables are synced
+on the workspace and runs are created and polled over pooled keep-alive
+HTTP connections.
+"""
+import http.client
+import io
+import json
+import os
+import queue
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from .client import GENERATED_FILES
+
+# Run states after which a run never changes again
+RUN_SUCCESS_STATES = {"applied", "planned_and_finished"}
+RUN_FINAL_STATES = RUN_SUCCESS_STATES | {"errored", "discarded", "canceled", "force_canceled", "policy_soft_failed"}
+
+JSON_API = "application/vnd.api+json"
+
+# Requests that may be sent twice; anything else never goes over a reused keep-alive connection
+# (TFC's PATCHes here set absolute values)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "PATCH", "DELETE"})
+
+# State downloads are served from a separate storage host behind a redirect
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+
+class TerraformCloudAPIError(Exception):
+    def __init__(self, status: int, message: str, body: Any = None):
+        super().__init__(f"Terraform Cloud API error {status}: {message}")
+        self.status = status
+        self.body = body
+
+
+class HTTPConnectionPool:
+    def __init__(self, max_connections: int = 10, timeout: float = 30.0):
+        """
+        Thread-safe pool of keep-alive connections per (scheme, host, port)
+
+        Args:
+            max_connections: Idle connections kept per host
+            timeout: Socket timeout in seconds
+        """
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._idle: Dict[Tuple[str, str, int], queue.LifoQueue] = {}
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """Performs one request, reusing an idle connection when possible"""
+        key, connection, response = self._send(method, url, body, headers)
+        data = response.read()
+        self._finish(key, connection, response)
+        return response.status, dict(response.getheaders()), data
+
+    def download(self, url: str, fileobj: BinaryIO, headers: Optional[Dict[str, str]] = None,
+                 chunk_size: int = 1 << 16) -> int:
+        """GETs url and streams a successful response body into fileobj; returns the status"""
+        for _ in range(MAX_REDIRECTS):
+            key, connection, response = self._send("GET", url, None, headers)
+            location = response.getheader("Location")
+            if response.status not in REDIRECT_STATUSES or not location:
+                break
+            response.read()
+            self._finish(key, connection, response)
+            target = urljoin(url, location)
+            if urlsplit(target).netloc != urlsplit(url).netloc:
+                headers = None  # Never forward credentials to another host
+            url = target
+        if response.status < 300:
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                fileobj.write(chunk)
+        else:
+            response.read()
+        self._finish(key, connection, response)
+        return response.status
+
+    def _send(self, method: str, url: str, body: Optional[bytes],
+              headers: Optional[Dict[str, str]]) -> Tuple[Tuple[str, str, int], http.client.HTTPConnection,
+                                                          http.client.HTTPResponse]:
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        # A stale idle connection is only detected after the request went out, when it may have been
+        # processed; non-idempotent requests take a fresh connection so they are sent exactly once
+        connection, reused = self._acquire(key, fresh=method not in IDEMPOTENT_METHODS)
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            connection.close()
+            if not reused:
+                raise
+            # The server closed an idle keep-alive connection; retry once on a fresh one
+            connection = self._connect(key)
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+        except Exception:
+            connection.close()
+            raise
+        return key, connection, response
+
+    def _finish(self, key, connection: http.client.HTTPConnection, response: http.client.HTTPResponse) -> None:
+        """Returns the connection to the pool once the response has been read"""
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+
+    def close(self) -> None:
+        with self._lock:
+            pools, self._idle = self._idle, {}
+        for idle in pools.values():
+            while not idle.empty():
+                idle.get_nowait().close()
+
+    def _acquire(self, key, fresh: bool = False) -> Tuple[http.client.HTTPConnection, bool]:
+        if fresh:
+            return self._connect(key), False
+        with self._lock:
+            idle = self._idle.setdefault(key, queue.LifoQueue())
+        try:
+            return idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(key), False
+
+    def _release(self, key, connection: http.client.HTTPConnection) -> None:
+        idle = self._idle.get(key)
+        if idle is None or idle.qsize() >= self.max_connections:
+            connection.close()
+        else:
+            idle.put(connection)
+
+    def _connect(self, key) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+
+class TerraformCloudAPIClient:
+    def __init__(self, organization: str, token: Optional[str] = None,
+                 base_url: str = "https://app.terraform.io", max_connections: int = 10,
+                 poll_interval: float = 2.0, run_timeout: float = 3600.0):
+        """
+        Initialize the API-driven Terraform Cloud client
+
+        Args:
+            organization: Terraform Cloud organization name
+            token: Terraform Cloud API token. If not provided, will try to get from env var TF_TOKEN_app_terraform_io
+            base_url: API host; point it at a local stand-in server for offline testing
+            max_connections: Keep-alive connections kept per host
+            poll_interval: Seconds between run status polls
+            run_timeout: Seconds to wait for a run to finish
+        """
+        self.organization = organization
+        self.token = token or os.getenv("TF_TOKEN_app_terraform_io")
+        if not self.token:
+            raise ValueError("Terraform Cloud token must be provided or set in TF_TOKEN_app_terraform_io environment variable")
+
+        self.base_url = base_url.rstrip("/")
+        self.poll_interval = poll_interval
+        self.run_timeout = run_timeout
+        self.pool = HTTPConnectionPool(max_connections=max_connections)
+
+        # Workspace name -> workspace data, shared by every run of this client
+        self._workspaces: Dict[str, Dict[str, Any]] = {}
+        self._workspaces_lock = threading.Lock()
+
+    def execute_template(self, template_path: str, variables: Dict[str, Any], workspace_name: str,
+                         on_status: Optional[Callable[[str, str], None]] = None) -> Dict[str, Any]:
+        """
+        Executes a terraform template through the API, mirroring TerraformCloudClient.execute_template
+
+        Args:
+            template_path: Path to the terraform template directory
+            variables: Dictionary of variables to set on the workspace
+            workspace_name: Name of the Terraform Cloud workspace
+            on_status: Called with (run_id, status) whenever the run status changes
+
+        Returns:
+            Dict containing the execution results
+        """
+        try:
+            workspace = self.ensure_workspace(workspace_name)
+            self.set_variables(workspace["id"], variables)
+
+            version_id, upload_url = self.create_configuration_version(workspace["id"])
+            self.upload_configuration(upload_url, template_path)
+            self.wait_for_configuration_version(version_id)
+
+            run_id = self.create_run(workspace["id"], version_id, message=f"Queued by chat-to-create for {workspace_name}")
+            run = self.wait_for_run(run_id, on_status=on_status)
+        except (TerraformCloudAPIError, OSError, TimeoutError) as e:
+            if isinstance(e, TerraformCloudAPIError) and e.status == 404:
+                # The cached workspace may have been deleted; look it up again next time
+                with self._workspaces_lock:
+                    self._workspaces.pop(workspace_name, None)
+            return {
+                "status": "error",
+                "details": {"error": str(e), "workspace_name": workspace_name}
+            }
+
+        status = run["attributes"]["status"]
+        return {
+            "status": "success" if status in RUN_SUCCESS_STATES else "error",
+            "details": {
+                "run_id": run_id,
+                "run_status": status,
+                "has_changes": run["attributes"].get("has-changes"),
+                "workspace_id": workspace["id"],
+                "workspace_name": workspace_name,
+                "url": f"{self.base_url}/app/{self.organization}/workspaces/{workspace_name}/runs/{run_id}"
+            }
+        }
+
+    def execute_many(self, runs: List[Dict[str, Any]], max_parallel_runs: int = 8) -> List[Dict[str, Any]]:
+        """
+        Executes several templates concurrently over the shared connection pool
+
+        Args:
+            runs: Dicts of execute_template keyword arguments
+            max_parallel_runs: Runs driven at the same time
+
+        Returns:
+            Results in input order
+        """
+        with ThreadPoolExecutor(max_workers=max(1, max_parallel_runs)) as executor:
+            return list(executor.map(lambda run: self.execute_template(**run), runs))
+
+    def get_workspace(self, workspace_name: str) -> Optional[Dict[str, Any]]:
+        """Workspace data including its current-state-version, or None if it does not exist"""
+        try:
+            return self._data("GET", f"/organizations/{self.organization}/workspaces/{workspace_name}")
+        except TerraformCloudAPIError as e:
+            if e.status != 404:
+                raise
+            return None
+
+    def ensure_workspace(self, workspace_name: str) -> Dict[str, Any]:
+        """Returns the workspace, creating it if needed; lookups are cached"""
+        with self._workspaces_lock:
+            cached = self._workspaces.get(workspace_name)
+        if cached is not None:
+            return cached
+
+        workspace = self.get_workspace(workspace_name)
+        if workspace is None:
+            workspace = self._data("POST", f"/organizations/{self.organization}/workspaces", {
+                "data": {
+                    "type": "workspaces",
+                    "attributes": {"name": workspace_name, "auto-apply": True}
+                }
+            })
+
+        with self._workspaces_lock:
+            self._workspaces[workspace_name] = workspace
+        return workspace
+
+    def set_variables(self, workspace_id: str, variables: Dict[str, Any]) -> None:
+        """
+        Syncs terraform variables onto the workspace
+
+        Existing variables are listed once; only new or changed values are
+        written, so re-running an unchanged request costs a single GET.
+        """
+        existing = {
+            var["attributes"]["key"]: var
+            for var in self._data("GET", f"/workspaces/{workspace_id}/vars", attributes=("key",))
+            if var["attributes"].get("category") == "terraform"
+        }
+
+        for key, value in variables.items():
+            if value is None:
+                continue
+            hcl = not isinstance(value, str)
+            encoded = json.dumps(value) if hcl else value
+            current = existing.get(key)
+
+            if current is None:
+                self._request("POST", f"/workspaces/{workspace_id}/vars", {
+                    "data": {
+                        "type": "vars",
+                        "attributes": {"key": key, "value": encoded, "category": "terraform",
+                                       "hcl": hcl, "sensitive": False}
+                    }
+                })
+            elif current["attributes"].get("value") != encoded or current["attributes"].get("hcl") != hcl:
+                self._request("PATCH", f"/workspaces/{workspace_id}/vars/{current['id']}", {
+                    "data": {
+                        "type": "vars",
+                        "id": current["id"],
+                        "attributes": {"value": encoded, "hcl": hcl}
+                    }
+                })
+
+    def create_configuration_version(self, workspace_id: str) -> Tuple[str, str]:
+        """Returns (configuration_version_id, upload_url)"""
+        version = self._data("POST", f"/workspaces/{workspace_id}/configuration-versions", {
+            "data": {
+                "type": "configuration-versions",
+                "attributes": {"auto-queue-runs": False}
+            }
+        }, attributes=("upload-url",))
+        return version["id"], version["attributes"]["upload-url"]
+
+    def upload_configuration(self, upload_url: str, template_path: str) -> None:
+        """Uploads the template directory as a .tar.gz configuration"""
+        try:
+            status, _, body = self.pool.request(
+                "PUT",
+                upload_url,
+                body=self._configuration_tarball(template_path),
+                headers={"Content-Type": "application/octet-stream"}
+            )
+        except http.client.HTTPException as e:
+            raise TerraformCloudAPIError(0, f"configuration upload failed: {e!r}") from e
+        if status >= 300:
+            raise TerraformCloudAPIError(status, "configuration upload failed", body.decode(errors="replace"))
+
+    def wait_for_configuration_version(self, version_id: str) -> None:
+        """Blocks until an uploaded configuration has been processed"""
+        deadline = time.monotonic() + self.run_timeout
+        while True:
+            status = self._data("GET", f"/configuration-versions/{version_id}", attributes=("status",))["attributes"]["status"]
+            if status == "uploaded":
+                return
+            if status == "errored":
+                raise TerraformCloudAPIError(422, f"configuration version {version_id} errored")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"configuration version {version_id} was not processed in time")
+            time.sleep(min(self.poll_interval, 0.5))
+
+    def create_run(self, workspace_id: str, version_id: str, message: str = "", auto_apply: bool = True) -> str:
+        run = self._data("POST", "/runs", {
+            "data": {
+                "type": "runs",
+                "attributes": {"message": message, "auto-apply": auto_apply},
+                "relationships": {
+                    "workspace": {"data": {"type": "workspaces", "id": workspace_id}},
+                    "configuration-version": {"data": {"type": "configuration-versions", "id": version_id}}
+                }
+            }
+        })
+        return run["id"]
+
+    def wait_for_run(self, run_id: str, on_status: Optional[Callable[[str, str], None]] = None) -> Dict[str, Any]:
+        """Polls the run until it reaches a final state and returns its data"""
+        deadline = time.monotonic() + self.run_timeout
+        last_status = None
+        while True:
+            run = self._data("GET", f"/runs/{run_id}", attributes=("status",))
+            status = run["attributes"]["status"]
+            if status != last_status:
+                last_status = status
+                if on_status is not None:
+                    on_status(run_id, status)
+            if status in RUN_FINAL_STATES:
+                return run
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"run {run_id} did not finish within {self.run_timeout} seconds")
+            time.sleep(self.poll_interval)
+
+    def list_workspaces(self, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """Yields every workspace of the organization, one page request at a time"""
+        page = 1
+        while page:
+            path = f"/organizations/{self.organization}/workspaces?page%5Bnumber%5D={page}&page%5Bsize%5D={page_size}"
+            document = self._request("GET", path)
+            yield from self._resources("GET", path, document, ())
+            page = (document.get("meta") or {}).get("pagination", {}).get("next-page")
+
+    def get_state_version(self, state_version_id: str) -> Dict[str, Any]:
+        """State version data including its serial and hosted-state-download-url"""
+        return self._data("GET", f"/state-versions/{state_version_id}")
+
+    def download_state(self, download_url: str, fileobj: BinaryIO) -> None:
+        """Streams a state version's JSON into fileobj without holding it in memory"""
+        try:
+            status = self.pool.download(download_url, fileobj, headers={"Authorization": f"Bearer {self.token}"})
+        except http.client.HTTPException as e:
+            raise TerraformCloudAPIError(0, f"state download failed: {e!r}") from e
+        if status >= 300:
+            raise TerraformCloudAPIError(status, "state download failed")
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        headers = {"Authorization": f"Bearer {self.token}", "Content-Type": JSON_API, "Accept": JSON_API}
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        try:
+            status, response_headers, data = self.pool.request(method, f"{self.base_url}/api/v2{path}", body=body,
+                                                               headers=headers)
+        except http.client.HTTPException as e:
+            raise TerraformCloudAPIError(0, f"{method} {path}: {e!r}") from e
+
+        # Proxies and load balancers answer outages with HTML pages; only JSON bodies are decoded
+        content_type = next((value for name, value in response_headers.items() if name.lower() == "content-type"), "")
+        media_type = content_type.split(";")[0].strip().lower()
+        document: Any = {}
+        if data and (media_type == "application/json" or media_type.endswith("+json")):
+            try:
+                document = json.loads(data)
+            except ValueError:
+                if status < 300:
+                    raise TerraformCloudAPIError(status, f"{method} {path}: invalid JSON response",
+                                                 data[:200].decode(errors="replace"))
+        elif data and status < 300:
+            raise TerraformCloudAPIError(status, f"{method} {path}: unexpected {media_type or 'untyped'} response",
+                                         data[:200].decode(errors="replace"))
+
+        if status >= 300:
+            errors = document.get("errors") if isinstance(document, dict) else None
+            message = errors[0].get("detail") or errors[0].get("title") if errors else f"{method} {path}"
+            raise TerraformCloudAPIError(status, message, document or data[:200].decode(errors="replace"))
+        return document
+
+    def _data(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None,
+              attributes: Tuple[str, ...] = ()) -> Any:
+        """
+        The `data` member of a successful response, checked to hold resources
+
+        Args:
+            attributes: Attributes every resource must have
+
+        Raises:
+            TerraformCloudAPIError: Also when a 2xx response is not shaped like a JSON:API document
+        """
+        return self._resources(method, path, self._request(method, path, payload), attributes)
+
+    @staticmethod
+    def _resources(method: str, path: str, document: Any, attributes: Tuple[str, ...]) -> Any:
+        """Returns document's `data`, a resource or list of resources with an id and the given attributes"""
+        data = document.get("data") if isinstance(document, dict) else None
+        for resource in data if isinstance(data, list) else [data]:
+            if not (isinstance(resource, dict) and isinstance(resource.get("id"), str)
+                    and isinstance(resource.get("attributes"), dict)
+                    and all(name in resource["attributes"] for name in attributes)):
+                raise TerraformCloudAPIError(0, f"{method} {path}: malformed response", document)
+        return data
+
+    @staticmethod
+    def _configuration_tarball(template_path: str) -> bytes:
+        """Packs the template's files, skipping locally generated ones"""
+        template_dir = os.path.abspath(template_path)
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz", dereference=True) as archive:
+            for root, dirs, files in os.walk(template_dir, followlinks=True):
+                dirs[:] = sorted(d for d in dirs if d not in GENERATED_FILES)
+                for name in sorted(files):
+                    if name in GENERATED_FILES:
+                        continue
+                    path = os.path.join(root, name)
+                    archive.add(path, arcname=os.path.relpath(path, template_dir))
+        return buffer.getvalue()
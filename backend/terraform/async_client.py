@@ -0,0 +1,205 @@
+"""
+Asyncio variant of the Terraform Cloud client
+"""
+import asyncio
+import os
+import subprocess
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
+from backend.metrics import METRICS
+from .client import INIT_ARGS, OutputCallback, TerraformCloudClient
+from .streaming import DEFAULT_TAIL_LINES, AsyncTerraformOutputStream
+
+class AsyncTerraformCloudClient(TerraformCloudClient):
+    """
+    Runs terraform through asyncio subprocesses so that one event loop can
+    drive many provisioning runs without a thread per run
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # asyncio locks belong to one event loop; a pooled client may serve several
+        self._async_data_dir_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Lock]]" = \
+            weakref.WeakKeyDictionary()
+
+    async def aexecute_template(self, template_path: str, variables: Dict[str, Any], workspace_name: str,
+                                isolated: Optional[bool] = None,
+                                on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """
+        Async counterpart of execute_template, returning the same result shape
+
+        Args:
+            template_path: Path to the terraform template directory
+            variables: Dictionary of variables to pass to terraform
+            workspace_name: Name of the Terraform Cloud workspace
+            isolated: Run in a private scratch directory. Defaults to the client's isolated_runs
+            on_output: Called with every stdout/stderr line of init, plan and apply as it arrives
+
+        Returns:
+            Dict containing the execution results
+        """
+        if isolated is None:
+            isolated = self.isolated_runs
+
+        if not isolated:
+            self.workspace_dir = os.path.abspath(template_path)
+            return await self._aexecute_in(self.workspace_dir, variables, workspace_name, on_output)
+
+        with self.run_directory(template_path, workspace_name) as run_dir:
+            return await self._aexecute_in(run_dir, variables, workspace_name, on_output)
+
+    async def _aexecute_in(self, working_dir: str, variables: Dict[str, Any], workspace_name: str,
+                           on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Runs init (when needed), plan and apply inside working_dir"""
+        data_dir = self._data_dir(working_dir, workspace_name)
+        env = self._terraform_env(data_dir)
+
+        async with self._shared_data_dir_lock(data_dir):
+            # Create/update backend configuration for Terraform Cloud
+            self._setup_cloud_backend(workspace_name, working_dir)
+
+            # Create terraform.tfvars file
+            self._create_tfvars(variables, working_dir)
+
+            # Initialize Terraform unless nothing relevant changed since the last init
+            if not self._init_is_current(working_dir, data_dir):
+                self._forget_init(data_dir)
+                init_result = await self._arun_terraform_command("init", *INIT_ARGS, cwd=working_dir, env=env,
+                                                                 on_output=on_output)
+                if init_result.get("error"):
+                    return init_result
+                self._record_init(working_dir, data_dir)
+
+            # Run terraform plan
+            plan_result = await self._arun_terraform_command(
+                "plan", *self._plan_args(), cwd=working_dir, env=env,
+                allowed_exit_codes=self._plan_exit_codes(), on_output=on_output
+            )
+            if plan_result.get("error"):
+                return plan_result
+            if self._plan_is_noop(plan_result):
+                return self._plan_only_result(plan_result)
+
+            # Run terraform apply
+            apply_result = await self._arun_terraform_command("apply", *self._apply_args(), cwd=working_dir, env=env,
+                                                              on_output=on_output)
+
+        return self._apply_result(plan_result, apply_result)
+
+    def _async_data_dir_lock(self, data_dir: str) -> asyncio.Lock:
+        """Serializes coroutines that share one data directory"""
+        locks = self._async_data_dir_locks.setdefault(asyncio.get_running_loop(), {})
+        return locks.setdefault(data_dir, asyncio.Lock())
+
+    @asynccontextmanager
+    async def _shared_data_dir_lock(self, data_dir: str) -> AsyncIterator[None]:
+        """
+        Holds data_dir's process-wide lock, which sync runs and other event loops take too
+
+        Coroutines of this loop queue on the asyncio lock first, so at most one of
+        them waits for the threading lock in an executor thread.
+        """
+        async with self._async_data_dir_lock(data_dir):
+            lock = self._data_dir_lock(data_dir)
+            if not lock.acquire(blocking=False):
+                acquiring = asyncio.get_running_loop().run_in_executor(None, lock.acquire)
+                try:
+                    await asyncio.shield(acquiring)
+                except asyncio.CancelledError:
+                    # The executor thread still takes the lock; hand it straight back
+                    acquiring.add_done_callback(lambda _: lock.release())
+                    raise
+            try:
+                yield
+            finally:
+                lock.release()
+
+    def astream_command(self, command: str, *args, cwd: Optional[str] = None,
+                        env: Optional[Dict[str, str]] = None) -> AsyncTerraformOutputStream:
+        """
+        Runs a terraform command; use `async for` on the result to receive
+        output events as they arrive
+        """
+        return AsyncTerraformOutputStream(
+            [self.terraform_path, command, *args],
+            cwd=cwd or self.workspace_dir,
+            env=env,
+            tail_lines=self.output_tail_lines or DEFAULT_TAIL_LINES
+        )
+
+    async def _arun_terraform_command(self, command: str, *args, cwd: Optional[str] = None,
+                                      env: Optional[Dict[str, str]] = None,
+                                      allowed_exit_codes: Tuple[int, ...] = (0,),
+                                      on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Executes a terraform command without blocking the event loop"""
+        with METRICS.span(f"terraform_{command}", mode="async") as span:
+            result = await self._arun_terraform_subprocess(command, *args, cwd=cwd, env=env,
+                                                           allowed_exit_codes=allowed_exit_codes,
+                                                           on_output=on_output)
+            span["outcome"] = "error" if result.get("error") else "ok"
+            return result
+
+    async def _arun_terraform_subprocess(self, command: str, *args, cwd: Optional[str] = None,
+                                         env: Optional[Dict[str, str]] = None,
+                                         allowed_exit_codes: Tuple[int, ...] = (0,),
+                                         on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        if on_output is not None or self.output_tail_lines:
+            stream = self.astream_command(command, *args, cwd=cwd, env=env)
+            return await self._arun_streaming(stream, allowed_exit_codes, on_output)
+
+        cmd = [self.terraform_path, command, *args]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                cwd=cwd or self.workspace_dir,
+                env=env,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await process.communicate()
+            output = stdout.decode(errors="replace")
+
+            if process.returncode not in allowed_exit_codes:
+                return {
+                    "error": str(subprocess.CalledProcessError(process.returncode, cmd)),
+                    "output": output,
+                    "stderr": stderr.decode(errors="replace"),
+                    "command": " ".join(cmd)
+                }
+            return {
+                "output": output,
+                "exit_code": process.returncode,
+                "command": " ".join(cmd)
+            }
+        except Exception as e:
+            return {
+                "error": str(e),
+                "command": " ".join(cmd)
+            }
+
+    @staticmethod
+    async def _arun_streaming(stream: AsyncTerraformOutputStream, allowed_exit_codes: Tuple[int, ...],
+                              on_output: Optional[OutputCallback]) -> Dict[str, Any]:
+        """Drains a stream, forwarding events, into the usual result dict"""
+        command = " ".join(stream.cmd)
+        try:
+            async for event in stream:
+                if on_output is not None:
+                    on_output(event)
+        except Exception as e:
+            return {
+                "error": str(e),
+                "command": command
+            }
+
+        result = {
+            "output": stream.text("stdout"),
+            "exit_code": stream.returncode,
+            "truncated": stream.truncated,
+            "command": command
+        }
+        if stream.returncode not in allowed_exit_codes:
+            result["error"] = str(subprocess.CalledProcessError(stream.returncode, stream.cmd))
+            result["stderr"] = stream.text("stderr")
+        return result
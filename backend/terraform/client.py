@@ -2,21 +2,98 @@
 Terraform Cloud Client for executing terraform operations
 """
 import os
+import re
 import json
+import hashlib
+import shutil
+import threading
 import subprocess
-from typing import Dict, Any, Optional
+import tempfile
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+from backend.metrics import METRICS
+from .streaming import DEFAULT_TAIL_LINES, TerraformOutputStream
+
+# Files terraform generates or rewrites inside a working directory; never shared with a run
+GENERATED_FILES = {"backend.tf.json", "terraform.tfvars", ".terraform", ".terraform.lock.hcl",
+                   "terraform.tfstate", "terraform.tfstate.backup", "tfplan"}
+
+# State always lives in Terraform Cloud, so a data directory last initialized for another workspace
+# is re-pointed at the new backend rather than failing with "Backend configuration changed"
+INIT_ARGS = ("-input=false", "-reconfigure")
+
+LOCK_FILE = ".terraform.lock.hcl"
+INIT_FINGERPRINT_FILE = "init.fingerprint"
+PLAN_FILE = "tfplan"
+
+# Receives one output event per line while a command runs
+OutputCallback = Callable[[Dict[str, Any]], None]
+
+# `plan -detailed-exitcode`: 0 = no changes, 2 = changes present
+PLAN_NO_CHANGES = 0
+PLAN_HAS_CHANGES = 2
+
+PLAN_TOTALS_PATTERN = re.compile(
+    r'Plan: (?:(\d+) to import, )?(\d+) to add, (\d+) to change, (\d+) to destroy'
+)
+PLAN_RESOURCE_PATTERN = re.compile(
+    r'^\s*# (\S+) (will be created|will be destroyed|will be updated in-place|must be replaced|will be read during apply)',
+    re.MULTILINE
+)
+
+# Data directory -> lock, shared by every client in the process: separate clients
+# pointed at one work cache must not run terraform in a workspace's data at once
+_data_dir_locks: Dict[str, threading.Lock] = {}
+_data_dir_locks_guard = threading.Lock()
 
 class TerraformCloudClient:
-    def __init__(self, organization: str, token: Optional[str] = None):
+    def __init__(self, organization: str, token: Optional[str] = None,
+                 isolated_runs: bool = False, runs_dir: Optional[str] = None,
+                 plugin_cache_dir: Optional[str] = None, work_cache_dir: Optional[str] = None,
+                 saved_plans: bool = False, output_tail_lines: Optional[int] = None,
+                 cli_config_file: Optional[str] = None, reuse_run_dirs: bool = False):
         """
         Initialize Terraform Cloud client
         
         Args:
             organization: Terraform Cloud organization name
             token: Terraform Cloud API token. If not provided, will try to get from env var TF_TOKEN_app_terraform_io
+            isolated_runs: Execute every run in its own scratch directory instead of the template directory
+            runs_dir: Parent directory for scratch directories. Defaults to the system temp directory
+            plugin_cache_dir: Shared provider plugin cache. Defaults to TF_PLUGIN_CACHE_DIR or ~/.terraform.d/plugin-cache
+            work_cache_dir: Keeps each workspace's .terraform data and lock file between runs, so isolated
+                runs can skip init too. Defaults to the .terraform directory of the working directory
+            saved_plans: Apply the exact plan saved by `plan -out` instead of planning twice, and skip
+                apply when the plan has no changes. Uses the `cloud` block (Terraform >= 1.6), since the
+                `remote` backend cannot save plans
+            output_tail_lines: Stream every command and keep only this many trailing lines of output.
+                By default output is buffered whole unless an on_output callback is given
+            cli_config_file: Write the token to this CLI config file once and point terraform at it
+                through TF_CLI_CONFIG_FILE, instead of rewriting ~/.terraform.d/credentials.tfrc.json
+            reuse_run_dirs: Keep isolated scratch directories after a run and hand them to the next
+                run of the same template, so their links are created only once
         """
         self.terraform_path = "terraform"  # Assumes terraform is in PATH
         self.workspace_dir = None
+        self.isolated_runs = isolated_runs
+        self.runs_dir = runs_dir
+        self.plugin_cache_dir = os.path.abspath(os.path.expanduser(
+            plugin_cache_dir or os.getenv("TF_PLUGIN_CACHE_DIR") or "~/.terraform.d/plugin-cache"
+        ))
+        os.makedirs(self.plugin_cache_dir, exist_ok=True)
+        self.work_cache_dir = os.path.abspath(work_cache_dir) if work_cache_dir else None
+        self.saved_plans = saved_plans
+        self.output_tail_lines = output_tail_lines
+        self.cli_config_file = os.path.abspath(cli_config_file) if cli_config_file else None
+        self.reuse_run_dirs = reuse_run_dirs
+        # Template directory -> idle reusable scratch directories
+        self._idle_run_dirs: Dict[str, List[str]] = {}
+        # Scratch directory -> workspace its data directory was last initialized for
+        self._run_dir_workspaces: Dict[str, str] = {}
+        # (template directory, workspace) -> scratch directory initialized ahead of its run
+        self._prepared_run_dirs: Dict[Tuple[str, str], str] = {}
+        self._run_dirs: List[str] = []
+        self._run_dirs_lock = threading.Lock()
         self.organization = organization
         self.token = token or os.getenv("TF_TOKEN_app_terraform_io")
         
@@ -24,7 +101,10 @@ class TerraformCloudClient:
             raise ValueError("Terraform Cloud token must be provided or set in TF_TOKEN_app_terraform_io environment variable")
             
         # Create terraform CLI config file with token
-        self._setup_terraform_credentials()
+        if self.cli_config_file:
+            self._write_cli_config()
+        else:
+            self._setup_terraform_credentials()
 
     def _setup_terraform_credentials(self) -> None:
         """Setup Terraform Cloud credentials"""
@@ -45,7 +125,21 @@ class TerraformCloudClient:
         with open(credentials_path, "w") as f:
             json.dump(cli_config, f, indent=2)
 
-    def execute_template(self, template_path: str, variables: Dict[str, Any], workspace_name: str) -> Dict[str, Any]:
+    def _write_cli_config(self) -> None:
+        """Writes a private CLI config file holding the token, readable only by this user"""
+        os.makedirs(os.path.dirname(self.cli_config_file), exist_ok=True)
+        content = (
+            'credentials "app.terraform.io" {\n'
+            f'  token = {json.dumps(self.token)}\n'
+            '}\n'
+        )
+        fd = os.open(self.cli_config_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+
+    def execute_template(self, template_path: str, variables: Dict[str, Any], workspace_name: str,
+                         isolated: Optional[bool] = None,
+                         on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
         """
         Executes a terraform template with the given variables
         
@@ -53,83 +147,496 @@ class TerraformCloudClient:
             template_path: Path to the terraform template directory
             variables: Dictionary of variables to pass to terraform
             workspace_name: Name of the Terraform Cloud workspace
+            isolated: Run in a private scratch directory. Defaults to the client's isolated_runs
+            on_output: Called with every stdout/stderr line of init, plan and apply as it arrives
             
         Returns:
             Dict containing the execution results
         """
-        self.workspace_dir = os.path.abspath(template_path)
-        
-        # Create/update backend configuration for Terraform Cloud
-        self._setup_cloud_backend(workspace_name)
-        
-        # Create terraform.tfvars file
-        self._create_tfvars(variables)
-        
-        # Initialize Terraform
-        init_result = self._run_terraform_command("init")
-        if init_result.get("error"):
-            return init_result
+        if isolated is None:
+            isolated = self.isolated_runs
+
+        if not isolated:
+            self.workspace_dir = os.path.abspath(template_path)
+            return self._execute_in(self.workspace_dir, variables, workspace_name, on_output)
+
+        with self.run_directory(template_path, workspace_name) as run_dir:
+            return self._execute_in(run_dir, variables, workspace_name, on_output)
+
+    @contextmanager
+    def run_directory(self, template_path: str, workspace_name: str) -> Iterator[str]:
+        """
+        Creates a run-scoped working directory and removes it afterwards
+
+        The template's files are linked rather than copied, so the directory is
+        cheap to create, and generated files (backend, tfvars, .terraform) stay
+        private to the run. This makes concurrent runs of one template safe.
+        A directory bound to this template and workspace by bind_prepared_run
+        is claimed first, so the run starts already initialized.
+        """
+        template_dir = os.path.abspath(template_path)
+        run_dir = self._claim_prepared_run_dir(template_dir, workspace_name)
+        if run_dir is not None:
+            try:
+                self._sync_run_dir(template_dir, run_dir)
+                yield run_dir
+            finally:
+                self._dispose_run_dir(template_dir, run_dir, workspace_name)
+            return
+
+        if self.reuse_run_dirs:
+            run_dir = self._acquire_run_dir(template_dir, workspace_name)
+            try:
+                self._sync_run_dir(template_dir, run_dir)
+                self._seed_lock_file(template_dir, run_dir, workspace_name)
+                yield run_dir
+            finally:
+                self._release_run_dir(template_dir, run_dir, workspace_name)
+            return
+
+        run_dir = tempfile.mkdtemp(prefix=f"tf-{os.path.basename(template_dir)}-", dir=self.runs_dir)
+        try:
+            self._sync_run_dir(template_dir, run_dir)
+            self._seed_lock_file(template_dir, run_dir, workspace_name)
+            yield run_dir
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    def prepare_run(self, template_path: str) -> str:
+        """
+        Speculatively prepares a scratch directory before the run's workspace is known
+
+        Links the template and runs `init -backend=false` and `validate`, which
+        install providers and modules into the directory and the plugin cache.
+        Pass the directory to bind_prepared_run once the workspace is known, or
+        to discard_prepared_run.
+
+        Returns:
+            The prepared directory
+
+        Raises:
+            RuntimeError: When init or validate fails; the directory is discarded
+        """
+        template_dir = os.path.abspath(template_path)
+        run_dir = self._acquire_run_dir(template_dir) if self.reuse_run_dirs else tempfile.mkdtemp(
+            prefix=f"tf-{os.path.basename(template_dir)}-", dir=self.runs_dir
+        )
+        try:
+            self._sync_run_dir(template_dir, run_dir)
+            self._seed_lock_file(template_dir, run_dir, None)
+            env = self._terraform_env(os.path.join(run_dir, ".terraform"))
+            for command, args in (("init", ("-input=false", "-backend=false")), ("validate", ("-no-color",))):
+                result = self._run_terraform_command(command, *args, cwd=run_dir, env=env)
+                if result.get("error"):
+                    raise RuntimeError(f"terraform {command} failed: {result['error']}")
+        except BaseException:
+            self._dispose_run_dir(template_dir, run_dir)
+            raise
+        return run_dir
+
+    def bind_prepared_run(self, run_dir: str, template_path: str, workspace_name: str) -> None:
+        """
+        Initializes a directory from prepare_run against workspace_name's backend
+
+        Afterwards the next run of the template in that workspace claims the
+        directory and skips init. A directory bound earlier to the same
+        workspace and still unclaimed is replaced. With a work cache the run
+        uses the workspace's data directory there, so the providers and modules
+        prepare_run installed are moved into it when it has none yet.
+
+        Raises:
+            RuntimeError: When init fails; the directory stays with the caller
+        """
+        template_dir = os.path.abspath(template_path)
+        data_dir = self._data_dir(run_dir, workspace_name)
+        env = self._terraform_env(data_dir)
+        with self._data_dir_lock(data_dir):
+            self._adopt_prepared_data(os.path.join(run_dir, ".terraform"), data_dir)
+            self._seed_lock_file(template_dir, run_dir, workspace_name)
+            self._setup_cloud_backend(workspace_name, run_dir)
+            if not self._init_is_current(run_dir, data_dir):
+                self._forget_init(data_dir)
+                result = self._run_terraform_command("init", *INIT_ARGS, cwd=run_dir, env=env)
+                if result.get("error"):
+                    raise RuntimeError(f"terraform init failed: {result['error']}")
+                self._record_init(run_dir, data_dir)
+
+        with self._run_dirs_lock:
+            replaced = self._prepared_run_dirs.get((template_dir, workspace_name))
+            self._prepared_run_dirs[(template_dir, workspace_name)] = run_dir
+        if replaced is not None and replaced != run_dir:
+            self._dispose_run_dir(template_dir, replaced)
+
+    @staticmethod
+    def _adopt_prepared_data(prepared_dir: str, data_dir: str) -> None:
+        """Moves what the speculative init installed into the data directory the run will use"""
+        if os.path.abspath(prepared_dir) == os.path.abspath(data_dir) or not os.path.isdir(prepared_dir):
+            return
+        os.makedirs(data_dir, exist_ok=True)
+        for entry in ("providers", "modules"):
+            source, target = os.path.join(prepared_dir, entry), os.path.join(data_dir, entry)
+            if os.path.isdir(source) and not os.path.exists(target):
+                shutil.move(source, target)
+        shutil.rmtree(prepared_dir, ignore_errors=True)
+
+    def discard_prepared_run(self, run_dir: str, template_path: str, workspace_name: Optional[str] = None) -> bool:
+        """
+        Gives up a directory from prepare_run, bound to workspace_name if given
+
+        Returns:
+            False when a run already claimed the bound directory (the run disposes
+            of it), True when it was discarded here
+        """
+        template_dir = os.path.abspath(template_path)
+        if workspace_name is not None:
+            with self._run_dirs_lock:
+                if self._prepared_run_dirs.get((template_dir, workspace_name)) != run_dir:
+                    return False
+                del self._prepared_run_dirs[(template_dir, workspace_name)]
+        self._dispose_run_dir(template_dir, run_dir)
+        return True
+
+    def _claim_prepared_run_dir(self, template_dir: str, workspace_name: str) -> Optional[str]:
+        with self._run_dirs_lock:
+            return self._prepared_run_dirs.pop((template_dir, workspace_name), None)
+
+    def _dispose_run_dir(self, template_dir: str, run_dir: str, workspace_name: Optional[str] = None) -> None:
+        """Returns a reusable directory to the idle pool and removes any other"""
+        if self.reuse_run_dirs:
+            self._release_run_dir(template_dir, run_dir, workspace_name)
+        else:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    def _acquire_run_dir(self, template_dir: str, workspace_name: Optional[str] = None) -> str:
+        """
+        Takes an idle reusable scratch directory for template_dir, creating one if none is free
+
+        A directory last used for workspace_name is preferred, since its data
+        directory is already initialized for that backend.
+        """
+        with self._run_dirs_lock:
+            idle = self._idle_run_dirs.setdefault(template_dir, [])
+            for position in range(len(idle) - 1, -1, -1):
+                if self._run_dir_workspaces.get(idle[position]) == workspace_name:
+                    return idle.pop(position)
+            if idle:
+                return idle.pop()
+        prefix = f"tf-{os.path.basename(template_dir)}-"
+        run_dir = tempfile.mkdtemp(prefix=prefix, dir=self.runs_dir)
+        with self._run_dirs_lock:
+            self._run_dirs.append(run_dir)
+        return run_dir
+
+    def _release_run_dir(self, template_dir: str, run_dir: str, workspace_name: Optional[str] = None) -> None:
+        with self._run_dirs_lock:
+            self._idle_run_dirs.setdefault(template_dir, []).append(run_dir)
+            if workspace_name is not None:
+                self._run_dir_workspaces[run_dir] = workspace_name
+
+    def _sync_run_dir(self, template_dir: str, run_dir: str) -> None:
+        """Links template entries missing from run_dir and drops ones the template no longer has"""
+        wanted = {entry for entry in os.listdir(template_dir) if entry not in GENERATED_FILES}
+        present = set(os.listdir(run_dir)) - GENERATED_FILES
+        for entry in present - wanted:
+            path = os.path.join(run_dir, entry)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+        for entry in sorted(wanted - present):
+            self._link(os.path.join(template_dir, entry), os.path.join(run_dir, entry))
+
+    def _seed_lock_file(self, template_dir: str, run_dir: str, workspace_name: Optional[str]) -> None:
+        """
+        Gives the run its own copy of the lock file, which init rewrites
+
+        Without one in the template, reuse the lock from the workspace's last
+        init; a reused directory keeps the lock from its previous run.
+        """
+        target = os.path.join(run_dir, LOCK_FILE)
+        lock_file = os.path.join(template_dir, LOCK_FILE)
+        if not os.path.isfile(lock_file) and self.work_cache_dir and workspace_name:
+            lock_file = os.path.join(self.work_cache_dir, workspace_name, LOCK_FILE)
+        if os.path.isfile(lock_file):
+            shutil.copy2(lock_file, target)
+
+    def close(self) -> None:
+        """Removes the reusable and the unclaimed prepared scratch directories"""
+        with self._run_dirs_lock:
+            run_dirs, self._run_dirs, self._idle_run_dirs = self._run_dirs, [], {}
+            self._run_dir_workspaces = {}
+            run_dirs += [run_dir for run_dir in self._prepared_run_dirs.values() if run_dir not in run_dirs]
+            self._prepared_run_dirs = {}
+        for run_dir in run_dirs:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    @staticmethod
+    def _link(source: str, target: str) -> None:
+        """Symlinks source into a run directory, falling back to hardlinks or copies"""
+        try:
+            os.symlink(source, target, target_is_directory=os.path.isdir(source))
+            return
+        except OSError:
+            pass
+
+        if os.path.isdir(source):
+            shutil.copytree(source, target)
+            return
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+    def _execute_in(self, working_dir: str, variables: Dict[str, Any], workspace_name: str,
+                    on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Runs init (when needed), plan and apply inside working_dir"""
+        data_dir = self._data_dir(working_dir, workspace_name)
+        env = self._terraform_env(data_dir)
+
+        with self._data_dir_lock(data_dir):
+            # Create/update backend configuration for Terraform Cloud
+            self._setup_cloud_backend(workspace_name, working_dir)
             
-        # Run terraform plan
-        plan_result = self._run_terraform_command("plan")
-        if plan_result.get("error"):
-            return plan_result
+            # Create terraform.tfvars file
+            self._create_tfvars(variables, working_dir)
             
-        # Run terraform apply
-        apply_result = self._run_terraform_command("apply", "-auto-approve")
+            # Initialize Terraform unless nothing relevant changed since the last init
+            if not self._init_is_current(working_dir, data_dir):
+                self._forget_init(data_dir)
+                init_result = self._run_terraform_command("init", *INIT_ARGS, cwd=working_dir, env=env,
+                                                          on_output=on_output)
+                if init_result.get("error"):
+                    return init_result
+                self._record_init(working_dir, data_dir)
+                
+            # Run terraform plan
+            plan_result = self._run_terraform_command(
+                "plan", *self._plan_args(), cwd=working_dir, env=env,
+                allowed_exit_codes=self._plan_exit_codes(), on_output=on_output
+            )
+            if plan_result.get("error"):
+                return plan_result
+            if self._plan_is_noop(plan_result):
+                return self._plan_only_result(plan_result)
+                
+            # Run terraform apply
+            apply_result = self._run_terraform_command("apply", *self._apply_args(), cwd=working_dir, env=env,
+                                                       on_output=on_output)
         
+        return self._apply_result(plan_result, apply_result)
+
+    def _plan_args(self) -> List[str]:
+        if self.saved_plans:
+            return ["-input=false", "-no-color", "-detailed-exitcode", f"-out={PLAN_FILE}"]
+        return []
+
+    def _plan_exit_codes(self) -> Tuple[int, ...]:
+        if self.saved_plans:
+            return (PLAN_NO_CHANGES, PLAN_HAS_CHANGES)
+        return (0,)
+
+    def _apply_args(self) -> List[str]:
+        if self.saved_plans:
+            # A saved plan is already approved; apply it exactly as planned
+            return ["-input=false", PLAN_FILE]
+        return ["-auto-approve"]
+
+    def _plan_is_noop(self, plan_result: Dict[str, Any]) -> bool:
+        return self.saved_plans and plan_result.get("exit_code") == PLAN_NO_CHANGES
+
+    def _plan_only_result(self, plan_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Result for a saved plan without changes: nothing to apply"""
         return {
+            "status": "success",
+            "applied": False,
+            "plan": self.summarize_plan(plan_result.get("output") or "", changes=False),
+            "details": plan_result
+        }
+
+    def _apply_result(self, plan_result: Dict[str, Any], apply_result: Dict[str, Any]) -> Dict[str, Any]:
+        result = {
             "status": "success" if not apply_result.get("error") else "error",
             "details": apply_result
         }
+        if self.saved_plans:
+            result["applied"] = not apply_result.get("error")
+            result["plan"] = self.summarize_plan(plan_result.get("output") or "", changes=True)
+        return result
+
+    @staticmethod
+    def summarize_plan(output: str, changes: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Extracts the change totals and affected resources from plan output
+
+        Args:
+            output: stdout of `terraform plan -no-color`
+            changes: Whether the plan has changes, if known from the exit code
+
+        Returns:
+            Dict with add/change/destroy/import counts and per-resource actions
+        """
+        summary = {"changes": bool(changes), "add": 0, "change": 0, "destroy": 0, "import": 0}
+        totals = PLAN_TOTALS_PATTERN.search(output)
+        if totals:
+            imports, add, change, destroy = totals.groups()
+            summary["add"], summary["change"], summary["destroy"] = int(add), int(change), int(destroy)
+            summary["import"] = int(imports or 0)
+            if changes is None:
+                summary["changes"] = any(summary[k] for k in ("add", "change", "destroy", "import"))
+
+        summary["resources"] = [
+            {"address": address, "action": action}
+            for address, action in PLAN_RESOURCE_PATTERN.findall(output)
+        ]
+        return summary
+
+    def _data_dir(self, working_dir: str, workspace_name: str) -> str:
+        """Directory terraform uses for its .terraform data (TF_DATA_DIR)"""
+        if self.work_cache_dir:
+            return os.path.join(self.work_cache_dir, workspace_name)
+        return os.path.join(working_dir, ".terraform")
+
+    def _data_dir_lock(self, data_dir: str) -> threading.Lock:
+        """Serializes runs that share one data directory, across all clients of the process"""
+        with _data_dir_locks_guard:
+            return _data_dir_locks.setdefault(os.path.abspath(data_dir), threading.Lock())
+
+    def _terraform_env(self, data_dir: str) -> Dict[str, str]:
+        """Environment for terraform subprocesses"""
+        env = dict(os.environ)
+        env["TF_PLUGIN_CACHE_DIR"] = self.plugin_cache_dir
+        env["TF_DATA_DIR"] = data_dir
+        env["TF_IN_AUTOMATION"] = "1"
+        if self.cli_config_file:
+            env["TF_CLI_CONFIG_FILE"] = self.cli_config_file
+        return env
+
+    def _init_fingerprint(self, working_dir: str) -> str:
+        """
+        Hashes everything `terraform init` depends on: the configuration
+        (including backend.tf.json and module sources), the lock file that
+        pins provider versions, and the plugin cache location
+        """
+        digest = hashlib.sha256()
+        digest.update(self.plugin_cache_dir.encode("utf-8"))
+        for root, dirs, files in os.walk(working_dir, followlinks=True):
+            dirs[:] = sorted(d for d in dirs if d != ".terraform")
+            for name in sorted(files):
+                if not (name.endswith(".tf") or name.endswith(".tf.json") or name == LOCK_FILE):
+                    continue
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, working_dir).encode("utf-8"))
+                with open(path, "rb") as f:
+                    digest.update(hashlib.sha256(f.read()).digest())
+        return digest.hexdigest()
+
+    def _init_is_current(self, working_dir: str, data_dir: str) -> bool:
+        """True when data_dir was initialized from an identical configuration"""
+        try:
+            with open(os.path.join(data_dir, INIT_FINGERPRINT_FILE), "r") as f:
+                recorded = f.read().strip()
+        except OSError:
+            return False
+        return recorded == self._init_fingerprint(working_dir)
+
+    def _forget_init(self, data_dir: str) -> None:
+        """Invalidates the recorded fingerprint before a (possibly failing) init"""
+        try:
+            os.remove(os.path.join(data_dir, INIT_FINGERPRINT_FILE))
+        except FileNotFoundError:
+            pass
+
+    def _record_init(self, working_dir: str, data_dir: str) -> None:
+        """Stores the post-init fingerprint and keeps the generated lock file"""
+        os.makedirs(data_dir, exist_ok=True)
+        lock_file = os.path.join(working_dir, LOCK_FILE)
+        if self.work_cache_dir and os.path.isfile(lock_file):
+            shutil.copy2(lock_file, os.path.join(data_dir, LOCK_FILE))
+
+        with open(os.path.join(data_dir, INIT_FINGERPRINT_FILE), "w") as f:
+            f.write(self._init_fingerprint(working_dir))
     
-    def _setup_cloud_backend(self, workspace_name: str) -> None:
+    def _setup_cloud_backend(self, workspace_name: str, working_dir: Optional[str] = None) -> None:
         """Setup Terraform Cloud backend configuration"""
-        backend_config = {
-            "terraform": {
-                "backend": {
-                    "remote": {
-                        "hostname": "app.terraform.io",
-                        "organization": self.organization,
-                        "workspaces": {
-                            "name": workspace_name
-                        }
-                    }
-                }
+        workspace_settings = {
+            "hostname": "app.terraform.io",
+            "organization": self.organization,
+            "workspaces": {
+                "name": workspace_name
             }
         }
+        if self.saved_plans:
+            backend_config = {"terraform": {"cloud": workspace_settings}}
+        else:
+            backend_config = {"terraform": {"backend": {"remote": workspace_settings}}}
         
         # Write backend config
-        backend_path = os.path.join(self.workspace_dir, "backend.tf.json")
+        backend_path = os.path.join(working_dir or self.workspace_dir, "backend.tf.json")
         with open(backend_path, "w") as f:
             json.dump(backend_config, f, indent=2)
 
-    def _create_tfvars(self, variables: Dict[str, Any]) -> None:
+    def _create_tfvars(self, variables: Dict[str, Any], working_dir: Optional[str] = None) -> None:
         """Creates terraform.tfvars file from variables"""
         tfvars_content = []
         for key, value in variables.items():
-            if isinstance(value, str):
-                tfvars_content.append(f'{key} = "{value}"')
-            else:
-                tfvars_content.append(f'{key} = {value}')
+            # JSON literals are valid HCL expressions (strings, maps, lists, bools, numbers); template
+            # sequences are escaped so values are never interpolated
+            literal = json.dumps(value).replace("${", "$${").replace("%{", "%%{")
+            tfvars_content.append(f'{key} = {literal}')
                 
-        tfvars_path = os.path.join(self.workspace_dir, "terraform.tfvars")
+        tfvars_path = os.path.join(working_dir or self.workspace_dir, "terraform.tfvars")
         with open(tfvars_path, "w") as f:
             f.write("\n".join(tfvars_content))
     
-    def _run_terraform_command(self, command: str, *args) -> Dict[str, Any]:
-        """Executes a terraform command"""
+    def stream_command(self, command: str, *args, cwd: Optional[str] = None,
+                       env: Optional[Dict[str, str]] = None) -> TerraformOutputStream:
+        """
+        Runs a terraform command and iterates its output events as they arrive
+
+        Iterate the returned stream; afterwards it holds the returncode and
+        bounded tails of stdout and stderr. Add "-json" to the arguments to
+        get parsed UI events in each event's "event" key.
+        """
+        return TerraformOutputStream(
+            [self.terraform_path, command, *args],
+            cwd=cwd or self.workspace_dir,
+            env=env,
+            tail_lines=self.output_tail_lines or DEFAULT_TAIL_LINES
+        )
+
+    def _run_terraform_command(self, command: str, *args, cwd: Optional[str] = None,
+                               env: Optional[Dict[str, str]] = None,
+                               allowed_exit_codes: Tuple[int, ...] = (0,),
+                               on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Executes a terraform command, timed as the terraform_<command> stage"""
+        with METRICS.span(f"terraform_{command}") as span:
+            result = self._run_terraform_subprocess(command, *args, cwd=cwd, env=env,
+                                                    allowed_exit_codes=allowed_exit_codes, on_output=on_output)
+            span["outcome"] = "error" if result.get("error") else "ok"
+            return result
+
+    def _run_terraform_subprocess(self, command: str, *args, cwd: Optional[str] = None,
+                                  env: Optional[Dict[str, str]] = None,
+                                  allowed_exit_codes: Tuple[int, ...] = (0,),
+                                  on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        if on_output is not None or self.output_tail_lines:
+            stream = self.stream_command(command, *args, cwd=cwd, env=env)
+            return self._run_streaming(stream, allowed_exit_codes, on_output)
+
         try:
             cmd = [self.terraform_path, command, *args]
             result = subprocess.run(
                 cmd,
-                cwd=self.workspace_dir,
+                cwd=cwd or self.workspace_dir,
+                env=env,
                 capture_output=True,
-                text=True,
-                check=True
+                text=True
             )
+            if result.returncode not in allowed_exit_codes:
+                raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr)
             return {
                 "output": result.stdout,
+                "exit_code": result.returncode,
                 "command": " ".join(cmd)
             }
         except subprocess.CalledProcessError as e:
@@ -144,3 +651,29 @@ class TerraformCloudClient:
                 "error": str(e),
                 "command": " ".join(cmd)
             }
+
+    @staticmethod
+    def _run_streaming(stream: TerraformOutputStream, allowed_exit_codes: Tuple[int, ...],
+                       on_output: Optional[OutputCallback]) -> Dict[str, Any]:
+        """Drains a stream, forwarding events, into the usual result dict"""
+        command = " ".join(stream.cmd)
+        try:
+            for event in stream:
+                if on_output is not None:
+                    on_output(event)
+        except Exception as e:
+            return {
+                "error": str(e),
+                "command": command
+            }
+
+        result = {
+            "output": stream.text("stdout"),
+            "exit_code": stream.returncode,
+            "truncated": stream.truncated,
+            "command": command
+        }
+        if stream.returncode not in allowed_exit_codes:
+            result["error"] = str(subprocess.CalledProcessError(stream.returncode, stream.cmd))
+            result["stderr"] = stream.text("stderr")
+        return result
@@ -0,0 +1,71 @@
+"""
+Process-wide pool of Terraform Cloud clients
+
+Clients are built once per organization, token and options and then shared,
+so provisioning calls after the first one skip client setup: the token is
+written once to a CLI config file owned by this process (passed to terraform
+through TF_CLI_CONFIG_FILE), and prepared scratch directories, init state and
+workspace settings stay with the pooled client.
+"""
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple, Type
+from .client import TerraformCloudClient
+
+_clients: Dict[Tuple, TerraformCloudClient] = {}
+_lock = threading.Lock()
+_config_dir: Optional[str] = None
+
+def get_client(organization: str, token: Optional[str] = None,
+               client_class: Type[TerraformCloudClient] = TerraformCloudClient,
+               **options: Any) -> TerraformCloudClient:
+    """
+    Returns the shared client for organization, token and options, creating it on first use
+
+    Args:
+        organization: Terraform Cloud organization name
+        token: Terraform Cloud API token. If not provided, will try to get from env var TF_TOKEN_app_terraform_io
+        client_class: TerraformCloudClient or a subclass such as AsyncTerraformCloudClient
+        **options: Keyword arguments for the client constructor; they must be hashable
+
+    Returns:
+        The pooled client
+    """
+    token = token or os.getenv("TF_TOKEN_app_terraform_io")
+    key = (client_class, organization, token, tuple(sorted(options.items())))
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            if token and "cli_config_file" not in options:
+                options["cli_config_file"] = _cli_config_path(organization, token)
+            client = client_class(organization, token=token, **options)
+            _clients[key] = client
+    return client
+
+def clear_clients() -> None:
+    """Drops every pooled client and removes its scratch directories and CLI config"""
+    global _config_dir
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        config_dir, _config_dir = _config_dir, None
+
+    for client in clients:
+        client.close()
+    if config_dir:
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+def _cli_config_path(organization: str, token: str) -> str:
+    """CLI config file for one credential, inside this process's private config directory"""
+    global _config_dir
+    if _config_dir is None:
+        _config_dir = tempfile.mkdtemp(prefix="tf-cli-config-")
+    digest = hashlib.sha256(f"{organization}\n{token}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(_config_dir, f"{digest}.tfrc")
+
+atexit.register(clear_clients)
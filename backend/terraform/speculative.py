@@ -0,0 +1,175 @@
+"""
+Speculative terraform preparation for pipelined request processing
+
+Once a request's template is identified, its directory is known; only the
+workspace, which is derived from variables, is not. A Preparation starts
+`init -backend=false` and `validate` in a scratch directory right away,
+overlapping with classification, extraction and missing-variable round
+trips. That part stays local: the backend init, which can create the
+workspace, is only bound once the request's variables have passed
+validation. The run of that template and workspace then claims the
+initialized directory instead of running init itself.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from backend.metrics import METRICS
+from .client import TerraformCloudClient
+
+logger = logging.getLogger(__name__)
+
+class Preparation:
+    def __init__(self, template_name: str, template_path: str):
+        """
+        Speculative preparation of one request's run
+
+        Args:
+            template_name: Template being prepared
+            template_path: Directory its function runs terraform in
+        """
+        self.template_name = template_name
+        self.template_path = template_path
+        self.run_dir: Optional[str] = None
+        self.workspace_name: Optional[str] = None
+        # Workspace the directory is currently registered for with the client
+        self.bound_workspace: Optional[str] = None
+        self.error: Optional[str] = None
+        self.discarded = False
+        # Last scheduled step; every step waits for the one before it
+        self._future: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """Whether a run in workspace_name will find the directory initialized"""
+        return bool(self._future and self._future.done() and self.run_dir and not self.discarded
+                    and self.bound_workspace and self.bound_workspace == self.workspace_name)
+
+class SpeculativePreparer:
+    def __init__(self, client_factory: Callable[[], TerraformCloudClient], template_paths: Dict[str, str],
+                 workspace_namers: Dict[str, Callable[[Dict[str, Any]], str]], max_workers: int = 2):
+        """
+        Args:
+            client_factory: Returns the client the template functions execute with, so
+                their runs find the prepared directories
+            template_paths: Template name -> directory its function runs terraform in
+            workspace_namers: Template name -> function naming the workspace from variables
+            max_workers: Preparations running terraform at once
+        """
+        self.client_factory = client_factory
+        self.template_paths = template_paths
+        self.workspace_namers = workspace_namers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tf-prepare")
+
+    def start(self, template_name: str) -> Optional[Preparation]:
+        """Starts preparing template_name's directory; None for templates without one"""
+        template_path = self.template_paths.get(template_name)
+        if template_path is None:
+            return None
+        preparation = Preparation(template_name, template_path)
+        self._schedule(preparation, lambda: self._prepare(preparation))
+        return preparation
+
+    def bind(self, preparation: Preparation, variables: Dict[str, Any]) -> None:
+        """
+        Schedules the backend init for the workspace variables name
+
+        Call only with validated variables, since the init can create the
+        workspace. Variables without a value are left out, so a namer missing its input
+        raises and binding waits for a later call. A changed workspace gets a
+        fresh directory, since a run of the old one may already hold the first.
+        """
+        namer = self.workspace_namers.get(preparation.template_name)
+        if namer is None or preparation.discarded:
+            return
+        try:
+            workspace_name = namer({var_name: value for var_name, value in variables.items() if value})
+        except (KeyError, TypeError, ValueError):
+            return
+        with preparation._lock:
+            if workspace_name == preparation.workspace_name:
+                return
+            preparation.workspace_name = workspace_name
+        self._schedule(preparation, lambda: self._bind(preparation, workspace_name))
+
+    def wait(self, preparation: Preparation, timeout: Optional[float] = None) -> bool:
+        """Waits for the scheduled steps; True when the run will find the directory initialized"""
+        future = preparation._future
+        if future is not None:
+            future.exception(timeout=timeout)
+        return preparation.ready
+
+    def discard(self, preparation: Preparation) -> None:
+        """
+        Releases the directory after the scheduled steps, unless a run claimed it
+
+        Called when the request fails validation, is abandoned, or has executed.
+        """
+        with preparation._lock:
+            if preparation.discarded:
+                return
+            preparation.discarded = True
+        self._schedule(preparation, lambda: self._discard(preparation), force=True)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _schedule(self, preparation: Preparation, step: Callable[[], None], force: bool = False) -> None:
+        """Runs step after the preparation's previous step, in the background"""
+        with preparation._lock:
+            if preparation.discarded and not force:
+                return
+            previous = preparation._future
+
+            def run():
+                if previous is not None:
+                    previous.exception()
+                step()
+
+            preparation._future = self._executor.submit(run)
+
+    def _prepare(self, preparation: Preparation) -> None:
+        if preparation.discarded:
+            return
+        with METRICS.span("prepare", template=preparation.template_name, step="init") as span:
+            try:
+                preparation.run_dir = self.client_factory().prepare_run(preparation.template_path)
+            except Exception as e:
+                preparation.error = str(e)
+                span["outcome"] = "error"
+                logger.warning("Speculative preparation of %s failed: %s", preparation.template_name, e)
+
+    def _bind(self, preparation: Preparation, workspace_name: str) -> None:
+        if preparation.discarded:
+            return
+        if preparation.bound_workspace is not None:
+            self.client_factory().discard_prepared_run(preparation.run_dir, preparation.template_path,
+                                                       preparation.bound_workspace)
+            preparation.run_dir = preparation.bound_workspace = None
+            self._prepare(preparation)
+        if preparation.run_dir is None:
+            return
+
+        with METRICS.span("prepare", template=preparation.template_name, step="backend") as span:
+            client = self.client_factory()
+            try:
+                client.bind_prepared_run(preparation.run_dir, preparation.template_path, workspace_name)
+                preparation.bound_workspace = workspace_name
+            except Exception as e:
+                preparation.error = str(e)
+                span["outcome"] = "error"
+                logger.warning("Speculative backend init of %s failed: %s", workspace_name, e)
+                client.discard_prepared_run(preparation.run_dir, preparation.template_path)
+                preparation.run_dir = None
+
+    def _discard(self, preparation: Preparation) -> None:
+        if preparation.run_dir is None:
+            outcome = "failed" if preparation.error else "unused"
+        elif self.client_factory().discard_prepared_run(preparation.run_dir, preparation.template_path,
+                                                        preparation.bound_workspace):
+            outcome = "discarded"
+        else:
+            # The run of bound_workspace took the directory over
+            outcome = "claimed"
+        METRICS.increment("terraform_prepared_runs_total", template=preparation.template_name, outcome=outcome)
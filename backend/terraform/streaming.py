@@ -0,0 +1,164 @@
+"""
+Streaming execution of terraform commands
+
+Output is delivered line by line while the command runs, and only a bounded
+tail of each stream is kept for the final result, so long applies report
+progress immediately and large plans do not accumulate in memory.
+"""
+import asyncio
+import json
+import queue
+import subprocess
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+DEFAULT_TAIL_LINES = 1000
+# -json UI events can be long single lines; asyncio's default limit is 64 KiB
+ASYNC_LINE_LIMIT = 16 * 1024 * 1024
+
+def output_event(command: str, stream: str, line: str) -> Dict[str, Any]:
+    """
+    Builds the event emitted for one output line
+
+    Lines produced by `-json` commands are machine-readable UI events and
+    are parsed into the "event" key.
+    """
+    event = {"command": command, "stream": stream, "line": line}
+    if line.startswith("{"):
+        try:
+            event["event"] = json.loads(line)
+        except ValueError:
+            pass
+    return event
+
+
+class OutputTail:
+    def __init__(self, tail_lines: int = DEFAULT_TAIL_LINES):
+        """Ring buffers holding the last lines of stdout and stderr"""
+        self.lines = {"stdout": deque(maxlen=tail_lines), "stderr": deque(maxlen=tail_lines)}
+        self.counts = {"stdout": 0, "stderr": 0}
+        self.returncode: Optional[int] = None
+
+    def add(self, stream: str, line: str) -> None:
+        self.lines[stream].append(line)
+        self.counts[stream] += 1
+
+    def text(self, stream: str) -> str:
+        return "\n".join(self.lines[stream])
+
+    @property
+    def truncated(self) -> bool:
+        return any(self.counts[name] > len(lines) for name, lines in self.lines.items())
+
+
+class TerraformOutputStream(OutputTail):
+    def __init__(self, cmd: List[str], cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None,
+                 tail_lines: int = DEFAULT_TAIL_LINES):
+        """
+        Runs cmd and yields one output event per line as it arrives
+
+        Args:
+            cmd: Full terraform command line
+            cwd: Working directory
+            env: Environment for the subprocess
+            tail_lines: Lines of each stream kept for the final result
+        """
+        super().__init__(tail_lines)
+        self.cmd = cmd
+        self.cwd = cwd
+        self.env = env
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        process = subprocess.Popen(
+            self.cmd,
+            cwd=self.cwd,
+            env=self.env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors="replace",
+            bufsize=1
+        )
+        lines: queue.Queue = queue.Queue()
+        for pipe, name in ((process.stdout, "stdout"), (process.stderr, "stderr")):
+            threading.Thread(target=self._pump, args=(pipe, name, lines), daemon=True).start()
+
+        command = self.cmd[1] if len(self.cmd) > 1 else self.cmd[0]
+        try:
+            open_streams = 2
+            while open_streams:
+                item = lines.get()
+                if item is None:
+                    open_streams -= 1
+                    continue
+                name, line = item
+                self.add(name, line)
+                yield output_event(command, name, line)
+            self.returncode = process.wait()
+        finally:
+            # Consumer stopped early or a callback raised: do not leave terraform running
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    @staticmethod
+    def _pump(pipe, name: str, lines: queue.Queue) -> None:
+        try:
+            for line in pipe:
+                lines.put((name, line.rstrip("\n")))
+        finally:
+            pipe.close()
+            lines.put(None)
+
+
+class AsyncTerraformOutputStream(OutputTail):
+    def __init__(self, cmd: List[str], cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None,
+                 tail_lines: int = DEFAULT_TAIL_LINES):
+        """Asyncio counterpart of TerraformOutputStream, used with `async for`"""
+        super().__init__(tail_lines)
+        self.cmd = cmd
+        self.cwd = cwd
+        self.env = env
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        process = await asyncio.create_subprocess_exec(
+            *self.cmd,
+            cwd=self.cwd,
+            env=self.env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=ASYNC_LINE_LIMIT
+        )
+        lines: asyncio.Queue = asyncio.Queue()
+        pumps = [
+            asyncio.ensure_future(self._pump(process.stdout, "stdout", lines)),
+            asyncio.ensure_future(self._pump(process.stderr, "stderr", lines))
+        ]
+
+        command = self.cmd[1] if len(self.cmd) > 1 else self.cmd[0]
+        try:
+            open_streams = 2
+            while open_streams:
+                item = await lines.get()
+                if item is None:
+                    open_streams -= 1
+                    continue
+                name, line = item
+                self.add(name, line)
+                yield output_event(command, name, line)
+            self.returncode = await process.wait()
+        finally:
+            for pump in pumps:
+                pump.cancel()
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    @staticmethod
+    async def _pump(reader: asyncio.StreamReader, name: str, lines: asyncio.Queue) -> None:
+        try:
+            async for line in reader:
+                lines.put_nowait((name, line.decode(errors="replace").rstrip("\n")))
+        finally:
+            lines.put_nowait(None)
@@ -0,0 +1,48 @@
+"""
+Shared fixtures for the offline test suite
+
+Run from the repository root with `python -m pytest backend/tests`. The
+fake terraform executable from the benchmarks stands in for the real CLI,
+so no test needs network access or credentials.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules import both `backend.` and the agent's `functions.` package paths
+for path in (os.path.dirname(BACKEND_DIR), BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import pytest
+from backend.benchmarks.fake_terraform import install_fake_terraform
+
+TEMPLATE_FILES = {
+    "main.tf": 'resource "google_storage_bucket" "bucket" {\n  name     = var.bucket_name\n  location = var.location\n}\n',
+    "variables.tf": 'variable "bucket_name" {}\nvariable "project_id" {}\nvariable "location" {\n  default = "US"\n}\n'
+}
+
+@pytest.fixture
+def fake_terraform(tmp_path, monkeypatch) -> str:
+    """Puts a delay-free fake terraform first on PATH; returns the file its calls are logged to"""
+    install_fake_terraform(str(tmp_path / "bin"), {"init": 0, "plan": 0, "apply": 0})
+    monkeypatch.setenv("PATH", f"{tmp_path / 'bin'}{os.pathsep}{os.environ.get('PATH', '')}")
+    log_path = str(tmp_path / "terraform.log")
+    monkeypatch.setenv("FAKE_TERRAFORM_LOG", log_path)
+    return log_path
+
+@pytest.fixture
+def template_dir(tmp_path) -> str:
+    path = tmp_path / "template"
+    path.mkdir()
+    for name, content in TEMPLATE_FILES.items():
+        (path / name).write_text(content)
+    return str(path)
+
+@pytest.fixture
+def plugin_cache_dir(tmp_path) -> str:
+    """Plugin cache pre-seeded with a provider, as a warmed-up host would have"""
+    provider_dir = tmp_path / "plugins" / "registry.terraform.io" / "hashicorp" / "google" / "4.85.0" / "linux_amd64"
+    provider_dir.mkdir(parents=True)
+    (provider_dir / "terraform-provider-google_v4.85.0_x5").write_text("")
+    return str(tmp_path / "plugins")
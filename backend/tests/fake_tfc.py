@@ -0,0 +1,168 @@
+"""
+In-process stand-in for the parts of the Terraform Cloud v2 API that
+TerraformCloudAPIClient uses, served over real HTTP on localhost
+"""
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+JSON_API = "application/vnd.api+json"
+
+# Statuses a run passes through, one per poll
+RUN_PROGRESSION = ["pending", "planning", "applying", "applied"]
+
+class FakeTerraformCloud:
+    def __init__(self, organization: str = "org"):
+        self.organization = organization
+        self.workspaces: Dict[str, Dict[str, Any]] = {}
+        self.variables: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.configuration_versions: Dict[str, Dict[str, Any]] = {}
+        self.runs: Dict[str, Dict[str, Any]] = {}
+        # (method, path without query) of every request, in arrival order
+        self.requests: List[Tuple[str, str]] = []
+        # Responses served instead of the real ones, consumed one per matching request:
+        # (method, path regex, status, content type, body); a None status processes the request, then
+        # drops the connection without answering
+        self.faults: List[Tuple[str, str, Optional[int], str, bytes]] = []
+        self._lock = threading.Lock()
+        self._ids = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, name="fake-tfc", daemon=True).start()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_workspaces(self, count: int) -> None:
+        for _ in range(count):
+            self._create_workspace(f"ws-{len(self.workspaces)}")
+
+    def count(self, method: str, pattern: str) -> int:
+        return sum(1 for m, path in self.requests if m == method and re.fullmatch(pattern, path))
+
+    def _next_id(self, prefix: str) -> str:
+        self._ids += 1
+        return f"{prefix}-{self._ids}"
+
+    def _create_workspace(self, name: str) -> Dict[str, Any]:
+        workspace = {"id": self._next_id("ws"), "type": "workspaces", "attributes": {"name": name},
+                     "relationships": {"current-state-version": {"data": None}}}
+        self.workspaces[name] = workspace
+        self.variables[workspace["id"]] = {}
+        return workspace
+
+    def _handle(self, method: str, url: str, payload: Any) -> Tuple[int, Any]:
+        parts = urlsplit(url)
+        path, query = parts.path, parse_qs(parts.query)
+        org = f"/api/v2/organizations/{self.organization}"
+
+        if method == "GET" and path == f"{org}/workspaces":
+            number = int(query["page[number]"][0])
+            size = int(query["page[size]"][0])
+            workspaces = list(self.workspaces.values())
+            page = workspaces[(number - 1) * size:number * size]
+            next_page = number + 1 if number * size < len(workspaces) else None
+            return 200, {"data": page, "meta": {"pagination": {"current-page": number, "next-page": next_page}}}
+        match = re.fullmatch(rf"{org}/workspaces/([^/]+)", path)
+        if match and method == "GET":
+            workspace = self.workspaces.get(match.group(1))
+            return (200, {"data": workspace}) if workspace else (404, {"errors": [{"status": "404", "title": "not found"}]})
+        if method == "POST" and path == f"{org}/workspaces":
+            name = payload["data"]["attributes"]["name"]
+            if name in self.workspaces:
+                return 422, {"errors": [{"status": "422", "detail": "Name has already been taken"}]}
+            return 201, {"data": self._create_workspace(name)}
+
+        match = re.fullmatch(r"/api/v2/workspaces/([^/]+)/vars(?:/([^/]+))?", path)
+        if match:
+            variables = self.variables[match.group(1)]
+            if method == "GET":
+                return 200, {"data": list(variables.values())}
+            if method == "POST":
+                var = {"id": self._next_id("var"), "type": "vars", "attributes": payload["data"]["attributes"]}
+                variables[var["id"]] = var
+                return 201, {"data": var}
+            variables[match.group(2)]["attributes"].update(payload["data"]["attributes"])
+            return 200, {"data": variables[match.group(2)]}
+
+        match = re.fullmatch(r"/api/v2/workspaces/([^/]+)/configuration-versions", path)
+        if match and method == "POST":
+            version_id = self._next_id("cv")
+            version = {"id": version_id, "type": "configuration-versions",
+                       "attributes": {"status": "pending", "upload-url": f"{self.base_url}/upload/{version_id}"}}
+            self.configuration_versions[version_id] = version
+            return 201, {"data": version}
+        match = re.fullmatch(r"/upload/([^/]+)", path)
+        if match and method == "PUT":
+            self.configuration_versions[match.group(1)]["attributes"]["status"] = "uploaded"
+            return 200, None
+        match = re.fullmatch(r"/api/v2/configuration-versions/([^/]+)", path)
+        if match and method == "GET":
+            return 200, {"data": self.configuration_versions[match.group(1)]}
+
+        if method == "POST" and path == "/api/v2/runs":
+            run = {"id": self._next_id("run"), "type": "runs", "polls": 0,
+                   "attributes": {"status": RUN_PROGRESSION[0], "has-changes": True}}
+            self.runs[run["id"]] = run
+            return 201, {"data": run}
+        match = re.fullmatch(r"/api/v2/runs/([^/]+)", path)
+        if match and method == "GET":
+            run = self.runs[match.group(1)]
+            run["polls"] += 1
+            run["attributes"]["status"] = RUN_PROGRESSION[min(run["polls"], len(RUN_PROGRESSION) - 1)]
+            return 200, {"data": run}
+
+        return 404, {"errors": [{"status": "404", "title": f"no route for {method} {path}"}]}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                with fake._lock:
+                    fake.requests.append((method, urlsplit(self.path).path))
+                    fault = next((f for f in fake.faults
+                                  if f[0] == method and re.fullmatch(f[1], urlsplit(self.path).path)), None)
+                    if fault is not None:
+                        fake.faults.remove(fault)
+                    if fault is None or fault[2] is None:
+                        payload = json.loads(raw) if raw and method != "PUT" else None
+                        status, document = fake._handle(method, self.path, payload)
+                if fault is not None:
+                    _, _, status, content_type, body = fault
+                    if status is None:
+                        self.close_connection = True
+                        return
+                else:
+                    content_type = JSON_API
+                    body = json.dumps(document).encode("utf-8") if document is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PATCH(self):
+                self._dispatch("PATCH")
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
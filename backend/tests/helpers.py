@@ -0,0 +1,16 @@
+"""
+Assertions over the calls logged by the fake terraform executable
+"""
+import os
+from typing import List
+
+def terraform_calls(log_path: str) -> List[List[str]]:
+    """Logged fake terraform calls as [arguments, plugin cache dir, data dir]"""
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path, "r") as f:
+        return [line.rstrip("\n").split("\t") for line in f]
+
+def commands(log_path: str) -> List[str]:
+    """Subcommand of every logged call, e.g. ["init", "plan", "apply"]"""
+    return [call[0].split(" ")[0] for call in terraform_calls(log_path)]
@@ -0,0 +1,84 @@
+import pytest
+from backend.terraform.api_client import TerraformCloudAPIClient, TerraformCloudAPIError
+from fake_tfc import FakeTerraformCloud
+
+@pytest.fixture
+def tfc():
+    server = FakeTerraformCloud()
+    yield server
+    server.close()
+
+@pytest.fixture
+def client(tfc):
+    api_client = TerraformCloudAPIClient("org", token="offline", base_url=tfc.base_url, poll_interval=0)
+    yield api_client
+    api_client.close()
+
+def test_run_lifecycle(tfc, client, template_dir):
+    statuses = []
+    result = client.execute_template(template_dir, {"bucket_name": "data", "labels": {"team": "a"}}, "gcs-data",
+                                     on_status=lambda run_id, status: statuses.append(status))
+
+    assert result["status"] == "success"
+    assert result["details"]["run_status"] == "applied"
+    assert statuses == ["planning", "applying", "applied"]
+    assert [version["attributes"]["status"] for version in tfc.configuration_versions.values()] == ["uploaded"]
+    variables = {var["attributes"]["key"]: var["attributes"] for var in tfc.variables["ws-1"].values()}
+    assert variables["bucket_name"]["value"] == "data" and not variables["bucket_name"]["hcl"]
+    assert variables["labels"]["value"] == '{"team": "a"}' and variables["labels"]["hcl"]
+
+def test_workspace_lookups_are_cached(tfc, client, template_dir):
+    for _ in range(3):
+        assert client.execute_template(template_dir, {"bucket_name": "data"}, "gcs-data")["status"] == "success"
+
+    assert tfc.count("GET", r"/api/v2/organizations/org/workspaces/gcs-data") == 1
+    assert tfc.count("POST", r"/api/v2/organizations/org/workspaces") == 1
+    # Unchanged variables are only listed, never rewritten
+    assert tfc.count("POST", r"/api/v2/workspaces/[^/]+/vars") == 1
+    assert tfc.count("PATCH", r"/api/v2/workspaces/[^/]+/vars/[^/]+") == 0
+
+def test_list_workspaces_follows_pagination(tfc, client):
+    tfc.add_workspaces(7)
+
+    names = [workspace["attributes"]["name"] for workspace in client.list_workspaces(page_size=3)]
+
+    assert names == [f"ws-{i}" for i in range(7)]
+    assert tfc.count("GET", r"/api/v2/organizations/org/workspaces") == 3
+
+def test_html_error_page_is_an_api_error(tfc, client, template_dir):
+    tfc.faults.append(("GET", r"/api/v2/organizations/org/workspaces/gcs-data", 502, "text/html",
+                       b"<html><body>502 Bad Gateway</body></html>"))
+
+    result = client.execute_template(template_dir, {"bucket_name": "data"}, "gcs-data")
+
+    assert result["status"] == "error"
+    assert "502" in result["details"]["error"]
+
+def test_html_success_page_is_an_api_error(tfc, client):
+    tfc.faults.append(("GET", r"/api/v2/organizations/org/workspaces/gcs-data", 200, "text/html", b"<html></html>"))
+
+    with pytest.raises(TerraformCloudAPIError, match="unexpected text/html response"):
+        client.get_workspace("gcs-data")
+
+def test_dropped_post_is_not_resent(tfc, client, template_dir):
+    tfc.faults.append(("POST", r"/api/v2/runs", None, "", b""))
+
+    result = client.execute_template(template_dir, {"bucket_name": "data"}, "gcs-data")
+
+    assert result["status"] == "error"
+    assert len(tfc.runs) == 1
+    assert tfc.count("POST", r"/api/v2/runs") == 1
+
+@pytest.mark.parametrize("method, path, body", [
+    ("GET", r"/api/v2/organizations/org/workspaces/gcs-data", b'{"data": {"id": "ws-1"}}'),
+    ("POST", r"/api/v2/runs", b'{"data": null}'),
+    ("GET", r"/api/v2/runs/[^/]+", b'{"data": {"id": "run-1", "attributes": {}}}'),
+    ("GET", r"/api/v2/workspaces/[^/]+/vars", b'{"meta": {}}'),
+])
+def test_malformed_success_is_an_error_result(tfc, client, template_dir, method, path, body):
+    tfc.faults.append((method, path, 200, "application/vnd.api+json", body))
+
+    result = client.execute_template(template_dir, {"bucket_name": "data"}, "gcs-data")
+
+    assert result["status"] == "error"
+    assert "malformed response" in result["details"]["error"]
@@ -0,0 +1,98 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from backend import batch
+
+def write_requests(path, count):
+    lines = []
+    for i in range(count):
+        lines.append(json.dumps({"id": f"r{i}", "prompt": f"Create a storage bucket b{i} in project p{i}"}))
+        if i % 5 == 4:
+            lines.append("not json")
+    path.write_text("\n".join(lines) + "\n")
+
+def echo_chunk(prompts, dry_run):
+    return [{"status": "dry_run" if dry_run else "success", "prompt": prompt} for prompt in prompts]
+
+@pytest.fixture
+def threaded_workers(monkeypatch):
+    """Worker "processes" as threads of this process, so stand-ins for _process_chunk reach them"""
+    monkeypatch.setattr(batch, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(batch, "_init_worker", lambda agent_options: None)
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_dry_run_identifies_and_extracts_only(tmp_path):
+    source = tmp_path / "requests.jsonl"
+    source.write_text('"gcs storage bucket data-lake in project analytics-1"\n'
+                      '{"id": 7, "prompt": "Create a gcs storage bucket logs"}\n')
+
+    summary = batch.run_batch(str(source), str(tmp_path / "out.jsonl"), workers=0, dry_run=True,
+                              agent_options={"cache_ttl": 0})
+
+    results = read_output(tmp_path / "out.jsonl")
+    assert summary["outcomes"] == {"dry_run": 1, "missing_variables": 1}
+    assert results[0]["response"]["variables"]["project_id"] == "analytics-1"
+    assert (results[1]["id"], results[1]["response"]["missing"]) == (7, ["project_id"])
+    assert not (tmp_path / "out.jsonl.checkpoint").exists()
+
+def test_output_keeps_input_order(tmp_path, monkeypatch, threaded_workers):
+    def reversed_delays(prompts, dry_run):
+        # Earlier chunks finish last
+        time.sleep(0.02 * (40 - int(prompts[0].split()[4][1:])) / 4)
+        return echo_chunk(prompts, dry_run)
+
+    monkeypatch.setattr(batch, "_process_chunk", reversed_delays)
+    write_requests(tmp_path / "requests.jsonl", 40)
+
+    batch.run_batch(str(tmp_path / "requests.jsonl"), str(tmp_path / "out.jsonl"), workers=4, chunk_size=4)
+
+    results = read_output(tmp_path / "out.jsonl")
+    assert [result["line"] for result in results] == list(range(1, 49))
+    assert [result["id"] for result in results if result["prompt"]] == [f"r{i}" for i in range(40)]
+    assert sum("Invalid JSON" in (result["response"].get("error") or "") for result in results) == 8
+
+def test_waiting_on_a_slow_head_chunk_is_idle(tmp_path, monkeypatch, threaded_workers):
+    def slow_head(prompts, dry_run):
+        if prompts[0].split()[4] == "b0":
+            time.sleep(1.0)
+        return echo_chunk(prompts, dry_run)
+
+    monkeypatch.setattr(batch, "_process_chunk", slow_head)
+    write_requests(tmp_path / "requests.jsonl", 16)
+
+    cpu = time.process_time()
+    batch.run_batch(str(tmp_path / "requests.jsonl"), str(tmp_path / "out.jsonl"), workers=4, chunk_size=2)
+
+    assert time.process_time() - cpu < 0.5
+
+def test_interrupted_run_resumes_to_the_same_output(tmp_path, monkeypatch, threaded_workers):
+    write_requests(tmp_path / "requests.jsonl", 30)
+    monkeypatch.setattr(batch, "_process_chunk", echo_chunk)
+    batch.run_batch(str(tmp_path / "requests.jsonl"), str(tmp_path / "expected.jsonl"), workers=2, chunk_size=3)
+
+    calls = []
+
+    def interrupted(prompts, dry_run):
+        calls.append(prompts)
+        if len(calls) == 5:
+            raise KeyboardInterrupt
+        return echo_chunk(prompts, dry_run)
+
+    monkeypatch.setattr(batch, "_process_chunk", interrupted)
+    output = tmp_path / "out.jsonl"
+    with pytest.raises(KeyboardInterrupt):
+        batch.run_batch(str(tmp_path / "requests.jsonl"), str(output), workers=1, chunk_size=3,
+                        checkpoint_interval=0)
+    checkpoint = json.loads((tmp_path / "out.jsonl.checkpoint").read_text())
+    assert 0 < checkpoint["line"] < 36
+
+    monkeypatch.setattr(batch, "_process_chunk", echo_chunk)
+    summary = batch.run_batch(str(tmp_path / "requests.jsonl"), str(output), workers=2, chunk_size=3)
+
+    assert summary["resumed_after_line"] == checkpoint["line"]
+    assert output.read_text() == (tmp_path / "expected.jsonl").read_text()
+    assert summary["outcomes"] == {"success": 30, "error": 6}
+    assert not (tmp_path / "out.jsonl.checkpoint").exists()
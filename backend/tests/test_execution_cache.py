@@ -0,0 +1,26 @@
+from backend.functions.execution_cache import ExecutionCache
+
+def test_persistence_failure_keeps_the_result(tmp_path, template_dir, caplog):
+    # A file where the cache directory should be makes every save fail
+    (tmp_path / "blocked").write_text("")
+    cache = ExecutionCache({"gcs-bucket": template_dir}, persist_path=str(tmp_path / "blocked" / "cache.json"))
+
+    result, cached = cache.run("gcs-bucket", {"bucket_name": "data"}, lambda: {"status": "success"})
+
+    assert (result, cached) == ({"status": "success"}, False)
+    assert cache.run("gcs-bucket", {"bucket_name": "data"}, lambda: {"status": "error"}) == (result, True)
+    assert "Could not save the execution cache" in caplog.text
+
+def test_unserializable_result_is_not_an_error(tmp_path, template_dir, caplog):
+    class Unserializable:
+        def __str__(self):
+            raise ValueError("no text form")
+
+    cache = ExecutionCache({"gcs-bucket": template_dir}, persist_path=str(tmp_path / "cache.json"))
+
+    result, cached = cache.run("gcs-bucket", {"bucket_name": "data"}, lambda: {"status": "success",
+                                                                              "run": Unserializable()})
+
+    assert result["status"] == "success" and not cached
+    assert not list(tmp_path.glob("*.tmp"))
+    assert "Could not save the execution cache" in caplog.text
@@ -0,0 +1,72 @@
+import threading
+import time
+import pytest
+from backend.agent import InfrastructureAgent
+from backend.extractor.extraction_plan import EXTRACTION_PATTERNS, ExtractionPlan
+
+VARIABLES = ["bucket_name", "project_id", "location"]
+
+@pytest.fixture
+def plan():
+    return ExtractionPlan(VARIABLES, EXTRACTION_PATTERNS)
+
+@pytest.mark.parametrize("text, missing, answers", [
+    ("project is analytics-staging-196", ["project_id"], {"project_id": "analytics-staging-196"}),
+    ("project_id: analytics-staging-196", ["project_id"], {"project_id": "analytics-staging-196"}),
+    ("bucket = data-lake", ["bucket_name"], {"bucket_name": "data-lake"}),
+    ("bucket name should be data-lake", ["bucket_name"], {"bucket_name": "data-lake"}),
+    ("analytics-staging-196", ["project_id"], {"project_id": "analytics-staging-196"}),
+    ("the bucket should be in us-central1", ["bucket_name"], {}),
+    ("the bucket is in us-central1", ["bucket_name"], {}),
+    ("bucket names are hard", ["bucket_name"], {}),
+    ("yes", ["bucket_name"], {}),
+    ("no", ["project_id"], {}),
+    ("Data_Lake!", ["bucket_name"], {}),
+])
+def test_answers(plan, text, missing, answers):
+    assert plan.extract_answers(text, missing) == answers
+
+def test_settled_value_needs_the_full_name(plan):
+    assert plan.extract_answers("bucket is other", [], settled={"bucket_name"}) == {}
+    assert plan.extract_answers("bucket name is other", [], settled={"bucket_name"}) == {"bucket_name": "other"}
+
+@pytest.fixture
+def agent():
+    agent = InfrastructureAgent(cache_ttl=0)
+    executed = []
+
+    def execute(template_name, variables, preparation=None):
+        time.sleep(0.2)
+        executed.append(variables)
+        return {"status": "success", "result": {"status": "success"}}
+
+    agent._execute = execute
+    agent.executed = executed
+    return agent
+
+def test_follow_up_keeps_set_values(agent):
+    session_id = agent.process_turn("Create a storage bucket data-lake")["session_id"]
+
+    response = agent.process_turn("bucket is other and project is analytics-staging-196", session_id)
+
+    assert response["status"] == "success"
+    assert agent.executed == [{"bucket_name": "data-lake", "project_id": "analytics-staging-196", "location": None}]
+
+def test_concurrent_follow_ups_execute_once(agent):
+    session_id = agent.process_turn("Create a storage bucket data-lake")["session_id"]
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(
+        agent.process_turn("project is analytics-staging-196", session_id))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(agent.executed) == 1
+    assert sorted("error" in response for response in responses) == [False, True]
+
+def test_incomplete_follow_up_keeps_the_session(agent):
+    session_id = agent.process_turn("Create a storage bucket data-lake")["session_id"]
+
+    assert agent.process_turn("yes", session_id)["status"] == "missing_variables"
+    assert agent.process_turn("analytics-staging-196", session_id)["status"] == "success"
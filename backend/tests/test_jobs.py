@@ -0,0 +1,96 @@
+import time
+import pytest
+from backend.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobScheduler, JobStore
+from backend.jobs.scheduler import TRANSIENT_ERROR_PATTERN
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+def test_requeue_leaves_live_leases_alone(db_path):
+    live, dead, recovering = (JobStore(db_path, owner=owner, lease_seconds=lease)
+                              for owner, lease in (("live", 60), ("dead", 0), ("recovering", 60)))
+    live.enqueue("gcs-bucket", "gcs-a", {})
+    live_job = live.claim()
+    dead.enqueue("gcs-bucket", "gcs-b", {})
+    dead_job = dead.claim()
+    time.sleep(0.01)
+
+    assert recovering.requeue_expired() == 1
+    assert recovering.get(live_job["id"])["status"] == RUNNING
+    assert recovering.get(dead_job["id"])["status"] == QUEUED
+
+def test_outcome_of_a_taken_back_job_is_ignored(db_path):
+    first, second = JobStore(db_path, owner="first", lease_seconds=0), JobStore(db_path, owner="second")
+    job_id = first.enqueue("gcs-bucket", "gcs-a", {})
+    first.claim()
+    time.sleep(0.01)
+    second.requeue_expired()
+    assert second.claim()["id"] == job_id
+
+    first.complete(job_id, {"status": "success"})
+    assert first.renew_leases([job_id]) == 0
+    assert second.get(job_id)["status"] == RUNNING
+    second.complete(job_id, {"status": "success"})
+    assert second.get(job_id)["status"] == SUCCEEDED
+
+@pytest.mark.parametrize("error, transient", [
+    ("Terraform Cloud API error 502: GET /runs/run-1", True),
+    ("Error: unexpected HTTP/1.1 503 from the provider", True),
+    ("googleapi: Error 429: rate limit exceeded", True),
+    ("received status code: 500", True),
+    ("Error: bucket logs-500 already exists", False),
+    ("Error: project 504 does not exist", False),
+    ("dial tcp 142.250.1.1:443: i/o timeout", True),
+    ("Post \"https://storage.googleapis.com\": context deadline exceeded", True),
+    ("net/http: TLS handshake timeout", True),
+    ("The read operation timed out", True),
+    ("Error 503: Service temporarily unavailable", True),
+    ("Error 409: bucket temporary-data already exists", False),
+    ("Error: project timeout-logs does not exist", False),
+    ("Error: invalid bucket name timed-out-jobs", False),
+    ("Error 400: Invalid value for label temporarily-disabled", False),
+])
+def test_transient_errors_need_http_context(error, transient):
+    assert bool(TRANSIENT_ERROR_PATTERN.search(error)) == transient
+
+class FlakyStore(JobStore):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failed_claims = 0
+
+    def claim(self, per_workspace_limit=1):
+        if self.failed_claims < 2:
+            self.failed_claims += 1
+            raise RuntimeError("database is locked")
+        return super().claim(per_workspace_limit)
+
+def test_worker_survives_claim_errors(db_path):
+    store = FlakyStore(db_path)
+    scheduler = JobScheduler(store, {"gcs-bucket": lambda **variables: {"status": "success"}},
+                             max_workers=1, poll_interval=0.01).start()
+    try:
+        job_id = scheduler.submit("gcs-bucket", {"bucket_name": "a"})
+        assert scheduler.wait(job_id, timeout=5)["status"] == SUCCEEDED
+    finally:
+        scheduler.stop()
+    assert store.failed_claims == 2
+
+def test_running_job_keeps_its_lease(db_path):
+    store = JobStore(db_path, lease_seconds=0.3)
+    other = JobStore(db_path, owner="other")
+
+    def slow(**variables):
+        time.sleep(0.5)
+        return {"status": "error", "error": "bucket name conflict"}
+
+    scheduler = JobScheduler(store, {"gcs-bucket": slow}, max_workers=1, poll_interval=0.01).start()
+    try:
+        job_id = scheduler.submit("gcs-bucket", {"bucket_name": "a"})
+        time.sleep(0.4)
+        assert other.requeue_expired() == 0
+        job = scheduler.wait(job_id, timeout=5)
+    finally:
+        scheduler.stop()
+    assert job["status"] == FAILED
+    assert job["attempts"] == 1
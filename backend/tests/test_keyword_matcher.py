@@ -0,0 +1,16 @@
+import pytest
+from backend.extractor.keyword_matcher import KeywordMatcher
+
+@pytest.fixture
+def matcher():
+    return KeywordMatcher({"gcs-bucket": ["storage", "cloud storage", "bucket"], "vm": ["instance", "vm"]})
+
+def test_longest_keyword_wins(matcher):
+    assert matcher.scores("a Cloud Storage bucket") == {"gcs-bucket": 2, "vm": 0}
+
+@pytest.mark.parametrize("text", ["create a ſtorage bucket", "create a STORAGE bucket", "\u212aubernetes vm"])
+def test_case_variants_never_raise(matcher, text):
+    assert len(matcher.count(text)) == 2
+
+def test_case_variant_counts_like_the_keyword(matcher):
+    assert matcher.scores("create a ſtorage bucket") == {"gcs-bucket": 2, "vm": 0}
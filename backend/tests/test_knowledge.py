@@ -0,0 +1,70 @@
+import json
+import pytest
+from backend.knowledge import KnowledgeBase
+
+BUCKET = {
+    "name": "//storage.googleapis.com/analytics-logs",
+    "asset_type": "storage.googleapis.com/Bucket",
+    "ancestors": ["projects/123", "organizations/1"],
+    "resource": {"location": "US", "data": {"name": "analytics-logs", "storageClass": "STANDARD"}}
+}
+INSTANCE = {
+    "name": "//compute.googleapis.com/projects/project-alpha/zones/us-central1-a/instances/web-1",
+    "asset_type": "compute.googleapis.com/Instance",
+    "ancestors": ["projects/456", "organizations/1"],
+    "resource": {"location": "us-central1-a", "data": {"name": "web-1", "machineType": "e2-medium"}}
+}
+
+def state(buckets):
+    return {"version": 4, "serial": 1, "lineage": "l", "resources": [{
+        "mode": "managed", "type": "google_storage_bucket", "name": "bucket",
+        "instances": [{"index_key": name, "attributes": {"name": name, "project": "project-alpha"}}
+                      for name in buckets]
+    }]}
+
+@pytest.fixture
+def knowledge_base(tmp_path):
+    knowledge_base = KnowledgeBase(str(tmp_path / "kb"))
+    yield knowledge_base
+    knowledge_base.close()
+
+def write_assets(path, assets):
+    path.write_text("".join(json.dumps(asset) + "\n" for asset in assets))
+
+def test_unchanged_chunks_are_not_embedded_again(tmp_path, knowledge_base):
+    path = tmp_path / "prod.tfstate"
+    path.write_text(json.dumps(state(["logs", "data"])))
+    assert knowledge_base.ingest_state(str(path))["embedded"] == 2
+
+    assert knowledge_base.ingest_state(str(path)) == {"embedded": 0, "unchanged": 2, "removed": 0, "duplicate": 0}
+
+    path.write_text(json.dumps(state(["logs", "data", "backups"])))
+    assert knowledge_base.ingest_state(str(path)) == {"embedded": 1, "unchanged": 2, "removed": 0, "duplicate": 0}
+
+def test_resources_gone_from_a_source_are_removed(tmp_path, knowledge_base):
+    path = tmp_path / "assets.json"
+    write_assets(path, [BUCKET, INSTANCE])
+    knowledge_base.ingest_assets(str(path))
+
+    write_assets(path, [INSTANCE])
+    assert knowledge_base.ingest_assets(str(path))["removed"] == 1
+
+    names = [match["metadata"]["name"] for match in knowledge_base.search(["analytics logs bucket"], k=5)[0]]
+    assert names == [INSTANCE["name"]]
+
+def test_project_filter_uses_project_ids(tmp_path, knowledge_base):
+    assets = tmp_path / "assets.json"
+    write_assets(assets, [BUCKET, INSTANCE])
+    knowledge_base.ingest_assets(str(assets))
+    state_path = tmp_path / "prod.tfstate"
+    state_path.write_text(json.dumps(state(["logs"])))
+    knowledge_base.ingest_state(str(state_path))
+
+    matches = knowledge_base.search(["bucket"], k=10, project_id="project-alpha")[0]
+
+    assert sorted(match["metadata"]["kind"] for match in matches) == ["asset", "state"]
+    assert all(match["metadata"]["project_id"] == "project-alpha" for match in matches)
+    # The bucket asset only names its project number, which is never mistaken for an ID
+    assert knowledge_base.search(["bucket"], k=10, project_id="123")[0] == []
+    bucket = knowledge_base.search(["analytics logs"], k=10, resource_type=BUCKET["asset_type"])[0][0]
+    assert (bucket["metadata"]["project_id"], bucket["metadata"]["project_number"]) == ("", "123")
@@ -0,0 +1,87 @@
+import json
+import pytest
+from backend.agent import InfrastructureAgent
+from backend.registry import RegistryError, TemplateRegistry, validate_registry
+
+TEMPLATE = {
+    "path": "templates/gcp/gcs-bucket/",
+    "function": "create_gcs_bucket",
+    "keywords": ["bucket", "storage"],
+    "required_vars": ["bucket_name", "project_id"],
+    "optional_vars": ["location"]
+}
+
+def write_registry(registry_file, **changes):
+    registry_file.write_text(json.dumps({"templates": {"gcs-bucket": {**TEMPLATE, **changes}}}))
+
+@pytest.fixture
+def registry_path(tmp_path):
+    """Registry file whose template paths resolve under tmp_path, like backend/templates/registry.json"""
+    path = tmp_path / "templates" / "registry.json"
+    path.parent.mkdir()
+    write_registry(path)
+    return path
+
+@pytest.mark.parametrize("raw, problem", [
+    ({"templates": {}}, "non-empty"),
+    ({"templates": {"gcs-bucket": {k: v for k, v in TEMPLATE.items() if k != "function"}}}, "missing function"),
+    ({"templates": {"gcs-bucket": {**TEMPLATE, "keywords": "bucket"}}}, "keywords must be a list"),
+    ({"templates": {"gcs-bucket": {**TEMPLATE, "required_vars": [1]}}}, "only contain strings"),
+    ({"templates": {"gcs-bucket": {**TEMPLATE, "keywords": []}}}, "at least one keyword"),
+])
+def test_invalid_registries_are_rejected(raw, problem):
+    with pytest.raises(RegistryError, match=problem):
+        validate_registry(raw)
+
+def test_invalid_first_load_raises(registry_path):
+    registry_path.write_text("{")
+
+    with pytest.raises(RegistryError):
+        TemplateRegistry(str(registry_path))
+
+def test_edits_are_picked_up(registry_path):
+    registry = TemplateRegistry(str(registry_path), check_interval=0)
+    version = registry.current.version
+
+    write_registry(registry_path, keywords=["bucket", "storage", "object store"])
+
+    assert registry.current.version != version
+    assert registry.current.keyword_matcher.scores("an object store") == {"gcs-bucket": 1}
+
+def test_invalid_edit_keeps_the_previous_version(registry_path):
+    registry = TemplateRegistry(str(registry_path), check_interval=0)
+    version = registry.current.version
+
+    write_registry(registry_path, keywords=[])
+
+    assert registry.current.version == version
+    assert registry.current.templates["gcs-bucket"]["keywords"] == ["bucket", "storage"]
+
+def test_failing_listener_does_not_fail_readers(registry_path, caplog):
+    registry = TemplateRegistry(str(registry_path), check_interval=0)
+    seen = []
+
+    def failing(compiled):
+        raise RuntimeError("listener bug")
+
+    registry.subscribe(failing)
+    registry.subscribe(lambda compiled: seen.append(compiled.version))
+    write_registry(registry_path, keywords=["bucket"])
+
+    assert registry.current.templates["gcs-bucket"]["keywords"] == ["bucket"]
+    assert seen == [registry.current.version]
+    assert "listener bug" in caplog.text
+
+def test_agent_functions_run_in_its_registry_paths(registry_path, tmp_path):
+    registry = TemplateRegistry(str(registry_path), check_interval=0)
+    agent = InfrastructureAgent(cache_ttl=0, registry=registry)
+    functions = agent.function_registry
+
+    assert functions["gcs-bucket"].keywords["template_path"] == str(tmp_path / "templates" / "gcp" / "gcs-bucket")
+
+    write_registry(registry_path, path="templates/gcp/gcs-bucket-v2/")
+    registry.current
+
+    # Updated in place, so a job scheduler holding the table follows the rollout too
+    assert agent.function_registry is functions
+    assert functions["gcs-bucket"].keywords["template_path"] == str(tmp_path / "templates" / "gcp" / "gcs-bucket-v2")
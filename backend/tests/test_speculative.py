@@ -0,0 +1,70 @@
+import os
+import time
+import pytest
+from backend.agent import InfrastructureAgent
+from backend.terraform.client import TerraformCloudClient
+from backend.terraform.speculative import SpeculativePreparer
+from functions.terraform_functions import gcs_bucket_workspace_name
+from helpers import terraform_calls
+
+def backend_inits(log_path):
+    return [call[0] for call in terraform_calls(log_path)
+            if call[0].startswith("init") and "-backend=false" not in call[0]]
+
+@pytest.fixture
+def agent(tmp_path, fake_terraform, template_dir, plugin_cache_dir):
+    """Pipelined agent whose gcs-bucket runs go through a real client and the fake terraform"""
+    runs_dir = tmp_path / "runs"
+    runs_dir.mkdir()
+    client = TerraformCloudClient("org", token="offline", plugin_cache_dir=plugin_cache_dir,
+                                  cli_config_file=str(tmp_path / "cli.tfrc"), runs_dir=str(runs_dir),
+                                  isolated_runs=True)
+    agent = InfrastructureAgent(session_ttl=0.5)
+    agent.preparer = SpeculativePreparer(lambda: client, {"gcs-bucket": template_dir},
+                                         {"gcs-bucket": gcs_bucket_workspace_name})
+    agent.function_registry["gcs-bucket"] = lambda **variables: client.execute_template(
+        template_dir, variables, gcs_bucket_workspace_name(variables))
+    agent.runs_dir = str(runs_dir)
+    yield agent
+    agent.preparer.close()
+
+def test_completed_session_claims_the_prepared_dir(agent, fake_terraform):
+    session_id = agent.process_turn("Create a storage bucket data-lake")["session_id"]
+    agent.preparer.wait(agent.sessions.get(session_id).preparation)
+
+    # The workspace is only known to be wanted once every variable is valid
+    assert backend_inits(fake_terraform) == []
+
+    response = agent.process_turn("project is analytics-staging-196", session_id)
+
+    assert response["status"] == "success"
+    assert [call[0].split(" ")[0] for call in terraform_calls(fake_terraform)] == \
+        ["init", "validate", "init", "plan", "apply"]
+    assert len(backend_inits(fake_terraform)) == 1
+
+def test_cached_repeat_never_inits_the_backend(agent, fake_terraform):
+    prompt = "gcs storage bucket data-lake in project analytics-1"
+
+    responses = [agent.process_request(prompt) for _ in range(3)]
+    agent.preparer.close()
+
+    assert [bool(response.get("cached")) for response in responses] == [False, True, True]
+    assert len(backend_inits(fake_terraform)) == 1
+    assert os.listdir(agent.runs_dir) == []
+
+def test_incomplete_request_discards_its_dir(agent, fake_terraform):
+    assert agent.process_request("Create a storage bucket data-lake")["status"] == "missing_variables"
+    agent.preparer.close()
+
+    assert backend_inits(fake_terraform) == []
+    assert os.listdir(agent.runs_dir) == []
+
+def test_expired_session_discards_its_dir(agent, fake_terraform):
+    session_id = agent.process_turn("Create a storage bucket data-lake")["session_id"]
+    time.sleep(0.6)
+
+    assert "error" in agent.process_turn("project is analytics-staging-196", session_id)
+    agent.preparer.close()
+
+    assert backend_inits(fake_terraform) == []
+    assert os.listdir(agent.runs_dir) == []
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import threading
+import time
+from backend.benchmarks.fake_terraform import install_fake_terraform
+from backend.terraform.async_client import AsyncTerraformCloudClient
+from backend.terraform.client import TerraformCloudClient
+from helpers import commands, terraform_calls
+
+def make_client(tmp_path, plugin_cache_dir, **options) -> TerraformCloudClient:
+    return TerraformCloudClient("org", token="offline", plugin_cache_dir=plugin_cache_dir,
+                                cli_config_file=str(tmp_path / "cli.tfrc"), runs_dir=str(tmp_path), **options)
+
+VARIABLES = {"bucket_name": "data", "project_id": "proj"}
+
+def test_identical_run_skips_init(tmp_path, fake_terraform, template_dir, plugin_cache_dir):
+    client = make_client(tmp_path, plugin_cache_dir)
+
+    assert client.execute_template(template_dir, VARIABLES, "gcs-data")["status"] == "success"
+    assert client.execute_template(template_dir, VARIABLES, "gcs-data")["status"] == "success"
+
+    assert commands(fake_terraform) == ["init", "plan", "apply", "plan", "apply"]
+    assert all(call[1] == plugin_cache_dir for call in terraform_calls(fake_terraform))
+
+def test_isolated_runs_skip_init_with_work_cache(tmp_path, fake_terraform, template_dir, plugin_cache_dir):
+    client = make_client(tmp_path, plugin_cache_dir, isolated_runs=True, work_cache_dir=str(tmp_path / "work"))
+
+    for _ in range(2):
+        assert client.execute_template(template_dir, VARIABLES, "gcs-data")["status"] == "success"
+
+    assert commands(fake_terraform).count("init") == 1
+    assert {call[2] for call in terraform_calls(fake_terraform)} == {str(tmp_path / "work" / "gcs-data")}
+    assert not os.path.exists(os.path.join(template_dir, "terraform.tfvars"))
+
+def test_changed_template_reruns_init(tmp_path, fake_terraform, template_dir, plugin_cache_dir):
+    client = make_client(tmp_path, plugin_cache_dir)
+    client.execute_template(template_dir, VARIABLES, "gcs-data")
+    with open(os.path.join(template_dir, "outputs.tf"), "w") as f:
+        f.write('output "name" {\n  value = var.bucket_name\n}\n')
+    client.execute_template(template_dir, VARIABLES, "gcs-data")
+
+    assert commands(fake_terraform).count("init") == 2
+
+def test_clients_share_data_dir_locks(tmp_path, plugin_cache_dir):
+    work = str(tmp_path / "work")
+    first = make_client(tmp_path, plugin_cache_dir, work_cache_dir=work)
+    second = make_client(tmp_path, plugin_cache_dir, work_cache_dir=work)
+
+    lock = first._data_dir_lock(first._data_dir(str(tmp_path), "gcs-data"))
+    assert lock is second._data_dir_lock(second._data_dir(str(tmp_path), "gcs-data"))
+
+def test_tfvars_strings_are_escaped(tmp_path):
+    client = TerraformCloudClient("org", token="offline", cli_config_file=str(tmp_path / "cli.tfrc"))
+    client._create_tfvars({"name": 'a "quoted" ${var.x}\\', "labels": {"team": "%{x}"}}, str(tmp_path))
+
+    content = (tmp_path / "terraform.tfvars").read_text()
+    assert content == 'name = "a \\"quoted\\" $${var.x}\\\\"\nlabels = {"team": "%%{x}"}'
+
+def test_reused_run_dir_switches_workspace(tmp_path, fake_terraform, template_dir, plugin_cache_dir):
+    client = make_client(tmp_path, plugin_cache_dir, isolated_runs=True, reuse_run_dirs=True)
+
+    for bucket_name in ("data", "logs", "data"):
+        result = client.execute_template(template_dir, dict(VARIABLES, bucket_name=bucket_name), f"gcs-{bucket_name}")
+        assert result["status"] == "success", result
+
+    inits = [call[0] for call in terraform_calls(fake_terraform) if call[0].startswith("init")]
+    assert inits == ["init -input=false -reconfigure"] * 3
+
+def test_idle_run_dir_of_same_workspace_is_preferred(tmp_path, plugin_cache_dir):
+    client = make_client(tmp_path, plugin_cache_dir, isolated_runs=True, reuse_run_dirs=True)
+    data_dir, logs_dir = client._acquire_run_dir("/t", "gcs-data"), client._acquire_run_dir("/t", "gcs-logs")
+    client._release_run_dir("/t", data_dir, "gcs-data")
+    client._release_run_dir("/t", logs_dir, "gcs-logs")
+
+    assert client._acquire_run_dir("/t", "gcs-data") == data_dir
+    assert client._acquire_run_dir("/t", "gcs-data") == logs_dir
+
+def test_async_runs_take_the_shared_data_dir_lock(tmp_path, fake_terraform, template_dir, plugin_cache_dir):
+    work = str(tmp_path / "work")
+    client = make_client(tmp_path, plugin_cache_dir, isolated_runs=True, work_cache_dir=work)
+    async_client = AsyncTerraformCloudClient("org", token="offline", plugin_cache_dir=plugin_cache_dir,
+                                             cli_config_file=str(tmp_path / "cli.tfrc"), runs_dir=str(tmp_path),
+                                             isolated_runs=True, work_cache_dir=work)
+    # A sync run of the same workspace holds the data directory
+    lock = client._data_dir_lock(os.path.join(work, "gcs-data"))
+    lock.acquire()
+    threading.Timer(0.3, lock.release).start()
+
+    started = time.monotonic()
+    result = asyncio.run(async_client.aexecute_template(template_dir, VARIABLES, "gcs-data"))
+
+    assert result["status"] == "success"
+    assert time.monotonic() - started >= 0.3
+    assert not lock.locked()
+
+def test_prepared_providers_reach_the_work_cache(tmp_path, fake_terraform, template_dir, plugin_cache_dir, monkeypatch):
+    # Provider installation takes 0.5s in a data directory without providers
+    install_fake_terraform(str(tmp_path / "slow-bin"), {"init": 0.5, "plan": 0, "apply": 0})
+    monkeypatch.setenv("PATH", f"{tmp_path / 'slow-bin'}{os.pathsep}{os.environ['PATH']}")
+    work = str(tmp_path / "work")
+    client = make_client(tmp_path, plugin_cache_dir, isolated_runs=True, work_cache_dir=work)
+    run_dir = client.prepare_run(template_dir)
+
+    started = time.monotonic()
+    client.bind_prepared_run(run_dir, template_dir, "gcs-data")
+
+    assert time.monotonic() - started < 0.4
+    assert os.path.isdir(os.path.join(work, "gcs-data", "providers"))
+    assert client.execute_template(template_dir, VARIABLES, "gcs-data")["status"] == "success"
+    assert [call[2] for call in terraform_calls(fake_terraform)][2:] == [os.path.join(work, "gcs-data")] * 3
+    assert commands(fake_terraform) == ["init", "validate", "init", "plan", "apply"]
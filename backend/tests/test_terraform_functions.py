@@ -0,0 +1,100 @@
+import json
+import multiprocessing
+import time
+import pytest
+from backend.functions import terraform_functions
+from backend.state import StateIndex
+
+class RecordingClient:
+    def __init__(self):
+        self.runs = []
+
+    def execute_template(self, template_path, variables, workspace_name):
+        self.runs.append((workspace_name, variables))
+        return {"status": "success"}
+
+def write_state(directory, workspace_name, buckets):
+    state = {
+        "version": 4, "serial": 1, "lineage": "l",
+        "resources": [{
+            "mode": "managed", "type": "google_storage_bucket", "name": "bucket",
+            "instances": [{"index_key": name, "attributes": {"name": name, **attributes}}
+                          for name, attributes in buckets.items()]
+        }]
+    }
+    (directory / f"{workspace_name}.tfstate").write_text(json.dumps(state))
+
+def test_bulk_batches_merge_into_existing_workspace(tmp_path, monkeypatch):
+    client = RecordingClient()
+    monkeypatch.setattr(terraform_functions, "TF_STATE_DIR", str(tmp_path))
+    monkeypatch.setattr(terraform_functions, "_terraform_client", lambda client_class: client)
+    write_state(tmp_path, "gcs-bulk-proj-us", {"logs": {"storage_class": "NEARLINE", "labels": {"team": "a"}}})
+
+    results = terraform_functions.create_gcs_buckets([
+        {"bucket_name": "logs", "project_id": "proj"},
+        {"bucket_name": "data", "project_id": "proj", "storage_class": "COLDLINE"}
+    ])
+
+    assert [result["workspace_name"] for result in results] == ["gcs-bulk-proj-us"] * 2
+    assert client.runs == [("gcs-bulk-proj-us", {"project_id": "proj", "location": "US", "buckets": {
+        "logs": {"storage_class": "NEARLINE", "labels": {"team": "a"}},
+        "data": {"storage_class": "COLDLINE"}
+    }})]
+
+def test_bulk_batch_keeps_buckets_of_earlier_batches(tmp_path, monkeypatch):
+    client = RecordingClient()
+    monkeypatch.setattr(terraform_functions, "TF_STATE_DIR", str(tmp_path))
+    monkeypatch.setattr(terraform_functions, "_terraform_client", lambda client_class: client)
+    write_state(tmp_path, "gcs-bulk-proj-eu", {"logs": {"storage_class": "NEARLINE", "labels": None}})
+
+    terraform_functions.create_gcs_buckets([{"bucket_name": "data", "project_id": "proj", "location": "EU"}])
+
+    assert client.runs[0][1]["buckets"] == {"logs": {"storage_class": "NEARLINE", "labels": {}}, "data": {}}
+
+@pytest.fixture
+def state_index(tmp_path, monkeypatch):
+    index = StateIndex(str(tmp_path / "index"))
+    monkeypatch.setattr(terraform_functions, "_state_index_instance", index)
+    for name in ("TF_STATE_DIR", "TF_ORGANIZATION", "TF_TOKEN"):
+        monkeypatch.setattr(terraform_functions, name, None)
+    return index
+
+def test_state_lookup_without_any_source_is_an_error(state_index):
+    result = terraform_functions.get_terraform_state(resource_type="google_storage_bucket")
+
+    assert result["status"] == "error"
+    assert "TF_STATE_DIR" in result["error"]
+
+def test_state_lookup_falls_back_to_a_built_index(tmp_path, monkeypatch, state_index):
+    states = tmp_path / "states"
+    states.mkdir()
+    write_state(states, "gcs-bulk-proj-us", {"logs": {"storage_class": "NEARLINE"}})
+    monkeypatch.setattr(terraform_functions, "TF_STATE_DIR", str(states))
+    assert terraform_functions.get_terraform_state(resource_type="google_storage_bucket")["count"] == 1
+
+    monkeypatch.setattr(terraform_functions, "TF_STATE_DIR", None)
+    result = terraform_functions.get_terraform_state(resource_type="google_storage_bucket")
+
+    assert result["status"] == "success" and result["count"] == 1
+    assert "TF_STATE_DIR" in result["stale"]
+
+def _hold_bulk_lock(work_cache_dir, acquired, seconds):
+    terraform_functions.TF_WORK_CACHE_DIR = work_cache_dir
+    with terraform_functions._bulk_workspace_lock("gcs-bulk-proj-us"):
+        acquired.set()
+        time.sleep(seconds)
+
+def test_bulk_workspace_lock_spans_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(terraform_functions, "TF_WORK_CACHE_DIR", str(tmp_path))
+    context = multiprocessing.get_context("fork")
+    acquired = context.Event()
+    holder = context.Process(target=_hold_bulk_lock, args=(str(tmp_path), acquired, 0.5))
+    holder.start()
+    assert acquired.wait(5)
+
+    started = time.monotonic()
+    with terraform_functions._bulk_workspace_lock("gcs-bulk-proj-us"):
+        waited = time.monotonic() - started
+    holder.join()
+
+    assert waited > 0.2
@@ -0,0 +1,48 @@
+import io
+import json
+import numpy as np
+from backend.analytics.loaders import load_cloud_monitoring_json
+from backend.analytics.utilization import UtilizationStats
+
+def test_add_touches_only_the_given_rows():
+    rng = np.random.default_rng(0)
+    stats = UtilizationStats(bins=10)
+    for index in range(50):
+        stats.resource_index(f"vm-{index}")
+    resources = rng.integers(0, 50, 1000)
+    values = rng.random(1000)
+    values[::97] = np.nan
+
+    stats.add(resources[:500], "cpu", values[:500])
+    stats.add(7, "cpu", values[500:600])
+    stats.add(resources[600:], "cpu", values[600:])
+
+    expected = np.zeros((50, 10), dtype=np.int64)
+    resources[500:600] = 7
+    valid = ~np.isnan(values)
+    np.add.at(expected, (resources[valid], np.clip((values[valid] * 10).astype(int), 0, 9)), 1)
+    assert (stats.counts[:, 0, :] == expected).all()
+    assert np.allclose(stats.sums[:, 0], np.bincount(resources[valid], weights=values[valid], minlength=50))
+    assert (stats.idle[:, 0] == np.bincount(resources[valid][values[valid] < 0.05], minlength=50)).all()
+    assert not stats.counts[:, 1, :].any()
+
+def monitoring_export(series_count: int) -> str:
+    rng = np.random.default_rng(1)
+    return json.dumps({"timeSeries": [{
+        "metric": {"type": "compute.googleapis.com/instance/cpu/utilization"},
+        "resource": {"labels": {"instance_id": f"vm-{index % 40}", "project_id": "proj"}},
+        "points": [{"value": {"doubleValue": float(value)}} for value in rng.random(5)]
+    } for index in range(series_count)]})
+
+def test_batched_series_match_one_add_per_series():
+    export = monitoring_export(200)
+    batched = UtilizationStats()
+    assert load_cloud_monitoring_json(batched, io.StringIO(export)) == 1000
+
+    unbatched = UtilizationStats()
+    for series in json.loads(export)["timeSeries"]:
+        labels = series["resource"]["labels"]
+        index = unbatched.resource_index(labels["instance_id"], labels["project_id"])
+        unbatched.add(index, "cpu", np.array([point["value"]["doubleValue"] for point in series["points"]]))
+
+    assert batched.summaries() == unbatched.summaries()